@@ -0,0 +1,63 @@
+import json
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+class FastJSONResponse(JSONResponse):
+    """Ответ с массивами NumPy без jsonable_encoder: orjson, если установлен, иначе json из stdlib"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_plain,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+        return json.dumps(
+            _plain(content),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Потоковый ответ, пока тело запроса ещё читается.
+
+    StreamingResponse параллельно ждёт http.disconnect через receive() и при этом забирает
+    сообщения с телом запроса; здесь receive остаётся генератору ответа (request.stream()),
+    а отключение клиента приходит оттуда же как ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+        if self.background is not None:
+            await self.background()
+
+
+def loads(body: bytes) -> Any:
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_plain, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_plain(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
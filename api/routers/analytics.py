@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
 from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional
 
-from core.database import get_db
+from core.database import get_read_db
+from services.analytics_overview import AnalyticsOverview
 from services.analytics_service import AnalyticsService
+from services.readiness import Readiness
+from services.reason_index import ReasonIndex
 
 router = APIRouter()
 
@@ -10,7 +16,7 @@ router = APIRouter()
 @router.get("/dashboard")
 async def get_dashboard_stats(
         days: int = Query(7, description="Период в днях"),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """Данные для главного дашборда"""
     try:
@@ -20,10 +26,55 @@ async def get_dashboard_stats(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/overview")
+async def get_overview(
+        days: int = Query(7, ge=1, le=365, description="Период дашборда в днях"),
+        summary_days: Optional[int] = Query(None, ge=1, le=365, description="Период сводки, по умолчанию как days"),
+        limit: int = Query(50, ge=1, le=1000, description="Последних транзакций в списке"),
+        risk_level: Optional[str] = Query(None, description="Фильтр списка по уровню риска"),
+        is_fraud: Optional[bool] = Query(None, description="Фильтр списка по мошенничеству"),
+        patterns_limit: int = Query(10, ge=1, le=100),
+        if_none_match: Optional[str] = Header(None)
+):
+    """Все панели веб-интерфейса одним запросом: состояние, сводка, дашборд, паттерны риска,
+    важность признаков, последние транзакции. Без изменений данных — 304 по If-None-Match
+    """
+    params = {
+        "days": days,
+        "summary_days": summary_days or days,
+        "limit": limit,
+        "risk_level": risk_level,
+        "is_fraud": is_fraud,
+        "patterns_limit": patterns_limit,
+    }
+    try:
+        watermark = await asyncio.to_thread(AnalyticsOverview.watermark)
+        period_end = AnalyticsOverview.period_end()
+        health = Readiness.health()
+        etag = AnalyticsOverview.etag(params, watermark, period_end, health)
+        # Браузер всё равно переспрашивает, а ответ без изменений — 304 без тела
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if AnalyticsOverview.matches(if_none_match, etag):
+            AnalyticsOverview.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        body = await AnalyticsOverview.get(params, etag, watermark, period_end, health)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/overview/stats")
+async def get_overview_stats():
+    """Кэш /overview воркера: расчёты, попадания, ответы 304"""
+    return AnalyticsOverview.get_stats()
+
+
 @router.get("/risk-patterns")
 async def get_risk_patterns(
         limit: int = Query(10, ge=1, le=100),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """Топ паттернов риска"""
     try:
@@ -33,6 +84,22 @@ async def get_risk_patterns(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/reasons")
+async def get_reason_counts(
+        days: int = Query(7, ge=1, le=365, description="Период в днях"),
+        db: Session = Depends(get_read_db)
+):
+    """Количество транзакций по кодам причин"""
+    try:
+        start_date = datetime.utcnow() - timedelta(days=days)
+        return {
+            "period_days": days,
+            "reason_counts": ReasonIndex.get_reason_counts(db, start_date)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/feature-importance")
 async def get_feature_importance():
     """Важность признаков ML модели"""
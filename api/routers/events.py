@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from core.config import settings
+from services.event_bus import EventBus
+
+router = APIRouter()
+
+
+@router.get("/stream")
+async def stream_events():
+    """Онлайн-лента Server-Sent Events: transactions (новые транзакции и приращения
+    агрегатов), alerts (новые алерты), resync (события потеряны — перечитать через REST)
+    """
+    if len(EventBus.subscribers) >= settings.EVENTS_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Превышено число подписчиков онлайн-ленты")
+
+    subscriber = EventBus.subscribe()
+    return StreamingResponse(
+        EventBus.stream(subscriber),
+        media_type="text/event-stream",
+        # Прокси не должны буферизовать ленту
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def get_events_stats():
+    """Подписчики воркера, опубликованные, пересланные и сброшенные события"""
+    return EventBus.get_stats()
@@ -0,0 +1,78 @@
+import math
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from api.schemas import LoginEventsRequest
+from core.database import get_db
+from services.feature_store import FeatureStore
+from services.profile_cache import ClientProfileCache
+from services.velocity_index import VelocityIndex
+
+router = APIRouter()
+
+
+@router.post("/events")
+async def ingest_login_events(request: LoginEventsRequest):
+    """Приём сырых событий сессий и устройств клиентов"""
+    result = FeatureStore.ingest([event.dict() for event in request.events])
+    return {**result, "received": len(request.events)}
+
+
+@router.get("/stats")
+async def get_feature_store_stats():
+    """Состояние хранилища признаков"""
+    return FeatureStore.get_stats()
+
+
+@router.get("/profile-cache/stats")
+async def get_profile_cache_stats():
+    """Размер, занимаемая память и hit rate кэша профилей клиентов"""
+    return ClientProfileCache.get_stats()
+
+
+@router.post("/profile-cache/refresh")
+def refresh_profile_cache(db: Session = Depends(get_db)):
+    """Обновление кэша профилей из сохранённых транзакций"""
+    updated = ClientProfileCache.refresh_from_db(db)
+    return {"updated_clients": updated, **ClientProfileCache.get_stats()}
+
+
+@router.get("/velocity/stats")
+async def get_velocity_stats():
+    """Состояние индекса скоростей"""
+    return VelocityIndex.get_stats()
+
+
+@router.get("/velocity/{client_id}")
+async def get_client_velocity(
+        client_id: str,
+        destination_id: Optional[str] = Query(None, description="ID получателя")
+):
+    """Количество, сумма и число разных контрагентов в окнах 1м/10м/1ч/24ч"""
+    return {
+        "client_id": client_id,
+        "destination_id": destination_id,
+        "velocity": VelocityIndex.get_features(client_id, destination_id)
+    }
+
+
+@router.get("/{client_id}")
+async def get_client_features(
+        client_id: str,
+        at: Optional[datetime] = Query(None, description="Момент расчёта, по умолчанию сейчас")
+):
+    """Поведенческие признаки клиента, рассчитанные из событий"""
+    try:
+        features = FeatureStore.get_features(client_id, at)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if features is None:
+        raise HTTPException(status_code=404, detail="Нет событий по клиенту")
+
+    return {
+        "client_id": client_id,
+        "features": {name: None if math.isnan(value) else value for name, value in features.items()}
+    }
@@ -1,35 +1,96 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Dict, List
+import asyncio
 import uuid
 
 from api.schemas import (
     TransactionPredictRequest,
     TransactionPredictResponse,
+    ClientPredictRequest,
     BatchPredictRequest,
     BatchPredictResponse,
+    ColumnarBatchRequest,
     RiskLevel
 )
+from api.responses import DuplexStreamingResponse, FastJSONResponse, loads
+from core.config import settings
 from core.database import get_db
+from core.admin import require_admin
+from core.request_profiler import RequestProfiler
+from ml.cascade import CascadeStats
+from ml.model_loader import ModelLoader
 from ml.predictor import FraudPredictor
+from ml.shadow import ShadowScorer
+from services.columnar_scoring import ColumnarScoring
 from services.fraud_service import FraudService
+from services.overload import CHEAP, MODE_HEADER, RULES_ONLY, OverloadGuard, ScoringTicket
+from services.rules_engine import RulesEngine
+from services.stream_scoring import StreamScoring
+from services.velocity_index import VelocityIndex
+from services.worker_stats import WorkerStats
 
 router = APIRouter()
 
+predict_guard = OverloadGuard.dependency("predict")
+batch_guard = OverloadGuard.dependency("batch")
+columnar_guard = OverloadGuard.dependency("columnar")
+stream_guard = OverloadGuard.dependency("stream")
+
+
+def require_single_worker():
+    """Запрос подменяет модели только в воркере, который его получил: при нескольких воркерах
+    они разошлись бы по версиям. Там модели подменяются файлами в trained_model/ — каталог
+    наблюдает каждый воркер
+    """
+    if WorkerStats.workers > 1:
+        raise HTTPException(
+            status_code=409,
+            detail="Несколько воркеров: замените файлы в trained_model/, модели подхватит каждый воркер"
+        )
+
+
+def _with_resolved_features(request: TransactionPredictRequest) -> TransactionPredictRequest:
+    features = request.dict()
+    with RequestProfiler.stage("features"):
+        missing = FraudService.resolve_missing_features(features)
+    if missing:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Не переданы признаки и клиент не найден в кэше: {', '.join(missing)}"
+        )
+    return TransactionPredictRequest(**features)
+
+
+def _predict(features_list: List[Dict], ticket: ScoringTicket, explain: bool) -> List[Dict]:
+    """Скоринг в режиме, выбранном OverloadGuard"""
+    if ticket.mode == RULES_ONLY:
+        return FraudService.predict_rules_only(features_list)
+
+    model_name = settings.OVERLOAD_CHEAP_MODEL if ticket.mode == CHEAP else None
+    return FraudPredictor(model_name=model_name).predict_batch(features_list, explain=explain)
+
 
 @router.post("/predict", response_model=TransactionPredictResponse)
 async def predict_fraud(
         request: TransactionPredictRequest,
         background_tasks: BackgroundTasks,
-        db: Session = Depends(get_db)
+        explain: bool = Query(False, description="Вклады признаков в предсказание"),
+        db: Session = Depends(get_db),
+        ticket: ScoringTicket = Depends(predict_guard)
 ):
     """Индикатор мошенничества для одной транзакции"""
+    request = _with_resolved_features(request)
+
     try:
-        predictor = FraudPredictor()
-        prediction = predictor.predict_single(request.dict())
+        features = request.dict()
+        features.update(VelocityIndex.observe(request.client_id, request.destination_id, request.amount))
+
+        prediction = _predict([features], ticket, explain)[0]
         risk_level = FraudService.determine_risk_level(prediction['fraud_probability'])
 
-        reasons = FraudService.generate_fraud_reasons(request.dict(), prediction['fraud_probability'])
+        reasons, reason_mask = FraudService.generate_fraud_reasons(features, prediction['fraud_probability'])
 
         response = TransactionPredictResponse(
             transaction_id=str(uuid.uuid4()),
@@ -38,15 +99,22 @@ async def predict_fraud(
             risk_level=risk_level,
             reasons=reasons,
             model_version=prediction.get('model_version', '1.0'),
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            explanation=prediction.get('explanation'),
+            scoring_mode=ticket.mode
         )
 
-        background_tasks.add_task(
-            FraudService.save_transaction,
-            db=db,
-            request=request,
-            response=response
-        )
+        if ticket.persist_now:
+            OverloadGuard.schedule_write(
+                background_tasks,
+                FraudService.save_transaction,
+                db=db,
+                request=request,
+                response=response,
+                reason_mask=reason_mask
+            )
+        else:
+            OverloadGuard.spill([FraudService.build_transaction_record(request.dict(), response, reason_mask)])
 
         return response
 
@@ -54,24 +122,54 @@ async def predict_fraud(
         raise HTTPException(status_code=500, detail=f"Ошибка предсказания: {str(e)}")
 
 
+@router.post("/predict/client", response_model=TransactionPredictResponse)
+async def predict_fraud_by_client(
+        request: ClientPredictRequest,
+        background_tasks: BackgroundTasks,
+        explain: bool = Query(False, description="Вклады признаков в предсказание"),
+        db: Session = Depends(get_db),
+        ticket: ScoringTicket = Depends(predict_guard)
+):
+    """Индикатор мошенничества по client_id и сумме: признаки из хранилища признаков или кэша профилей"""
+    transaction = TransactionPredictRequest(
+        amount=request.amount,
+        client_id=request.client_id,
+        destination_id=request.destination_id
+    )
+    return await predict_fraud(transaction, background_tasks, explain, db, ticket)
+
+
 @router.post("/batch", response_model=BatchPredictResponse)
 async def batch_predict(
         request: BatchPredictRequest,
         background_tasks: BackgroundTasks,
-        db: Session = Depends(get_db)
+        explain: bool = Query(False, description="Вклады признаков в предсказание"),
+        db: Session = Depends(get_db),
+        ticket: ScoringTicket = Depends(batch_guard)
 ):
     """Массовая детекция мошенничества"""
     if len(request.transactions) > 1000:
         raise HTTPException(status_code=400, detail="Максимум 1000 транзакций за раз")
+    OverloadGuard.charge(ticket, len(request.transactions))
 
-    try:
-        predictor = FraudPredictor()
-        results = []
+    request.transactions = [_with_resolved_features(trans) for trans in request.transactions]
 
+    try:
+        features_list = []
         for trans in request.transactions:
-            prediction = predictor.predict_single(trans.dict())
+            features = trans.dict()
+            features.update(VelocityIndex.observe(trans.client_id, trans.destination_id, trans.amount))
+            features_list.append(features)
+
+        predictions = _predict(features_list, ticket, explain)
+        reasons_list, masks = FraudService.generate_fraud_reasons_batch(
+            features_list,
+            [prediction['fraud_probability'] for prediction in predictions]
+        )
+
+        results = []
+        for prediction, reasons in zip(predictions, reasons_list):
             risk_level = FraudService.determine_risk_level(prediction['fraud_probability'])
-            reasons = FraudService.generate_fraud_reasons(trans.dict(), prediction['fraud_probability'])
 
             result = TransactionPredictResponse(
                 transaction_id=str(uuid.uuid4()),
@@ -80,7 +178,9 @@ async def batch_predict(
                 risk_level=risk_level,
                 reasons=reasons,
                 model_version=prediction.get('model_version', '1.0'),
-                timestamp=datetime.utcnow()
+                timestamp=datetime.utcnow(),
+                explanation=prediction.get('explanation'),
+                scoring_mode=ticket.mode
             )
             results.append(result)
 
@@ -92,17 +192,165 @@ async def batch_predict(
             total_transactions=total,
             fraud_detected=fraud_count,
             fraud_rate=fraud_count / total if total > 0 else 0,
-            processed_at=datetime.utcnow()
+            processed_at=datetime.utcnow(),
+            scoring_mode=ticket.mode
         )
 
-        background_tasks.add_task(
-            FraudService.save_batch_transactions,
-            db=db,
-            transactions=request.transactions,
-            results=results
-        )
+        if ticket.persist_now:
+            OverloadGuard.schedule_write(
+                background_tasks,
+                FraudService.save_batch_transactions,
+                db=db,
+                transactions=request.transactions,
+                results=results,
+                masks=masks
+            )
+        else:
+            OverloadGuard.spill([
+                FraudService.build_transaction_record(trans.dict(), result, mask)
+                for trans, result, mask in zip(request.transactions, results, masks)
+            ])
 
         return response
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка пакетного предсказания: {str(e)}")
+
+
+@router.post(
+    "/batch/columnar",
+    response_class=FastJSONResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": ColumnarBatchRequest.model_json_schema()}}
+        }
+    }
+)
+async def batch_predict_columnar(
+        request: Request,
+        background_tasks: BackgroundTasks,
+        persist: bool = Query(False, description="Сохранить транзакции в БД"),
+        db: Session = Depends(get_db),
+        ticket: ScoringTicket = Depends(columnar_guard)
+):
+    """Пакетный скоринг по колонкам: массив на признак в запросе, массивы вероятностей,
+    флагов, уровней риска и масок причин в ответе. До COLUMNAR_BATCH_MAX_ROWS строк.
+    """
+    body = await request.body()
+    try:
+        payload = loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный JSON: {str(e)}")
+    if isinstance(payload, dict) and isinstance(payload.get("amount"), list):
+        OverloadGuard.charge(ticket, len(payload["amount"]))
+
+    try:
+        # Разбор и скоринг сотен тысяч строк — в потоке, цикл событий продолжает обслуживать запросы
+        response, records = await asyncio.to_thread(ColumnarScoring.run, payload, ticket, persist)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка пакетного предсказания: {str(e)}")
+
+    if records:
+        if ticket.persist_now:
+            OverloadGuard.schedule_write(background_tasks, FraudService.save_transactions_bulk, db=db, records=records)
+        else:
+            OverloadGuard.spill(records)
+
+    return FastJSONResponse(response, headers={MODE_HEADER: ticket.mode})
+
+
+@router.post(
+    "/stream",
+    response_class=DuplexStreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/x-ndjson": {"schema": {"type": "string", "format": "binary"}}}
+        }
+    }
+)
+async def stream_predict(
+        request: Request,
+        persist: bool = Query(False, description="Сохранять транзакции в БД пачками"),
+        ticket: ScoringTicket = Depends(stream_guard)
+):
+    """Потоковый скоринг: транзакции строками NDJSON в теле запроса, результаты строками NDJSON
+    по мере готовности микропачек. Память не зависит от длины потока.
+    """
+    # Билет в работе, пока передаётся тело ответа: освобождает его score_stream
+    ticket.detached = True
+    return DuplexStreamingResponse(
+        StreamScoring.score_stream(request.stream(), ticket, persist),
+        media_type="application/x-ndjson",
+        headers={MODE_HEADER: ticket.mode}
+    )
+
+
+@router.get("/cascade/stats")
+async def get_cascade_stats():
+    """Доля транзакций, дошедших до второй модели каскада, и время этапов"""
+    return CascadeStats.get_stats()
+
+
+@router.get("/models")
+async def get_models():
+    """Действующий снимок моделей и история перезагрузок"""
+    return ModelLoader.get_stats()
+
+
+@router.post("/models/reload", dependencies=[Depends(require_admin), Depends(require_single_worker)])
+async def reload_models():
+    """Загрузить trained_model/, проверить на эталонном наборе и подменить без остановки сервиса"""
+    result = await asyncio.to_thread(ModelLoader.reload, "api")
+    if result["status"] == "in_progress":
+        raise HTTPException(status_code=409, detail="Перезагрузка моделей уже выполняется")
+    if result["status"] != "success":
+        raise HTTPException(status_code=422, detail=f"Новые модели отклонены, оставлены прежние: {result['error']}")
+    return result
+
+
+@router.post("/models/rollback", dependencies=[Depends(require_admin), Depends(require_single_worker)])
+async def rollback_models():
+    """Вернуть предыдущий снимок моделей"""
+    try:
+        return ModelLoader.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/overload/stats")
+async def get_overload_stats():
+    """Очередь, EWMA задержек по режимам, текущий режим, буфер отложенных записей и лимитер"""
+    return OverloadGuard.get_stats()
+
+
+@router.get("/shadow/stats")
+async def get_shadow_stats():
+    """Сравнение теневых моделей-претендентов с активной моделью на живом трафике"""
+    return ShadowScorer.get_stats()
+
+
+@router.post("/shadow/reset", dependencies=[Depends(require_admin)])
+async def reset_shadow_stats():
+    """Сбросить накопленное сравнение, например после смены активной модели"""
+    ShadowScorer.reset()
+    return {"status": "success"}
+
+
+@router.get("/rules")
+async def get_fraud_rules():
+    """Действующие правила причин"""
+    return RulesEngine.get_stats()
+
+
+@router.post("/rules/reload", dependencies=[Depends(require_admin)])
+async def reload_fraud_rules():
+    """Перечитать файл правил без перезапуска"""
+    try:
+        count = RulesEngine.load()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка в файле правил, оставлены прежние: {str(e)}")
+    return {"status": "success", "rules": count}
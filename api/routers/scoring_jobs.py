@@ -0,0 +1,156 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from api.responses import FastJSONResponse, dumps, loads
+from api.schemas import JobStatus, ScoringJobRequest
+from core.config import settings
+from core.database import SessionLocal, get_db
+from models.database import ScoringJob
+from services.job_manager import JobManager
+from services.scoring_jobs import ScoringJobService
+
+router = APIRouter()
+
+
+def _get_job_or_404(db: Session, job_id: str) -> ScoringJob:
+    job = db.query(ScoringJob).filter(ScoringJob.job_id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@router.post(
+    "/",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": ScoringJobRequest.model_json_schema()}}
+        }
+    }
+)
+async def submit_scoring_job(request: Request, db: Session = Depends(get_db)):
+    """Поставить набор данных в очередь пакетного скоринга; ответ — сразу, с job_id"""
+    body = await request.body()
+    try:
+        payload = loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный JSON: {str(e)}")
+
+    # Разбор колонок и запись входа inline-задачи — в потоке
+    job = await asyncio.to_thread(ScoringJobService.create, db, payload)
+    ScoringJobService.start(job)
+
+    return {
+        "message": "Задача скоринга поставлена в очередь",
+        **ScoringJobService.to_dict(job),
+    }
+
+
+@router.get("/")
+async def list_scoring_jobs(
+        status: Optional[JobStatus] = Query(None, description="Фильтр по статусу"),
+        db: Session = Depends(get_db)
+):
+    """Последние задачи скоринга"""
+    query = db.query(ScoringJob)
+    if status is not None:
+        query = query.filter(ScoringJob.status == status.value)
+    jobs = query.order_by(ScoringJob.id.desc()).limit(settings.JOBS_HISTORY_LIMIT).all()
+    return {
+        "jobs": [ScoringJobService.to_dict(job) for job in jobs],
+        "total": len(jobs),
+    }
+
+
+@router.get("/{job_id}")
+async def get_scoring_job(job_id: str, db: Session = Depends(get_db)):
+    """Статус, прогресс, пропускная способность и оценка оставшегося времени"""
+    job = _get_job_or_404(db, job_id)
+    return {
+        **ScoringJobService.to_dict(job),
+        "available_rows": ScoringJobService.available_rows(db, job),
+    }
+
+
+@router.get("/{job_id}/results", response_class=FastJSONResponse)
+async def get_scoring_job_results(
+        job_id: str,
+        after: int = Query(-1, ge=-1, description="Курсор: номер последней полученной строки"),
+        limit: int = Query(1000, ge=1, le=settings.SCORING_JOB_PAGE_MAX_ROWS),
+        fraud_only: bool = Query(False, description="Только мошеннические"),
+        db: Session = Depends(get_db)
+):
+    """Страница результатов по номеру строки входа. Пока задача идёт, отдаются строки
+    от начала входа, все пачки которых уже записаны.
+    """
+    job = _get_job_or_404(db, job_id)
+    results, next_after = await asyncio.to_thread(
+        ScoringJobService.get_results, db, job, after, limit, fraud_only
+    )
+    return FastJSONResponse({
+        "job_id": job_id,
+        "status": job.status,
+        "results": results,
+        "count": len(results),
+        "next_after": next_after,
+    })
+
+
+@router.get("/{job_id}/results/stream")
+async def stream_scoring_job_results(
+        job_id: str,
+        fraud_only: bool = Query(False, description="Только мошеннические"),
+        db: Session = Depends(get_db)
+):
+    """Все результаты строками NDJSON; для идущей задачи поток продолжается по мере записи пачек"""
+    _get_job_or_404(db, job_id)
+
+    def next_page(after: int):
+        session = SessionLocal()
+        try:
+            job = _get_job_or_404(session, job_id)
+            results, _ = ScoringJobService.get_results(
+                session, job, after, settings.SCORING_JOB_PAGE_MAX_ROWS, fraud_only
+            )
+            available = ScoringJobService.available_rows(session, job)
+            return results, job.status, available
+        finally:
+            session.close()
+
+    async def lines():
+        after = -1
+        while True:
+            results, status, available = await asyncio.to_thread(next_page, after)
+            if results:
+                after = results[-1]["row_number"]
+                yield b"".join(dumps(result) + b"\n" for result in results)
+                continue
+            # Страница пуста: для идущей задачи ждём следующую пачку, иначе всё отдано
+            if status not in (JobStatus.PENDING.value, JobStatus.RUNNING.value):
+                return
+            after = max(after, available - 1)
+            await asyncio.sleep(1.0)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.delete("/{job_id}")
+async def cancel_scoring_job(
+        job_id: str,
+        purge: bool = Query(False, description="Удалить задачу вместе с результатами"),
+        db: Session = Depends(get_db)
+):
+    """Отмена задачи; записанные пачки остаются, с purge=true удаляются вместе с задачей"""
+    job = _get_job_or_404(db, job_id)
+    ScoringJobService.cancel(db, job)
+    if purge:
+        background = JobManager.get(job_id)
+        if background is not None and background.task is not None and not background.task.done():
+            raise HTTPException(status_code=409, detail="Задача ещё останавливается, повторите удаление позже")
+        await asyncio.to_thread(ScoringJobService.purge, db, job)
+        return {"message": "Задача и её результаты удалены", "job_id": job_id}
+    return {"message": "Задача отменена", "job_id": job_id, "status": job.status}
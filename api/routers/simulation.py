@@ -1,16 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from datetime import datetime
-import asyncio
 
 from api.schemas import (
     SimulateTransactionRequest,
     SimulateTransactionResponse,
     StreamTransactionsRequest,
+    ReplayRequest,
     GeneratedTransaction,
     TransactionType,
 )
+from core.config import settings
 from core.database import get_db
+from services.job_manager import JobManager
+from services.replay_service import ReplayService
 from services.simulation_service import SimulationService
 
 router = APIRouter()
@@ -72,42 +75,137 @@ async def generate_transactions(
 
 
 
+STREAM_JOB_KIND = "stream"
+REPLAY_JOB_KIND = "replay"
+
+
+def _get_job_or_404(job_id: str, kind: str):
+    job = JobManager.get(job_id)
+    if job is None or job.kind != kind:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+def _list_jobs(kind: str) -> dict:
+    jobs = JobManager.list(kind)
+    return {
+        "jobs": [job.to_dict() for job in jobs],
+        "active": sum(1 for job in jobs if job.is_active),
+        "total": len(jobs)
+    }
+
+
 @router.post("/stream")
-async def start_transaction_stream(
-        request: StreamTransactionsRequest,
-        background_tasks: BackgroundTasks
-):
+async def start_transaction_stream(request: StreamTransactionsRequest):
     """Запуск потока транзакций в реальном времени"""
-    if request.transactions_per_minute > 100:
-        raise HTTPException(status_code=400, detail="Максимум 100 транзакций в минуту")
+    if request.transactions_per_minute > settings.STREAM_MAX_TRANSACTIONS_PER_MINUTE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Максимум {settings.STREAM_MAX_TRANSACTIONS_PER_MINUTE} транзакций в минуту"
+        )
 
     if request.duration_minutes > 60:
         raise HTTPException(status_code=400, detail="Максимум 60 минут")
 
+    if JobManager.count_active(STREAM_JOB_KIND) >= settings.STREAM_MAX_CONCURRENT_JOBS:
+        raise HTTPException(status_code=429, detail="Слишком много активных потоков")
+
     total_transactions = request.transactions_per_minute * request.duration_minutes
+    config = {
+        "transactions_per_minute": request.transactions_per_minute,
+        "duration_minutes": request.duration_minutes,
+        "total_expected": total_transactions,
+        "fraud_ratio": request.fraud_ratio,
+        "transaction_type": request.transaction_type.value,
+        "batch_size": request.batch_size,
+        "persist": request.persist
+    }
 
-    asyncio.create_task(
-        SimulationService.stream_transactions(
+    job = JobManager.submit(
+        STREAM_JOB_KIND,
+        config,
+        lambda job: SimulationService.stream_transactions(
+            job,
             transactions_per_minute=request.transactions_per_minute,
             duration_minutes=request.duration_minutes,
             fraud_ratio=request.fraud_ratio,
+            transaction_type=request.transaction_type,
+            batch_size=request.batch_size,
+            persist=request.persist,
         )
     )
 
     return {
         "status": "started",
         "message": "Поток транзакций запущен",
-        "config": {
-            "transactions_per_minute": request.transactions_per_minute,
-            "duration_minutes": request.duration_minutes,
-            "total_expected": total_transactions,
-            "fraud_ratio": request.fraud_ratio
-        },
+        "job_id": job.job_id,
+        "config": config,
         "started_at": datetime.utcnow()
+    }
+
+
+@router.get("/stream")
+async def list_transaction_streams():
+    """Список потоков транзакций"""
+    return _list_jobs(STREAM_JOB_KIND)
+
 
+@router.get("/stream/{job_id}")
+async def get_transaction_stream(job_id: str):
+    """Статус и прогресс потока транзакций"""
+    return _get_job_or_404(job_id, STREAM_JOB_KIND).to_dict()
+
+
+@router.delete("/stream/{job_id}")
+async def stop_transaction_stream(job_id: str):
+    """Остановка потока транзакций"""
+    _get_job_or_404(job_id, STREAM_JOB_KIND)
+    JobManager.cancel(job_id)
+    return {"message": "Поток остановлен", "job_id": job_id}
+
+
+@router.post("/replay")
+async def start_replay(request: ReplayRequest):
+    """Воспроизведение исторических транзакций из data/ через скоринг и запись в БД"""
+    if JobManager.count_active(REPLAY_JOB_KIND) >= settings.REPLAY_MAX_CONCURRENT_JOBS:
+        raise HTTPException(status_code=429, detail="Слишком много активных воспроизведений")
+
+    config = request.dict()
+    job = JobManager.submit(
+        REPLAY_JOB_KIND,
+        config,
+        lambda job: ReplayService.replay(job, **config)
+    )
+
+    return {
+        "status": "started",
+        "message": "Воспроизведение запущено",
+        "job_id": job.job_id,
+        "config": config,
+        "started_at": datetime.utcnow()
     }
 
 
+@router.get("/replay")
+async def list_replays():
+    """Список воспроизведений"""
+    return _list_jobs(REPLAY_JOB_KIND)
+
+
+@router.get("/replay/{job_id}")
+async def get_replay(job_id: str):
+    """Прогресс, пропускная способность и precision/recall воспроизведения"""
+    return _get_job_or_404(job_id, REPLAY_JOB_KIND).to_dict()
+
+
+@router.delete("/replay/{job_id}")
+async def stop_replay(job_id: str):
+    """Остановка воспроизведения"""
+    _get_job_or_404(job_id, REPLAY_JOB_KIND)
+    JobManager.cancel(job_id)
+    return {"message": "Воспроизведение остановлено", "job_id": job_id}
+
+
 @router.get("/templates")
 async def get_transaction_templates():
     """Шаблоны транзакций"""
@@ -4,8 +4,9 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 
 from api.schemas import TransactionResponse, TransactionFilter
-from core.database import get_db
-from models.database import Transaction as DBTransaction
+from core.database import get_db, get_read_db
+from models.database import Transaction as DBTransaction, TransactionReason
+from services.rules_engine import RulesEngine
 from services.transaction_service import TransactionService
 
 router = APIRouter()
@@ -21,9 +22,16 @@ async def get_transactions(
         max_amount: Optional[float] = Query(None, description="Максимальная сумма"),
         start_date: Optional[datetime] = Query(None, description="Начало периода"),
         end_date: Optional[datetime] = Query(None, description="Конец периода"),
-        db: Session = Depends(get_db)
+        reason: Optional[str] = Query(None, description="Код причины из rules/fraud_rules.json"),
+        db: Session = Depends(get_read_db)
 ):
     """Получение списка транзакций"""
+    reason_bit = None
+    if reason:
+        reason_bit = RulesEngine.bit_for_code(reason)
+        if reason_bit is None:
+            raise HTTPException(status_code=400, detail=f"Неизвестный код причины: {reason}")
+
     try:
         transactions = TransactionService.get_filtered_transactions(
             db=db,
@@ -34,7 +42,8 @@ async def get_transactions(
             min_amount=min_amount,
             max_amount=max_amount,
             start_date=start_date,
-            end_date=end_date
+            end_date=end_date,
+            reason_bit=reason_bit
         )
         return transactions
     except Exception as e:
@@ -70,6 +79,7 @@ async def delete_transaction(
     if not transaction:
         raise HTTPException(status_code=404, detail="Транзакция не найдена")
 
+    db.query(TransactionReason).filter(TransactionReason.transaction_id == transaction_id).delete()
     db.delete(transaction)
     db.commit()
 
@@ -79,7 +89,7 @@ async def delete_transaction(
 @router.get("/stats/summary")
 async def get_transactions_summary(
         days: int = Query(7, ge=1, le=365, description="Период в днях"),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """Сводная статистика транзакций"""
     start_date = datetime.utcnow() - timedelta(days=days)
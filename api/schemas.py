@@ -17,28 +17,37 @@ class TransactionType(str, Enum):
     FRAUD = "fraud"
     MIXED = "mixed"
 
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
 class TransactionPredictRequest(BaseModel):
 
     amount: float = Field(..., description="Сумма транзакции", ge=0)
     client_id: Optional[str] = Field(None, description="ID клиента")
-
-    os_ver_count_30d: float = Field(..., description="Количество версий ОС за 30 дней")
-    phone_model_count_30d: float = Field(..., description="Количество моделей телефона за 30 дней")
-    logins_7d: float = Field(..., description="Количество логинов за 7 дней")
-    logins_30d: float = Field(..., description="Количество логинов за 30 дней")
-    logins_per_day_7: float = Field(..., description="Логины в день за 7 дней")
-    logins_per_day_30: float = Field(..., description="Логины в день за 30 дней")
-
-    rel_change_7_vs_30: float = Field(..., description="Относительное изменение частоты логинов")
-    share_7_of_30: float = Field(..., description="Доля логинов 7д от 30д")
-    mean_interval_30d: float = Field(..., description="Средний интервал между сессиями (сек)")
-    std_interval_30d: float = Field(..., description="Стандартное отклонение интервалов")
-    var_interval_30d: float = Field(..., description="Дисперсия интервалов")
-    ewm_interval_7d: float = Field(..., description="Экспоненциально взвешенное среднее")
-
-    burstiness: float = Field(..., description="Показатель взрывности логинов")
-    fano_factor: float = Field(..., description="Fano-фактор интервалов")
-    z_score_7d_vs_30d: float = Field(..., description="Z-скор среднего интервала")
+    destination_id: Optional[str] = Field(None, description="ID получателя")
+
+    os_ver_count_30d: Optional[float] = Field(None, description="Количество версий ОС за 30 дней")
+    phone_model_count_30d: Optional[float] = Field(None, description="Количество моделей телефона за 30 дней")
+    logins_7d: Optional[float] = Field(None, description="Количество логинов за 7 дней")
+    logins_30d: Optional[float] = Field(None, description="Количество логинов за 30 дней")
+    logins_per_day_7: Optional[float] = Field(None, description="Логины в день за 7 дней")
+    logins_per_day_30: Optional[float] = Field(None, description="Логины в день за 30 дней")
+
+    rel_change_7_vs_30: Optional[float] = Field(None, description="Относительное изменение частоты логинов")
+    share_7_of_30: Optional[float] = Field(None, description="Доля логинов 7д от 30д")
+    mean_interval_30d: Optional[float] = Field(None, description="Средний интервал между сессиями (сек)")
+    std_interval_30d: Optional[float] = Field(None, description="Стандартное отклонение интервалов")
+    var_interval_30d: Optional[float] = Field(None, description="Дисперсия интервалов")
+    ewm_interval_7d: Optional[float] = Field(None, description="Экспоненциально взвешенное среднее")
+
+    burstiness: Optional[float] = Field(None, description="Показатель взрывности логинов")
+    fano_factor: Optional[float] = Field(None, description="Fano-фактор интервалов")
+    z_score_7d_vs_30d: Optional[float] = Field(None, description="Z-скор среднего интервала")
 
     class Config:
         json_schema_extra = {
@@ -64,6 +73,32 @@ class TransactionPredictRequest(BaseModel):
         }
 
 
+class ClientPredictRequest(BaseModel):
+    client_id: str = Field(..., description="ID клиента")
+    amount: float = Field(..., description="Сумма транзакции", ge=0)
+    destination_id: Optional[str] = Field(None, description="ID получателя")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "client_id": "12345",
+                "amount": 1500000
+            }
+        }
+
+
+class FeatureContribution(BaseModel):
+    feature: str
+    value: float = Field(..., description="Значение признака после заполнения пропусков")
+    contribution: float
+
+
+class PredictionExplanation(BaseModel):
+    base_value: float = Field(..., description="Выход модели без учёта признаков")
+    output_space: str = Field(..., description="log_odds или probability")
+    contributions: List[FeatureContribution] = Field(..., description="По убыванию модуля вклада")
+
+
 class TransactionPredictResponse(BaseModel):
     transaction_id: str
     fraud_probability: float = Field(..., ge=0, le=1)
@@ -72,6 +107,8 @@ class TransactionPredictResponse(BaseModel):
     reasons: List[str] = Field(default_factory=list)
     model_version: str = "1.0"
     timestamp: datetime
+    explanation: Optional[PredictionExplanation] = None
+    scoring_mode: str = Field("full", description="full, spill, cheap или rules_only — режим под нагрузкой")
 
 
     class Config:
@@ -102,6 +139,35 @@ class BatchPredictResponse(BaseModel):
     fraud_detected: int
     fraud_rate: float
     processed_at: datetime
+    scoring_mode: str = "full"
+
+class ColumnarBatchRequest(BaseModel):
+    """Только для документации: тело /batch/columnar разбирается и проверяется по колонкам без pydantic"""
+    amount: List[float] = Field(..., description="Суммы транзакций; длина задаёт число строк")
+    client_id: Optional[List[Optional[str]]] = Field(None, description="Для дополнения признаков из кэша профилей")
+    destination_id: Optional[List[Optional[str]]] = None
+    os_ver_count_30d: Optional[List[Optional[float]]] = Field(
+        None, description="И так далее для каждого признака модели и скоростей; null — пропуск"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "amount": [1500000, 25000],
+                "client_id": ["450680838", "12345"],
+                "os_ver_count_30d": [5, None],
+                "logins_30d": [2, 40]
+            }
+        }
+
+
+class ScoringJobRequest(BaseModel):
+    source: str = Field("inline", description="inline (колонки в columns), data (весь набор из data/) или файл .csv/.parquet из data/")
+    columns: Optional[ColumnarBatchRequest] = Field(None, description="Вход inline: массив на признак, как в /batch/columnar")
+    chunk_size: Optional[int] = Field(None, ge=100, le=200_000, description="Строк в пачке (по умолчанию SCORING_JOB_CHUNK_SIZE); пачка — единица контрольной точки")
+    model_name: Optional[str] = Field(None, description="Модель из ModelLoader, по умолчанию активная")
+    threshold: Optional[float] = Field(None, ge=0, le=1, description="Порог мошенничества, по умолчанию DEFAULT_FRAUD_THRESHOLD")
+
 
 class SimulateTransactionRequest(BaseModel):
     count: int = Field(10, ge=1, le=500, description="Количество транзакций")
@@ -134,13 +200,33 @@ class SimulateTransactionResponse(BaseModel):
 
 
 class StreamTransactionsRequest(BaseModel):
-    transactions_per_minute: int = Field(10, ge=1, le=100)
+    transactions_per_minute: int = Field(10, ge=1, le=600_000)
     duration_minutes: int = Field(5, ge=1, le=60)
     fraud_ratio: float = Field(0.1, ge=0, le=1)
     transaction_type: TransactionType = Field(
         TransactionType.MIXED,
         description="Тип транзакций в потоке"
     )
+    batch_size: int = Field(500, ge=1, le=10_000, description="Максимальный размер пачки скоринга и записи")
+    persist: bool = Field(True, description="Сохранять транзакции в БД")
+
+
+class ReplayRequest(BaseModel):
+    speedup: float = Field(0, ge=0, description="Ускорение относительно реального времени, 0 — максимальная скорость")
+    batch_size: int = Field(1000, ge=1, le=10_000, description="Максимальный размер пачки скоринга и записи")
+    persist: bool = Field(True, description="Сохранять транзакции в БД")
+    limit: Optional[int] = Field(None, ge=1, description="Ограничение количества транзакций")
+
+
+class LoginEvent(BaseModel):
+    client_id: str = Field(..., description="ID клиента")
+    timestamp: datetime = Field(..., description="Время сессии")
+    os_ver: Optional[str] = Field(None, description="Версия ОС, например Android/13")
+    phone_model: Optional[str] = Field(None, description="Модель телефона")
+
+
+class LoginEventsRequest(BaseModel):
+    events: List[LoginEvent] = Field(..., max_length=10000)
 
 
 class TransactionResponse(BaseModel):
@@ -150,6 +236,8 @@ class TransactionResponse(BaseModel):
     fraud_probability: Optional[float]
     is_fraud: Optional[bool]
     risk_level: Optional[str]
+    reasons: Optional[List[str]] = None
+    reason_mask: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -0,0 +1,23 @@
+import hmac
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from core.config import settings
+
+ADMIN_HEADER = "X-Admin-Token"
+
+
+def token_matches(header: Optional[str]) -> bool:
+    token = settings.ADMIN_TOKEN
+    return bool(token) and header is not None and hmac.compare_digest(header.encode(), token.encode())
+
+
+def require_admin(request: Request):
+    """Зависимость FastAPI для административных эндпоинтов и профилей: заголовок X-Admin-Token
+    со значением ADMIN_TOKEN. Без заданного токена доступ закрыт
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Административный доступ выключен: ADMIN_TOKEN не задан")
+    if not token_matches(request.headers.get(ADMIN_HEADER)):
+        raise HTTPException(status_code=403, detail=f"Нужен заголовок {ADMIN_HEADER} с административным токеном")
@@ -0,0 +1,102 @@
+import asyncio
+import gzip
+from typing import Optional, Set
+
+from core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(scope) -> Set[str]:
+    """Кодировки из Accept-Encoding запроса; с q=0 — не принимаются"""
+    header = b""
+    for name, value in scope.get("headers", []):
+        if name == b"accept-encoding":
+            header = value
+            break
+
+    encodings = set()
+    for item in header.decode("latin-1").lower().split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip() and quality > 0:
+            encodings.add(name.strip())
+    return encodings
+
+
+def compress_gzip(body: bytes, level: int = 9) -> bytes:
+    # mtime=0 — одинаковое содержимое даёт одинаковые байты
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compress_brotli(body: bytes) -> Optional[bytes]:
+    """None, если модуль brotli не установлен"""
+    return brotli.compress(body, quality=11) if brotli is not None else None
+
+
+class JSONCompressionMiddleware:
+    """gzip для JSON-ответов одним сообщением от GZIP_MIN_BYTES.
+
+    Потоковые ответы (SSE, NDJSON, постраничная выгрузка) не сжимаются: GzipFile копит данные
+    до закрытия, и события ленты задерживались бы. Уже сжатые ответы (статика /webapp)
+    проходят как есть. Тела от GZIP_THREAD_BYTES сжимаются в потоке, чтобы большой ответ
+    пакетного скоринга не останавливал цикл событий.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "gzip" not in accepted_encodings(scope):
+            await self.app(scope, receive, send)
+            return
+
+        pending = None
+
+        async def send_compressed(message):
+            nonlocal pending
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                if content_type.startswith(b"application/json") and b"content-encoding" not in headers:
+                    # Заголовки — после первого сообщения тела, когда станет ясно, сжимать ли
+                    pending = message
+                    return
+                await send(message)
+                return
+
+            if pending is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start, pending = pending, None
+            body = message.get("body", b"")
+            headers = [(name, value) for name, value in start.get("headers", []) if name != b"vary"]
+            vary = [value for name, value in start.get("headers", []) if name == b"vary"]
+            headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+
+            if message.get("more_body", False) or len(body) < settings.GZIP_MIN_BYTES:
+                await send({**start, "headers": headers})
+                await send(message)
+                return
+
+            if len(body) >= settings.GZIP_THREAD_BYTES:
+                body = await asyncio.to_thread(compress_gzip, body, settings.GZIP_LEVEL)
+            else:
+                body = compress_gzip(body, settings.GZIP_LEVEL)
+            headers = [(name, value) for name, value in headers if name != b"content-length"]
+            headers += [(b"content-encoding", b"gzip"), (b"content-length", str(len(body)).encode())]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
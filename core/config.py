@@ -9,6 +9,72 @@ class Settings(BaseSettings):
     API_PREFIX: str = "/api/v1"
 
     DATABASE_URL: str = "sqlite:///./forte_fraud.db"
+    # Чтения аналитики и списков: DATABASE_READ_URL — реплика (Postgres). Без неё для SQLite в WAL —
+    # отдельный пул только для чтения того же файла, при SQLITE_READ_SNAPSHOT_SECONDS > 0 — копия базы,
+    # обновляемая с этим периодом. Отставание больше DATABASE_READ_MAX_LAG_SECONDS (проверка раз в
+    # DATABASE_READ_CHECK_SECONDS) или ошибка движка чтения — чтения идут в основную базу
+    DATABASE_READ_URL: str = ""
+    DATABASE_READ_MAX_LAG_SECONDS: float = 30.0
+    DATABASE_READ_CHECK_SECONDS: float = 5.0
+    SQLITE_READ_SNAPSHOT_SECONDS: float = 0.0
+    # SQLite с несколькими воркерами: WAL — чтения не ждут записи, запись ждёт блокировку до таймаута
+    SQLITE_WAL: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 10_000
+
+    # python -m serve: воркеров (0 — по числу ядер), потоков BLAS/OpenMP на воркер.
+    # Больше одного — только с учётом состояния в памяти воркера (README, «Production-запуск»)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 1
+    WORKER_BLAS_THREADS: int = 1
+    WORKER_STATS_SECONDS: float = 5.0
+
+    # Прогрев после старта: строк в пачке прогона по путям скоринга; до его конца /ready — 503.
+    # Состояние компонентов проверяет фоновый опрос, /ready и /health отдают кэш; кэш старше
+    # READINESS_STALE_SECONDS считается сбоем (опрос не идёт — цикл событий занят или задача упала)
+    WARMUP_ENABLED: bool = True
+    WARMUP_BATCH_ROWS: int = 256
+    READINESS_PROBE_SECONDS: float = 5.0
+    READINESS_STALE_SECONDS: float = 30.0
+    # Цель холодного старта: от запуска процесса до первого 200 на /ready (замер — python -m serve --profile-startup)
+    STARTUP_TARGET_SECONDS: float = 3.0
+
+    # Административные эндпоинты (подмена моделей и правил, сброс теневого сравнения, /profiles):
+    # заголовок X-Admin-Token с этим значением. Пусто — доступ закрыт
+    ADMIN_TOKEN: str = ""
+
+    # Профилирование запросов: заголовок X-Profile со значением PROFILING_TOKEN (пусто — выключено)
+    # или доля запросов PROFILING_SAMPLE_RATE — cProfile запроса; ответы дольше PROFILING_SLOW_MS
+    # (0 — выключено, по умолчанию: иначе каждый запрос пишет этапы и время каждого SQL)
+    # сохраняются с временем этапов и SQL. Последние записи воркера — GET /profiles
+    PROFILING_TOKEN: str = ""
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_SLOW_MS: float = 0.0
+    PROFILING_BUFFER_SIZE: int = 100
+    PROFILING_MAX_SQL: int = 50
+    PROFILING_TOP_FUNCTIONS: int = 30
+    PROFILING_EXCLUDE_PATHS: List[str] = ["/profiles", "/live", "/ready", "/health", "/webapp", "/api/v1/events/stream"]
+
+    # Онлайн-лента /api/v1/events/stream (SSE): очередь кадров на подписчика (переполнение —
+    # сброс очереди и событие resync), пинг простаивающего соединения, лимит подписчиков на воркер,
+    # строк транзакций в одном событии, размер кадра при пересылке между воркерами
+    EVENTS_QUEUE_SIZE: int = 256
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    EVENTS_MAX_SUBSCRIBERS: int = 1000
+    EVENTS_MAX_ITEMS: int = 50
+    EVENTS_MAX_FRAME_BYTES: int = 200_000
+    EVENTS_RETRY_MS: int = 3000
+
+    # /api/v1/analytics/overview: ответов в кэше воркера (по ETag)
+    OVERVIEW_CACHE_SIZE: int = 32
+
+    # Статика /webapp: срок кэша файлов с хешем в имени, каталог сборки для обратного прокси
+    # (python -m core.static_assets). gzip JSON-ответов от GZIP_MIN_BYTES, от GZIP_THREAD_BYTES — в потоке
+    STATIC_MAX_AGE_SECONDS: int = 31_536_000
+    STATIC_BUILD_DIR: str = "dist"
+    GZIP_MIN_BYTES: int = 1024
+    GZIP_LEVEL: int = 6
+    GZIP_THREAD_BYTES: int = 256 * 1024
 
     REDIS_URL: str = "redis://localhost:6379"
 
@@ -26,7 +92,83 @@ class Settings(BaseSettings):
     ML_MODEL_PATH: str = "trained_model"
     DEFAULT_FRAUD_THRESHOLD: float = 0.5
 
+    # Горячая перезагрузка: опрос trained_model/, проверка на эталонном наборе из data/
+    MODEL_RELOAD_WATCH: bool = True
+    MODEL_RELOAD_CHECK_SECONDS: float = 10.0
+    MODEL_RELOAD_GOLDEN_ROWS: int = 5_000
+    MODEL_RELOAD_MIN_AUC: float = 0.7
+
+    # single — одна активная модель, cascade — первая модель для всех, вторая для полосы [LOW, HIGH]
+    SCORING_MODE: str = "single"
+    CASCADE_FIRST_MODEL: str = "LogisticRegression"
+    CASCADE_SECOND_MODEL: str = "GradientBoosting"
+    CASCADE_LOW: float = 0.2
+    CASCADE_HIGH: float = 1.0
+
+    # Претенденты, которые теневым образом оценивают выборку запросов, например ["LogisticRegression"]
+    SHADOW_MODELS: List[str] = []
+    SHADOW_SAMPLE_RATE: float = 0.1
+    SHADOW_QUEUE_SIZE: int = 256
+    SHADOW_BATCH_SIZE: int = 1024
+    SHADOW_MAX_ROWS_PER_SECOND: float = 2000
+
+    COLUMNAR_BATCH_MAX_ROWS: int = 1_000_000
+
+    DATA_CACHE_DIR: str = "data/.cache"
+    DATA_CSV_CHUNK_BYTES: int = 64 * 1024 * 1024
+    DATA_CSV_CHUNK_ROWS: int = 200_000
+
+    # Лимит запросов скоринга на клиента API (IP), токен-бакет; 0 — без лимита
     RATE_LIMIT_PER_MINUTE: int = 100
+    RATE_LIMIT_MAX_CLIENTS: int = 100_000
+
+    # Защита от перегрузки: бюджет ответа, если клиент не передал X-Deadline-Ms
+    OVERLOAD_DEFAULT_BUDGET_MS: float = 500
+    # Без деградации, пока очередь перед запросом не больше этой доли бюджета
+    OVERLOAD_HEADROOM: float = 0.5
+    OVERLOAD_MAX_IN_FLIGHT: int = 256
+    OVERLOAD_EWMA_ALPHA: float = 0.2
+    OVERLOAD_CHEAP_MODEL: str = "LogisticRegression"
+    # Вероятность в режиме rules_only: столько за каждое сработавшее правило
+    OVERLOAD_RULES_PROBABILITY_PER_REASON: float = 0.3
+    OVERLOAD_SPILL_MAX_ROWS: int = 100_000
+    OVERLOAD_SPILL_FLUSH_SECONDS: float = 1.0
+    OVERLOAD_SPILL_FLUSH_BATCH: int = 5_000
+
+    FRAUD_RULES_PATH: str = "rules/fraud_rules.json"
+    FRAUD_RULES_CHECK_SECONDS: float = 2.0
+    REASON_BACKFILL_BATCH: int = 5_000
+
+    FEATURE_STORE_MAX_CLIENTS: int = 1_000_000
+
+    VELOCITY_MAX_KEYS: int = 2_000_000
+
+    PROFILE_CACHE_MAX_CLIENTS: int = 2_000_000
+    PROFILE_CACHE_REFRESH_SECONDS: float = 300
+    PROFILE_CACHE_REFRESH_BATCH: int = 50_000
+
+    STREAM_MAX_TRANSACTIONS_PER_MINUTE: int = 600_000
+    STREAM_MAX_CONCURRENT_JOBS: int = 4
+    STREAM_MAX_BATCH_WAIT_SECONDS: float = 0.05
+    # NDJSON-скоринг /fraud/stream: микропачка, очередь кусков тела запроса, пачка записи в БД
+    STREAM_SCORING_BATCH_ROWS: int = 1_000
+    STREAM_SCORING_QUEUE_CHUNKS: int = 16
+    STREAM_SCORING_MAX_LINE_BYTES: int = 64 * 1024
+    STREAM_PERSIST_BATCH_ROWS: int = 5_000
+    REPLAY_MAX_CONCURRENT_JOBS: int = 1
+    JOBS_HISTORY_LIMIT: int = 100
+    # Задачи пакетного скоринга /api/v1/jobs: процессы пула на задачу, одновременные задачи,
+    # строк в пачке (контрольной точке), пересоздания пула после падения воркера
+    SCORING_JOB_WORKERS: int = 2
+    SCORING_JOB_MAX_CONCURRENT: int = 1
+    SCORING_JOB_CHUNK_SIZE: int = 10_000
+    SCORING_JOB_MAX_WORKER_RESTARTS: int = 3
+    # Сюда сохраняется вход inline-задач, чтобы их можно было продолжить после перезапуска
+    SCORING_JOB_INPUT_DIR: str = "data/.jobs"
+    SCORING_JOB_PAGE_MAX_ROWS: int = 10_000
+    # Аренда задачи процессом-владельцем: продлевается раз в треть срока; задачу с истёкшей
+    # арендой (владелец упал или завис) подхватывает любой воркер
+    SCORING_JOB_LEASE_SECONDS: float = 60.0
 
     class Config:
         env_file = ".env"
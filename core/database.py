@@ -1,6 +1,13 @@
-from sqlalchemy import create_engine
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event, exc, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 
 from core.config import settings
 
@@ -9,14 +16,227 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 )
 
+if settings.DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(connection, _):
+        cursor = connection.cursor()
+        if settings.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Откуда читают аналитика и списки
+PRIMARY = "primary"
+REPLICA = "replica"
+SQLITE_READER = "sqlite_reader"
+SQLITE_SNAPSHOT = "sqlite_snapshot"
+
+# Отставание реплики Postgres: 0, если всё полученное уже применено (иначе простаивающая
+# основная база выглядела бы как растущее отставание)
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def _create_read_engine():
+    """(режим, движок, путь копии SQLite) по настройкам"""
+    if settings.DATABASE_READ_URL:
+        read_engine = create_engine(
+            settings.DATABASE_READ_URL,
+            connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_READ_URL else {}
+        )
+        if read_engine.dialect.name == "postgresql":
+            @event.listens_for(read_engine, "connect")
+            def _read_only(connection, _):
+                cursor = connection.cursor()
+                cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+                cursor.close()
+        return REPLICA, read_engine, None
+
+    database = engine.url.database
+    if engine.dialect.name != "sqlite" or not database or database == ":memory:":
+        return PRIMARY, None, None
+
+    if settings.SQLITE_READ_SNAPSHOT_SECONDS > 0:
+        # Копия не меняется после записи: без пула каждая сессия открывает текущий файл
+        snapshot_path = os.path.abspath(database) + ".read-snapshot"
+        read_engine = create_engine(
+            f"sqlite:///file:{snapshot_path}?mode=ro&uri=true",
+            connect_args={"check_same_thread": False},
+            poolclass=NullPool
+        )
+        return SQLITE_SNAPSHOT, read_engine, snapshot_path
+
+    if not settings.SQLITE_WAL:
+        # Без WAL читатели того же файла всё равно блокируют запись — отдельный пул не поможет
+        return PRIMARY, None, None
+
+    read_engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+
+    @event.listens_for(read_engine, "connect")
+    def _sqlite_reader_pragmas(connection, _):
+        cursor = connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return SQLITE_READER, read_engine, None
+
+
+read_mode, read_engine, _snapshot_path = _create_read_engine()
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine is not None else None
+)
+
+
+class ReadRouting:
+    """Маршрутизация чтений аналитики и списков на отдельный движок.
+
+    Реплика (DATABASE_READ_URL), отдельный пул только для чтения того же файла SQLite в WAL
+    или копия SQLite, которую обновляет фоновая проверка раз в SQLITE_READ_SNAPSHOT_SECONDS.
+    Запросы дашборда не занимают соединения пула записи и не держат долгих чтений основной
+    базы. Проверка раз в DATABASE_READ_CHECK_SECONDS меряет отставание; пока оно больше
+    DATABASE_READ_MAX_LAG_SECONDS, проверки не было или движок чтения ответил ошибкой,
+    сессии чтения открываются в основной базе.
+    """
+
+    mode = read_mode
+    snapshot_path = _snapshot_path
+    healthy = False
+    lag_seconds: Optional[float] = None
+    error: Optional[str] = None
+    checked_at: Optional[float] = None
+    stats = {"read_sessions": 0, "fallback_sessions": 0, "read_errors": 0, "snapshots": 0}
+
+    @classmethod
+    def use_read_engine(cls) -> bool:
+        return read_engine is not None and cls.healthy
+
+    @classmethod
+    def refresh_snapshot(cls):
+        """Копия базы через backup API во временный файл и атомарная замена; из потока.
+        Воркеры serve.py обновляют копию независимо, одновременная замена безопасна
+        """
+        target = cls.snapshot_path
+        temporary = f"{target}.{os.getpid()}.tmp"
+        source = engine.raw_connection()
+        try:
+            destination = sqlite3.connect(temporary)
+            try:
+                source.driver_connection.backup(destination)
+                # Копия только читается: без WAL её можно открывать read-only без файлов -wal/-shm
+                destination.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                destination.close()
+        finally:
+            source.close()
+        os.replace(temporary, target)
+        cls.stats["snapshots"] += 1
+
+    @classmethod
+    def _snapshot_age(cls) -> Optional[float]:
+        try:
+            return time.time() - os.path.getmtime(cls.snapshot_path)
+        except OSError:
+            return None
+
+    @classmethod
+    def _measure_lag(cls) -> float:
+        if cls.mode == SQLITE_SNAPSHOT:
+            age = cls._snapshot_age()
+            if age is None:
+                raise RuntimeError("Копия базы для чтения ещё не создана")
+            return age
+
+        with read_engine.connect() as connection:
+            if read_engine.dialect.name == "postgresql":
+                return float(connection.execute(POSTGRES_LAG_SQL).scalar() or 0.0)
+            # SQLite в WAL видит последние записи; у других реплик отставание не измерить
+            connection.execute(text("SELECT 1"))
+            return 0.0
+
+    @classmethod
+    def check(cls):
+        """Обновить копию (если пора), измерить отставание; из потока"""
+        try:
+            if cls.mode == SQLITE_SNAPSHOT:
+                age = cls._snapshot_age()
+                if age is None or age >= settings.SQLITE_READ_SNAPSHOT_SECONDS:
+                    cls.refresh_snapshot()
+            lag = cls._measure_lag()
+            cls.lag_seconds = lag
+            cls.healthy = lag <= settings.DATABASE_READ_MAX_LAG_SECONDS
+            cls.error = None if cls.healthy else f"Отставание {lag:.1f} с"
+        except Exception as e:
+            cls.healthy = False
+            cls.error = str(e)
+        cls.checked_at = time.monotonic()
+
+    @classmethod
+    async def check_periodically(cls):
+        if read_engine is None:
+            return
+        interval = settings.DATABASE_READ_CHECK_SECONDS
+        if cls.mode == SQLITE_SNAPSHOT:
+            interval = min(interval, settings.SQLITE_READ_SNAPSHOT_SECONDS)
+        while True:
+            await asyncio.to_thread(cls.check)
+            await asyncio.sleep(interval)
+
+    @classmethod
+    def open_session(cls) -> Session:
+        """Сессия для чтения: движок чтения, если он исправен, иначе основная база"""
+        if cls.use_read_engine():
+            cls.stats["read_sessions"] += 1
+            return ReadSessionLocal()
+        cls.stats["fallback_sessions"] += 1
+        return SessionLocal()
+
+    @classmethod
+    def mark_failed(cls, error: Exception):
+        """Ошибка соединения с движком чтения: следующие запросы — в основную базу до проверки"""
+        cls.stats["read_errors"] += 1
+        cls.healthy = False
+        cls.error = str(error)
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return {
+            "mode": cls.mode,
+            "active": cls.use_read_engine(),
+            "lag_seconds": None if cls.lag_seconds is None else round(cls.lag_seconds, 2),
+            "max_lag_seconds": settings.DATABASE_READ_MAX_LAG_SECONDS,
+            "error": cls.error,
+            **cls.stats,
+        }
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Сессия для маршрутов только на чтение (аналитика, списки); данные могут отставать
+    не больше чем на DATABASE_READ_MAX_LAG_SECONDS
+    """
+    db = ReadRouting.open_session()
+    try:
+        yield db
+    except Exception as e:
+        # Маршруты оборачивают ошибки БД в HTTPException — исходная ошибка в __context__
+        error = e if isinstance(e, exc.DBAPIError) else e.__context__
+        if isinstance(error, (exc.OperationalError, exc.InterfaceError)) and db.get_bind() is read_engine:
+            ReadRouting.mark_failed(error)
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,373 @@
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.config import settings
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Почему запрос попал в буфер
+HEADER = "header"    # заголовок X-Profile с PROFILING_TOKEN — cProfile
+SAMPLE = "sample"    # случайная выборка PROFILING_SAMPLE_RATE — cProfile
+SLOW = "slow"        # ответ дольше PROFILING_SLOW_MS — только этапы и SQL
+
+SQL_MAX_CHARS = 500
+
+# Профиль текущего запроса; asyncio.to_thread и фоновые задачи Starlette копируют контекст,
+# поэтому этапы и SQL из потоков попадают в профиль своего запроса
+_current: ContextVar[Optional["RequestCapture"]] = ContextVar("request_capture", default=None)
+_thread_state = threading.local()
+
+
+class RequestCapture:
+    """Этапы, SQL и cProfile одного запроса"""
+
+    def __init__(self, scope: Dict, trigger: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.trigger = trigger
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query = scope.get("query_string", b"").decode("latin-1")[:200]
+        self.status: Optional[int] = None
+        self.started = time.perf_counter()
+        self.responded: Optional[float] = None
+        self.captured_at = datetime.utcnow()
+
+        self.lock = threading.Lock()
+        # этап -> [вызовов, секунд]
+        self.stages: Dict[str, List] = {}
+        self.sql: List[Dict] = []
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+        # cProfile цикла событий и потоков, где шли этапы этого запроса
+        self.profiler: Optional[cProfile.Profile] = None
+        self.loop_thread = threading.get_ident()
+        self.thread_profiles: List[cProfile.Profile] = []
+        self.profile_skipped: Optional[str] = None
+
+    def add_stage(self, name: str, seconds: float):
+        with self.lock:
+            stage = self.stages.setdefault(name, [0, 0.0])
+            stage[0] += 1
+            stage[1] += seconds
+
+    def add_sql(self, statement: str, seconds: float, rows: int, executemany: bool):
+        with self.lock:
+            self.sql_count += 1
+            self.sql_seconds += seconds
+            if len(self.sql) < settings.PROFILING_MAX_SQL:
+                self.sql.append({
+                    "statement": " ".join(statement.split())[:SQL_MAX_CHARS],
+                    "ms": round(seconds * 1000, 3),
+                    "rows": rows if rows >= 0 else None,
+                    "executemany": executemany,
+                })
+
+    def start_thread_profile(self) -> Optional[cProfile.Profile]:
+        """cProfile для потока, в котором идёт этап профилируемого запроса; цикл событий уже профилируется"""
+        if self.profiler is None or threading.get_ident() == self.loop_thread:
+            return None
+        if getattr(_thread_state, "profiling", False):
+            return None
+        profiler = cProfile.Profile()
+        _thread_state.profiling = True
+        profiler.enable()
+        return profiler
+
+    def finish_thread_profile(self, profiler: cProfile.Profile):
+        profiler.disable()
+        _thread_state.profiling = False
+        with self.lock:
+            self.thread_profiles.append(profiler)
+
+
+class RequestProfiler:
+    """Профилирование запросов по требованию и запись медленных запросов.
+
+    Заголовок X-Profile со значением PROFILING_TOKEN или случайная выборка доли
+    PROFILING_SAMPLE_RATE запускают cProfile на время запроса: в цикле событий и в потоках,
+    где идут этапы запроса (RequestProfiler.stage). cProfile в процессе один, запрос,
+    пришедший во время чужого профиля, сохраняется без него. Для остальных запросов
+    собираются только время этапов и SQL, и запись остаётся, если ответ занял больше
+    PROFILING_SLOW_MS. Последние PROFILING_BUFFER_SIZE записей воркера — в кольцевом буфере.
+    """
+
+    buffer: deque = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+    profiling = threading.Lock()
+    # Номер изменения буфера: воркер публикует его для GET /profiles только после изменений
+    version = 0
+    published_version = 0
+    hooks_installed = False
+
+    stats = {"captured": 0, "profiled": 0, "profile_busy": 0}
+
+    @classmethod
+    def install(cls):
+        """Замер SQL всех движков SQLAlchemy; вне профилируемого запроса — одна проверка контекста"""
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        if cls.hooks_installed:
+            return
+        cls.hooks_installed = True
+        event.listen(Engine, "before_cursor_execute", cls._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", cls._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info["profiler_started"] = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        capture = _current.get()
+        started = conn.info.pop("profiler_started", None)
+        if capture is None or started is None:
+            return
+        # Параметры не сохраняются: в них данные клиентов
+        capture.add_sql(statement, time.perf_counter() - started, cursor.rowcount, executemany)
+
+    @staticmethod
+    @contextmanager
+    def stage(name: str):
+        """Время участка обработки в профиле текущего запроса; вне запроса ничего не делает"""
+        capture = _current.get()
+        if capture is None:
+            yield
+            return
+
+        thread_profiler = capture.start_thread_profile()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            capture.add_stage(name, time.perf_counter() - started)
+            if thread_profiler is not None:
+                capture.finish_thread_profile(thread_profiler)
+
+    @staticmethod
+    def _header(scope: Dict, name: bytes) -> Optional[str]:
+        for key, value in scope["headers"]:
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    @staticmethod
+    def token_matches(header: Optional[str]) -> bool:
+        token = settings.PROFILING_TOKEN
+        return bool(token) and header is not None and hmac.compare_digest(header.encode(), token.encode())
+
+    @classmethod
+    def trigger(cls, scope: Dict) -> Optional[str]:
+        if any(scope["path"].startswith(prefix) for prefix in settings.PROFILING_EXCLUDE_PATHS):
+            return None
+
+        if settings.PROFILING_TOKEN and cls.token_matches(cls._header(scope, PROFILE_HEADER.lower().encode())):
+            return HEADER
+        if settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return SAMPLE
+        if settings.PROFILING_SLOW_MS > 0:
+            return SLOW
+        return None
+
+    @classmethod
+    def begin(cls, scope: Dict, trigger: str) -> RequestCapture:
+        capture = RequestCapture(scope, trigger)
+        if trigger != SLOW:
+            if cls.profiling.acquire(blocking=False):
+                capture.profiler = cProfile.Profile()
+                capture.profiler.enable()
+            else:
+                capture.profile_skipped = "cProfile занят другим запросом"
+                cls.stats["profile_busy"] += 1
+        return capture
+
+    @classmethod
+    def finish(cls, capture: RequestCapture):
+        profiler = capture.profiler
+        if profiler is not None:
+            profiler.disable()
+            cls.profiling.release()
+
+        finished = time.perf_counter()
+        response_seconds = (capture.responded or finished) - capture.started
+        if capture.trigger == SLOW and response_seconds * 1000 < settings.PROFILING_SLOW_MS:
+            return
+
+        record = {
+            "id": capture.id,
+            "captured_at": capture.captured_at.isoformat(),
+            "method": capture.method,
+            "path": capture.path,
+            "query": capture.query,
+            "status": capture.status,
+            "trigger": capture.trigger,
+            # До последнего байта ответа; total — вместе с фоновыми задачами после ответа
+            "response_ms": round(response_seconds * 1000, 3),
+            "total_ms": round((finished - capture.started) * 1000, 3),
+            "stages": {
+                name: {"calls": calls, "ms": round(seconds * 1000, 3)}
+                for name, (calls, seconds) in capture.stages.items()
+            },
+            "sql": {
+                "count": capture.sql_count,
+                "ms": round(capture.sql_seconds * 1000, 3),
+                "statements": capture.sql,
+                "dropped": capture.sql_count - len(capture.sql),
+            },
+            "profile": None,
+        }
+        if profiler is not None:
+            record["profile"] = cls.summarize([profiler, *capture.thread_profiles])
+            cls.stats["profiled"] += 1
+        elif capture.profile_skipped:
+            record["profile"] = {"skipped": capture.profile_skipped}
+
+        cls.buffer.append(record)
+        cls.version += 1
+        cls.stats["captured"] += 1
+
+    @staticmethod
+    def _function_name(function, roots: List[str]) -> str:
+        filename, line, name = function
+        if filename == "~":
+            return name
+        for root in roots:
+            if filename.startswith(root):
+                filename = filename[len(root):]
+                break
+        return f"{filename}:{line}({name})"
+
+    @classmethod
+    def summarize(cls, profilers: List[cProfile.Profile]) -> Dict:
+        """Самые долгие функции по времени с вложенными вызовами и по собственному времени"""
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+
+        # Пути короче: относительно проекта или каталога пакетов
+        roots = sorted({os.path.join(os.path.abspath(root), "") for root in (os.getcwd(), *sys.path)},
+                       key=len, reverse=True)
+        rows = [
+            {
+                "function": cls._function_name(function, roots),
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+            for function, (primitive_calls, calls, own, cumulative, _) in stats.stats.items()
+        ]
+        top = settings.PROFILING_TOP_FUNCTIONS
+        return {
+            "threads": len(profilers),
+            "functions": len(rows),
+            "top_cumulative": sorted(rows, key=lambda row: -row["cumulative_ms"])[:top],
+            "top_own": sorted(rows, key=lambda row: -row["own_ms"])[:top],
+        }
+
+    @classmethod
+    def publish(cls, stats_dir: Path, index: int):
+        """Буфер воркера — в общий каталог снимков serve.py, чтобы GET /profiles видел все воркеры"""
+        version = cls.version
+        if version == cls.published_version:
+            return
+        path = stats_dir / f"profiles-{index}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(list(cls.buffer)))
+        os.replace(tmp_path, path)
+        cls.published_version = version
+
+    @classmethod
+    def collect(cls, stats_dir: Optional[Path], index: Optional[int]) -> List[Dict]:
+        """Записи всех воркеров, новые первыми; свои — из буфера, чужие — последние опубликованные"""
+        records = [{**record, "worker": index} for record in cls.buffer]
+        if stats_dir is not None:
+            for path in stats_dir.glob("profiles-*.json"):
+                worker = int(path.stem.split("-", 1)[1])
+                if worker == index:
+                    continue
+                try:
+                    records.extend({**record, "worker": worker} for record in json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+        return sorted(records, key=lambda record: record["captured_at"], reverse=True)
+
+    @staticmethod
+    def summary(record: Dict) -> Dict:
+        return {
+            "id": record["id"],
+            "worker": record["worker"],
+            "captured_at": record["captured_at"],
+            "method": record["method"],
+            "path": record["path"],
+            "status": record["status"],
+            "trigger": record["trigger"],
+            "response_ms": record["response_ms"],
+            "sql_count": record["sql"]["count"],
+            "sql_ms": record["sql"]["ms"],
+            "profiled": bool(record["profile"]) and "skipped" not in record["profile"],
+        }
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return {
+            "header_enabled": bool(settings.PROFILING_TOKEN),
+            "sample_rate": settings.PROFILING_SAMPLE_RATE,
+            "slow_ms": settings.PROFILING_SLOW_MS,
+            "buffered": len(cls.buffer),
+            "buffer_size": cls.buffer.maxlen,
+            **cls.stats,
+        }
+
+
+class RequestProfilerMiddleware:
+    """ASGI-обёртка: профиль запроса в контексте, id профиля в заголовке ответа X-Profile-Id"""
+
+    def __init__(self, app):
+        self.app = app
+        RequestProfiler.install()
+
+    async def __call__(self, scope, receive, send):
+        trigger = RequestProfiler.trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        capture = RequestProfiler.begin(scope, trigger)
+        token = _current.set(capture)
+
+        async def send_with_capture(message):
+            if message["type"] == "http.response.start":
+                capture.status = message["status"]
+                if trigger != SLOW:
+                    headers = [*message.get("headers", []), (PROFILE_ID_HEADER.lower().encode(), capture.id.encode())]
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                capture.responded = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_capture)
+        except Exception:
+            if capture.status is None:
+                capture.status = 500
+            raise
+        finally:
+            _current.reset(token)
+            RequestProfiler.finish(capture)
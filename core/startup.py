@@ -0,0 +1,147 @@
+import importlib.abc
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+def _process_uptime() -> Optional[float]:
+    """Секунды с запуска процесса по /proc: учитывает и время до первой строки Python"""
+    try:
+        with open("/proc/self/stat") as file:
+            # Имя процесса в скобках может содержать пробелы — поля считаются после него
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Первый в sys.meta_path: находит модуль остальными искателями и оборачивает exec_module
+    загрузчика, чтобы замерить выполнение модуля вместе с вложенными импортами.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # Встроенные и замороженные модули грузит сам класс-загрузчик — их не замеряем
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return spec
+        if not getattr(loader.exec_module, "startup_timed", False):
+            try:
+                loader.exec_module = self._timed(loader.exec_module)
+            except AttributeError:
+                pass
+        return spec
+
+    def _timed(self, exec_module):
+        def timed(module):
+            stack = self.local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                total = time.perf_counter() - started
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += total
+                StartupProfile.imports[module.__name__] = (total - nested, total)
+
+        timed.startup_timed = True
+        return timed
+
+
+class StartupProfile:
+    """Профиль холодного старта: время импорта модулей (с флагом --profile-startup у serve.py),
+    этапы загрузки и время от запуска процесса до первой готовности (/ready).
+    """
+
+    # Момент запуска процесса; при fork воркеры наследуют момент запуска родителя
+    process_started = time.time() - (_process_uptime() or 0.0)
+    enabled = False
+    # Модуль -> (собственное время, время с вложенными импортами), секунды
+    imports: Dict[str, Tuple[float, float]] = {}
+    stages: Dict[str, float] = {}
+    seconds_to_ready: Optional[float] = None
+
+    @classmethod
+    def enable(cls):
+        """Включить замер импортов; ставить как можно раньше — уже загруженные модули не учитываются"""
+        if cls.enabled:
+            return
+        cls.enabled = True
+        sys.meta_path.insert(0, _ImportTimer())
+
+    @classmethod
+    def since_start(cls) -> float:
+        return time.time() - cls.process_started
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.stages[name] = time.perf_counter() - started
+
+    @classmethod
+    def mark_ready(cls) -> bool:
+        """Первая готовность после запуска; True, если отмечена именно сейчас"""
+        if cls.seconds_to_ready is not None:
+            return False
+        cls.seconds_to_ready = cls.since_start()
+        return True
+
+    @classmethod
+    def import_summary(cls, top: int = 15) -> Dict[str, List]:
+        """Собственное время импорта по пакетам верхнего уровня и самые долгие модули целиком"""
+        packages = defaultdict(float)
+        for name, (own, _) in cls.imports.items():
+            packages[name.split(".")[0]] += own
+
+        return {
+            "packages": sorted(((name, round(seconds * 1000, 1)) for name, seconds in packages.items()),
+                               key=lambda item: -item[1])[:top],
+            "modules": sorted(((name, round(total * 1000, 1)) for name, (_, total) in cls.imports.items()),
+                              key=lambda item: -item[1])[:top],
+        }
+
+    @classmethod
+    def report(cls, target_seconds: Optional[float] = None) -> str:
+        lines = ["Профиль старта"]
+        if cls.seconds_to_ready is not None:
+            verdict = ""
+            if target_seconds:
+                verdict = " — в пределах цели" if cls.seconds_to_ready <= target_seconds else " — ДОЛЬШЕ ЦЕЛИ"
+                verdict = f" (цель {target_seconds:.1f} с{verdict})"
+            lines.append(f"  от запуска процесса до готовности: {cls.seconds_to_ready:.2f} с{verdict}")
+
+        if cls.stages:
+            lines.append("  этапы, мс:")
+            lines.extend(f"    {name:<28} {seconds * 1000:9.1f}" for name, seconds in cls.stages.items())
+
+        if cls.imports:
+            summary = cls.import_summary()
+            lines.append(f"  импорт, пакеты (собственное время), мс — всего модулей {len(cls.imports)}:")
+            lines.extend(f"    {name:<28} {ms:9.1f}" for name, ms in summary["packages"])
+            lines.append("  импорт, модули (с вложенными импортами), мс:")
+            lines.extend(f"    {name:<40} {ms:9.1f}" for name, ms in summary["modules"])
+        return "\n".join(lines)
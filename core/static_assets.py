@@ -0,0 +1,182 @@
+"""Статика веб-интерфейса: имена с хешем содержимого, заранее сжатые копии, кэширование.
+
+    python -m core.static_assets --out webapp/dist
+
+пишет ту же сборку на диск (с .gz/.br рядом), чтобы её отдавал обратный прокси.
+"""
+import argparse
+import hashlib
+import mimetypes
+from pathlib import Path, PurePosixPath
+from typing import Dict, Optional
+
+from core.compression import accepted_encodings, compress_brotli, compress_gzip
+from core.config import settings
+
+# Сжимаются только текстовые форматы: картинки и шрифты уже сжаты
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+IMMUTABLE = f"public, max-age={settings.STATIC_MAX_AGE_SECONDS}, immutable"
+# Браузер хранит копию, но каждый раз переспрашивает по ETag
+REVALIDATE = "no-cache"
+
+
+class Asset:
+
+    __slots__ = ("body", "gzip", "br", "etag", "content_type", "cache_control")
+
+    def __init__(self, body: bytes, content_type: str, cache_control: str):
+        self.body = body
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = 'W/"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= settings.GZIP_MIN_BYTES:
+            # Сжатая копия хранится, только если она меньше
+            gzipped = compress_gzip(body)
+            self.gzip = gzipped if len(gzipped) < len(body) else None
+            compressed = compress_brotli(body)
+            self.br = compressed if compressed is not None and len(compressed) < len(body) else None
+
+
+class WebAppAssets:
+    """ASGI-приложение для /webapp: вся статика собрана в памяти при импорте.
+
+    Каждый файл, кроме HTML, доступен и под именем с хешем содержимого (css/styles.<hash>.css)
+    с Cache-Control immutable, а HTML ссылается на эти имена: после выкладки браузер скачивает
+    только изменившиеся файлы, остальные берёт из кэша без запроса. index.html и исходные имена
+    отдаются с no-cache и ETag (304 без тела). Ответ в br или gzip — заранее сжатая копия по
+    Accept-Encoding, на запрос ничего не читается с диска и не сжимается. Под serve.py сборка
+    идёт до fork и общая для воркеров.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.assets = self.build(self.directory)
+
+    @staticmethod
+    def fingerprint(path: str, body: bytes) -> str:
+        name = PurePosixPath(path)
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        return str(name.with_name(f"{name.stem}.{digest}{name.suffix}"))
+
+    @classmethod
+    def build(cls, directory: Path) -> Dict[str, Asset]:
+        sources = {
+            path.relative_to(directory).as_posix(): path.read_bytes()
+            for path in sorted(directory.rglob("*"))
+            if path.is_file() and settings.STATIC_BUILD_DIR not in path.relative_to(directory).parts
+        }
+
+        assets: Dict[str, Asset] = {}
+        hashed: Dict[str, str] = {}
+        for path, body in sources.items():
+            if path.endswith(".html"):
+                continue
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if content_type.startswith(("text/", "application/javascript")):
+                content_type += "; charset=utf-8"
+            hashed[path] = cls.fingerprint(path, body)
+            assets[hashed[path]] = Asset(body, content_type, IMMUTABLE)
+            assets[path] = Asset(body, content_type, REVALIDATE)
+
+        # Ссылки в HTML на имена с хешем; пути в кавычках относительно /webapp/
+        for path, body in sources.items():
+            if not path.endswith(".html"):
+                continue
+            html = body.decode("utf-8")
+            for source, target in hashed.items():
+                html = html.replace(f'"{source}"', f'"{target}"').replace(f"'{source}'", f"'{target}'")
+            assets[path] = Asset(html.encode("utf-8"), "text/html; charset=utf-8", REVALIDATE)
+        return assets
+
+    def write(self, target: Path) -> int:
+        """Сборка на диск: файлы и их .gz/.br копии; возвращает число файлов"""
+        written = 0
+        for path, asset in self.assets.items():
+            destination = target / path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            destination.write_bytes(asset.body)
+            written += 1
+            for suffix, body in ((".gz", asset.gzip), (".br", asset.br)):
+                if body is not None:
+                    destination.with_name(destination.name + suffix).write_bytes(body)
+                    written += 1
+        return written
+
+    @staticmethod
+    def _header(scope, name: bytes) -> Optional[str]:
+        for key, value in scope.get("headers", []):
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    @staticmethod
+    async def _send(send, status: int, headers: Dict[str, str], body: bytes = b""):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["method"] not in ("GET", "HEAD"):
+            await self._send(send, 405, {"content-type": "text/plain; charset=utf-8", "allow": "GET, HEAD"},
+                             b"Method Not Allowed")
+            return
+
+        # Путь внутри точки монтирования: root_path уже включает /webapp
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        path = path.lstrip("/") or "index.html"
+        if path.endswith("/"):
+            path += "index.html"
+
+        asset = self.assets.get(path)
+        if asset is None:
+            await self._send(send, 404, {"content-type": "text/plain; charset=utf-8"}, b"Not Found")
+            return
+
+        headers = {
+            "content-type": asset.content_type,
+            "cache-control": asset.cache_control,
+            "etag": asset.etag,
+            "vary": "Accept-Encoding",
+        }
+        if_none_match = self._header(scope, b"if-none-match")
+        if if_none_match and any(
+            tag.strip().removeprefix("W/") == asset.etag.removeprefix("W/") for tag in if_none_match.split(",")
+        ):
+            await self._send(send, 304, headers)
+            return
+
+        body = asset.body
+        encodings = accepted_encodings(scope)
+        if asset.br is not None and "br" in encodings:
+            body = asset.br
+            headers["content-encoding"] = "br"
+        elif asset.gzip is not None and "gzip" in encodings:
+            body = asset.gzip
+            headers["content-encoding"] = "gzip"
+        headers["content-length"] = str(len(body))
+        await self._send(send, 200, headers, b"" if scope["method"] == "HEAD" else body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка статики веб-интерфейса для обратного прокси")
+    parser.add_argument("--source", default=str(Path(__file__).resolve().parent.parent / "webapp"))
+    parser.add_argument("--out", default=None, help=f"По умолчанию <source>/{settings.STATIC_BUILD_DIR}")
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    target = Path(args.out) if args.out else source / settings.STATIC_BUILD_DIR
+    written = WebAppAssets(str(source)).write(target)
+    print(f"Статика собрана в {target}: файлов {written}")
+
+
+if __name__ == "__main__":
+    main()
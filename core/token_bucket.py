@@ -0,0 +1,50 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """Токен-бакет на монотонных часах: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float,
+                 initial: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate должен быть положительным")
+
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self.clock = clock
+        self.tokens = self.capacity if initial is None else min(float(initial), self.capacity)
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def try_consume(self, n: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def take(self, max_n: int) -> int:
+        """Забрать столько целых токенов, сколько доступно, но не больше max_n"""
+        self._refill()
+        n = min(int(self.tokens), max_n)
+        if n > 0:
+            self.tokens -= n
+        return max(n, 0)
+
+    def time_until(self, n: float = 1) -> float:
+        self._refill()
+        missing = min(n, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    async def acquire(self, n: float = 1):
+        while not self.try_consume(n):
+            await asyncio.sleep(self.time_until(n))
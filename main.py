@@ -1,31 +1,138 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-import uvicorn
-from fastapi.staticfiles import StaticFiles
 import os
-from api.routers import transactions, fraud_detection, analytics, simulation
+from api.routers import transactions, fraud_detection, analytics, simulation, features, scoring_jobs, events
+from core.admin import require_admin
+from core.compression import JSONCompressionMiddleware
 from core.config import settings
-from core.database import engine, Base
+from core.database import engine, Base, ReadRouting, SessionLocal
+from core.startup import StartupProfile
 from ml.model_loader import ModelLoader
+from ml.shadow import ShadowScorer
+from services.job_manager import JobManager
+from services.overload import OverloadGuard
+from services.profile_cache import ClientProfileCache
+from services.readiness import Readiness
+from services.reason_index import ReasonIndex
+from core.request_profiler import RequestProfiler, RequestProfilerMiddleware
+from core.static_assets import WebAppAssets
+from services.rules_engine import RulesEngine
+from services.scoring_jobs import ScoringJobService
+from services.velocity_index import VelocityIndex
+from services.worker_stats import WorkerStats, WorkerStatsMiddleware
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    print("Загрузка ML моделей.")
+async def warm_up():
+    await Readiness.warm_up()
+    # Теневой скоринг — после прогрева, чтобы синтетические строки не попали в сравнение
+    if ModelLoader.snapshot is not None:
+        ShadowScorer.start()
+
+
+async def backfill_reasons():
+    def run():
+        db = SessionLocal()
+        try:
+            return ReasonIndex.backfill(db)
+        finally:
+            db.close()
+
     try:
-        ModelLoader.load_models()
-        print("Модели успешно загружены!")
+        filled = await asyncio.to_thread(run)
+        if filled:
+            print(f"Коды причин заполнены для {filled} транзакций")
     except Exception as e:
-        print(f"Ошибка загрузки моделей: {e}")
+        print(f"Ошибка заполнения кодов причин: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Под serve.py модели, правила и кэш профилей уже загружены родителем до fork
+    if ModelLoader.snapshot is None:
+        print("Загрузка ML моделей.")
+        try:
+            with StartupProfile.stage("models"):
+                ModelLoader.load_models()
+            print("Модели успешно загружены!")
+        except Exception as e:
+            print(f"Ошибка загрузки моделей: {e}")
+
+    if RulesEngine.loaded_at is None:
+        try:
+            with StartupProfile.stage("rules"):
+                print(f"Загружено правил причин: {RulesEngine.load()}")
+        except Exception as e:
+            print(f"Ошибка загрузки правил причин: {e}")
 
     print("Инициализация базы данных.")
-    Base.metadata.create_all(bind=engine)
+    with StartupProfile.stage("db_schema"):
+        Base.metadata.create_all(bind=engine)
+        ReasonIndex.ensure_schema(engine)
+        ScoringJobService.ensure_schema(engine)
     print("База данных готова!")
 
+    db = SessionLocal()
+    try:
+        with StartupProfile.stage("velocity_index"):
+            restored = VelocityIndex.rebuild_from_db(db)
+        print(f"Индекс скоростей восстановлен: {restored} транзакций за сутки")
+    except Exception as e:
+        print(f"Ошибка восстановления индекса скоростей: {e}")
+    finally:
+        db.close()
+
+    if ClientProfileCache.loaded_at is None:
+        try:
+            with StartupProfile.stage("profile_cache"):
+                ClientProfileCache.load_from_patterns()
+        except Exception as e:
+            print(f"Ошибка загрузки кэша профилей: {e}")
+
+    # Задачи в одном экземпляре на сервис — только в воркере 0
+    reason_backfill = None
+    if WorkerStats.is_primary():
+        reason_backfill = asyncio.create_task(backfill_reasons())
+    # Задачи скоринга без живого владельца подхватывает любой воркер по аренде в БД
+    job_leases = asyncio.create_task(ScoringJobService.maintain_leases())
+
+    # Сервер принимает соединения сразу (/live отвечает), /ready — после прогрева
+    warmup = asyncio.create_task(warm_up())
+    readiness_probe = asyncio.create_task(Readiness.probe_periodically())
+    read_check = asyncio.create_task(ReadRouting.check_periodically())
+    profile_refresh = asyncio.create_task(ClientProfileCache.refresh_periodically())
+    stats_publish = asyncio.create_task(WorkerStats.publish_periodically())
+    spill_drain = asyncio.create_task(OverloadGuard.drain_periodically())
+    model_watch = asyncio.create_task(ModelLoader.watch_periodically()) if settings.MODEL_RELOAD_WATCH else None
+
     yield
 
     print("Завершение работы.")
+    warmup.cancel()
+    readiness_probe.cancel()
+    read_check.cancel()
+    profile_refresh.cancel()
+    stats_publish.cancel()
+    if reason_backfill is not None:
+        reason_backfill.cancel()
+    spill_drain.cancel()
+    job_leases.cancel()
+    if model_watch is not None:
+        model_watch.cancel()
+    await JobManager.shutdown()
+    try:
+        await asyncio.to_thread(ScoringJobService.release_leases)
+    except Exception as e:
+        print(f"Ошибка освобождения задач скоринга: {e}")
+    try:
+        flushed = await asyncio.to_thread(OverloadGuard.flush_spill)
+        if flushed:
+            print(f"Записаны отложенные транзакции: {flushed}")
+    except Exception as e:
+        print(f"Ошибка записи отложенных транзакций: {e}")
+    ShadowScorer.stop()
 
 
 app = FastAPI(
@@ -39,6 +146,10 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
+app.add_middleware(WorkerStatsMiddleware)
+app.add_middleware(RequestProfilerMiddleware)
+app.add_middleware(JSONCompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
@@ -61,7 +172,7 @@ app.include_router(
 
 app.mount(
     "/webapp",
-    StaticFiles(directory=os.path.join(os.path.dirname(__file__), "webapp"), html=True),
+    WebAppAssets(os.path.join(os.path.dirname(__file__), "webapp")),
     name="webapp",
 )
 
@@ -77,6 +188,24 @@ app.include_router(
     tags=["simulation"]
 )
 
+app.include_router(
+    scoring_jobs.router,
+    prefix="/api/v1/jobs",
+    tags=["scoring-jobs"]
+)
+
+app.include_router(
+    features.router,
+    prefix="/api/v1/features",
+    tags=["features"]
+)
+
+app.include_router(
+    events.router,
+    prefix="/api/v1/events",
+    tags=["events"]
+)
+
 @app.get("/", tags=["health"])
 async def root():
     return {
@@ -84,51 +213,71 @@ async def root():
         "status": "online",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "live": "/live",
+        "ready": "/ready"
     }
 
+@app.get("/live", tags=["health"])
+async def liveness():
+    """Процесс жив и цикл событий отвечает; зависимости не проверяются"""
+    return {"status": "alive"}
+
+
+@app.get("/ready", tags=["health"])
+async def readiness():
+    """Готовность к трафику: прогрев завершён, модели и БД исправны по последней фоновой проверке"""
+    report = Readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @app.get("/health", tags=["health"])
 async def health_check():
-    health_status = {
-        "status": "healthy",
-        "components": {
-            "api": "ok",
-            "ml_models": "checking",
-            "database": "checking"
-        }
+    """Состояние компонентов из кэша фонового опроса: запрос к /health не обращается к БД"""
+    return Readiness.health()
+
+
+@app.get("/workers", tags=["health"])
+async def get_workers():
+    """Процессы-воркеры: запросы, память (общая с родителем и своя), версия снимка моделей"""
+    workers = await asyncio.to_thread(WorkerStats.collect)
+    return {
+        "current_worker": WorkerStats.index,
+        "workers": workers,
+        "total_requests": sum(worker["requests"] for worker in workers),
     }
 
-    try:
-        if ModelLoader.models:
-            health_status["components"]["ml_models"] = "ok"
-            health_status["components"]["models_loaded"] = len(ModelLoader.models)
-        else:
-            health_status["components"]["ml_models"] = "not_loaded"
-            health_status["status"] = "degraded"
-    except Exception as e:
-        health_status["components"]["ml_models"] = f"error: {str(e)}"
-        health_status["status"] = "unhealthy"
 
-    try:
-        from sqlalchemy import text
-        from core.database import SessionLocal
+@app.get("/profiles", tags=["profiling"], dependencies=[Depends(require_admin)])
+async def get_profiles(limit: int = Query(50, ge=1, le=1000)):
+    """Сохранённые профили запросов всех воркеров (медленные и запрошенные), новые первыми"""
+    profiles = await asyncio.to_thread(RequestProfiler.collect, WorkerStats.stats_dir, WorkerStats.index)
+    return {
+        "current_worker": WorkerStats.index,
+        "stats": RequestProfiler.get_stats(),
+        "profiles": [RequestProfiler.summary(profile) for profile in profiles[:limit]],
+    }
 
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))
-        db.close()
-        health_status["components"]["database"] = "ok"
-    except Exception as e:
-        health_status["components"]["database"] = f"error: {str(e)}"
-        health_status["status"] = "unhealthy"
 
-    return health_status
+@app.get("/profiles/{profile_id}", tags=["profiling"], dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Профиль запроса целиком: этапы, SQL, самые долгие функции по cProfile"""
+    profiles = await asyncio.to_thread(RequestProfiler.collect, WorkerStats.stats_dir, WorkerStats.index)
+    for profile in profiles:
+        if profile["id"] == profile_id:
+            return profile
+    raise HTTPException(status_code=404, detail=f"Профиль {profile_id} не найден")
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        # Открытые ленты /api/v1/events/stream иначе задерживали бы остановку
+        timeout_graceful_shutdown=5
     )
\ No newline at end of file
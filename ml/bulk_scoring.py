@@ -0,0 +1,258 @@
+"""Офлайн-пересчёт скоринга больших наборов данных без API.
+
+    python -m ml.bulk_scoring data --output scored.csv
+    python -m ml.bulk_scoring export.parquet --output scored.parquet --workers 8
+    python -m ml.bulk_scoring db --output scored.csv --resume
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.config import settings
+
+
+PASSTHROUGH_COLUMNS = ["transaction_id", "docno", "client_id", "destination_id", "event_time", "target"]
+# Идентификаторы из CSV читаются строками: "007" не должен стать числом 7
+ID_DTYPES = {column: str for column in ("transaction_id", "client_id", "destination_id")}
+
+_predictor = None
+
+
+def iter_input_chunks(source: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """data — data/transactions.csv + data/patterns.csv, db — таблица transactions, иначе путь к CSV/Parquet"""
+    if source == "data":
+        from ml.dataset_loader import DatasetLoader
+
+        frame = DatasetLoader.load_scoring_frame()
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size]
+
+    elif source == "db":
+        from core.database import engine
+
+        yield from pd.read_sql("SELECT * FROM transactions ORDER BY id", engine, chunksize=chunk_size)
+
+    elif source.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Для чтения Parquet нужен pyarrow: pip install pyarrow")
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=ID_DTYPES)
+
+
+def _init_worker(model_name: Optional[str], threshold: float):
+    """Артефакты загружаются один раз на процесс, а не на каждую пачку"""
+    global _predictor
+
+    from threadpoolctl import threadpool_limits
+    from ml.model_loader import ModelLoader
+    from ml.predictor import FraudPredictor
+
+    # Параллелизм даёт пул процессов, BLAS/OpenMP внутри каждого — в один поток
+    threadpool_limits(1)
+
+    ModelLoader.load_models()
+    if model_name:
+        ModelLoader.set_active_model(model_name)
+    _predictor = FraudPredictor(threshold=threshold)
+
+
+def score_frame(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Пачка входа -> (результат со сквозными колонками, маски причин); в процессе с _init_worker"""
+    from services.fraud_service import FraudService
+    from services.rules_engine import RulesEngine
+
+    features = chunk.reindex(columns=_predictor.feature_names)
+    probas = _predictor.predict_proba(features)
+
+    result = pd.DataFrame({
+        column: chunk[column].to_numpy() for column in PASSTHROUGH_COLUMNS if column in chunk.columns
+    })
+    result["fraud_probability"] = probas
+    result["is_fraud"] = probas >= _predictor.threshold
+    result["risk_level"] = FraudService.determine_risk_levels(probas)
+
+    # Текст причин строится только для строк, где сработало хоть одно правило
+    masks = RulesEngine.evaluate(chunk, probas)
+    reasons = np.full(len(chunk), "[]", dtype=object)
+    flagged = np.flatnonzero(masks)
+    for position, row in zip(flagged, chunk.iloc[flagged].to_dict("records")):
+        reasons[position] = json.dumps(RulesEngine.render(masks[position], row, probas[position]), ensure_ascii=False)
+    result["reasons"] = reasons
+    result["model_version"] = _predictor.model_version
+
+    return result, masks
+
+
+def score_job_chunk(index: int, chunk: pd.DataFrame) -> Tuple[int, pd.DataFrame]:
+    """Пачка задачи скоринга из API: результат возвращается процессу сервиса, он же пишет его в БД"""
+    result, masks = score_frame(chunk)
+    result["reason_mask"] = masks
+    return index, result
+
+
+def _score_chunk(index: int, chunk: pd.DataFrame, part_path: str, output_format: str) -> Tuple[int, int]:
+    result, _ = score_frame(chunk)
+
+    # Запись во временный файл и rename: при обрыве незаконченных частей не остаётся
+    tmp_path = f"{part_path}.tmp"
+    if output_format == "parquet":
+        result.to_parquet(tmp_path, index=False)
+    else:
+        result.to_csv(tmp_path, index=False, header=index == 0)
+    os.replace(tmp_path, part_path)
+
+    return index, len(result)
+
+
+class BulkScoringJob:
+
+    def __init__(self, source: str, output: str, chunk_size: int, workers: int,
+                 model_name: Optional[str], threshold: float, resume: bool):
+        self.source = source
+        self.output = Path(output)
+        self.output_format = "parquet" if self.output.suffix == ".parquet" else "csv"
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.model_name = model_name
+        self.threshold = threshold
+        self.resume = resume
+        self.parts_dir = self.output.with_name(self.output.name + ".parts")
+
+    def _manifest(self) -> Dict:
+        return {
+            "source": self.source,
+            "chunk_size": self.chunk_size,
+            "model_name": self.model_name,
+            "threshold": self.threshold,
+            "output_format": self.output_format,
+        }
+
+    def _part_path(self, index: int) -> Path:
+        return self.parts_dir / f"part-{index:06d}.{self.output_format}"
+
+    def _prepare_parts_dir(self) -> set:
+        manifest_path = self.parts_dir / "manifest.json"
+
+        if self.parts_dir.exists():
+            if not self.resume:
+                raise SystemExit(f"{self.parts_dir} уже существует: продолжите с --resume или удалите каталог")
+            saved = json.loads(manifest_path.read_text()) if manifest_path.exists() else None
+            if saved != self._manifest():
+                raise SystemExit("Параметры не совпадают с прерванным запуском (manifest.json)")
+        else:
+            self.parts_dir.mkdir(parents=True)
+            manifest_path.write_text(json.dumps(self._manifest(), indent=2))
+
+        return {
+            int(path.stem.split("-")[1])
+            for path in self.parts_dir.glob(f"part-*.{self.output_format}")
+        }
+
+    def run(self) -> Dict:
+        done = self._prepare_parts_dir()
+        if done:
+            print(f"Продолжение: уже готово частей {len(done)}")
+
+        started = time.perf_counter()
+        rows = 0
+        chunks = 0
+        pending = set()
+        max_pending = self.workers * 2
+
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.threshold)
+        ) as pool:
+            for index, chunk in enumerate(iter_input_chunks(self.source, self.chunk_size)):
+                if index in done:
+                    continue
+
+                # Не читаем вход дальше, чем успевают обработать воркеры
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    rows, chunks = self._collect(finished, rows, chunks, started)
+
+                pending.add(pool.submit(
+                    _score_chunk, index, chunk, str(self._part_path(index)), self.output_format
+                ))
+
+            rows, chunks = self._collect(pending, rows, chunks, started)
+
+        elapsed = time.perf_counter() - started
+        self._merge_parts()
+
+        summary = {
+            "output": str(self.output),
+            "rows_scored": rows,
+            "chunks_scored": chunks,
+            "chunks_resumed": len(done),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return summary
+
+    @staticmethod
+    def _collect(futures, rows: int, chunks: int, started: float) -> Tuple[int, int]:
+        for future in futures:
+            index, count = future.result()
+            rows += count
+            chunks += 1
+            elapsed = time.perf_counter() - started
+            print(f"Часть {index}: {count} строк, всего {rows}, {rows / elapsed:.0f} строк/с")
+        return rows, chunks
+
+    def _merge_parts(self):
+        parts: List[Path] = sorted(self.parts_dir.glob(f"part-*.{self.output_format}"))
+
+        if self.output_format == "parquet":
+            pd.concat([pd.read_parquet(path) for path in parts], ignore_index=True).to_parquet(self.output, index=False)
+        else:
+            # Заголовок записан только в part-000000, остальные части склеиваются побайтно
+            with open(self.output, "wb") as out:
+                for path in parts:
+                    with open(path, "rb") as part:
+                        shutil.copyfileobj(part, out)
+
+        shutil.rmtree(self.parts_dir)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Пакетный пересчёт скоринга: CSV/Parquet, data/ или таблица transactions")
+    parser.add_argument("source", help="data, db или путь к .csv/.parquet")
+    parser.add_argument("--output", required=True, help="Результат: .csv или .parquet")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--model", default=None, help="Имя модели из ModelLoader, по умолчанию активная")
+    parser.add_argument("--threshold", type=float, default=settings.DEFAULT_FRAUD_THRESHOLD)
+    parser.add_argument("--resume", action="store_true", help="Продолжить прерванный запуск")
+    args = parser.parse_args(argv)
+
+    BulkScoringJob(
+        source=args.source,
+        output=args.output,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        model_name=args.model,
+        threshold=args.threshold,
+        resume=args.resume,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Каскадный скоринг: дешёвая модель оценивает всё, дорогая — только неуверенную полосу.
+
+Офлайн-оценка на data/ относительно одной дорогой модели:
+
+    python -m ml.cascade
+    python -m ml.cascade --low 0.1 --high 0.95
+    python -m ml.cascade --sweep
+"""
+import argparse
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+
+
+class CascadeStats:
+    """Счётчики этапов каскада: сколько строк прошло через каждый этап и сколько это стоило"""
+
+    lock = threading.Lock()
+    stages = {
+        "first": {"calls": 0, "rows": 0, "seconds": 0.0},
+        "second": {"calls": 0, "rows": 0, "seconds": 0.0},
+    }
+
+    @classmethod
+    def record(cls, stage: str, rows: int, seconds: float):
+        with cls.lock:
+            counters = cls.stages[stage]
+            counters["calls"] += 1
+            counters["rows"] += rows
+            counters["seconds"] += seconds
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            for counters in cls.stages.values():
+                counters.update(calls=0, rows=0, seconds=0.0)
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        with cls.lock:
+            stages = {name: dict(counters) for name, counters in cls.stages.items()}
+
+        for counters in stages.values():
+            counters["avg_ms_per_call"] = 1000 * counters["seconds"] / counters["calls"] if counters["calls"] else 0.0
+            counters["avg_us_per_row"] = 1e6 * counters["seconds"] / counters["rows"] if counters["rows"] else 0.0
+
+        first_rows = stages["first"]["rows"]
+        return {
+            "enabled": settings.SCORING_MODE == "cascade",
+            "first_model": settings.CASCADE_FIRST_MODEL,
+            "second_model": settings.CASCADE_SECOND_MODEL,
+            "band": [settings.CASCADE_LOW, settings.CASCADE_HIGH],
+            "pass_through_rate": stages["second"]["rows"] / first_rows if first_rows else 0.0,
+            "stages": stages,
+        }
+
+
+def cascade_proba(first_model, second_model, x: np.ndarray, low: float, high: float,
+                  record: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Вероятности и маска строк, переданных второй модели (low <= p первой модели <= high)"""
+    started = time.perf_counter()
+    probas = first_model.predict_proba(x)[:, 1]
+    first_seconds = time.perf_counter() - started
+
+    escalated = (probas >= low) & (probas <= high)
+    rows = np.flatnonzero(escalated)
+
+    started = time.perf_counter()
+    if len(rows):
+        probas[rows] = second_model.predict_proba(x[rows])[:, 1]
+    second_seconds = time.perf_counter() - started
+
+    if record:
+        CascadeStats.record("first", len(x), first_seconds)
+        if len(rows):
+            CascadeStats.record("second", len(rows), second_seconds)
+
+    return probas, escalated
+
+
+def _metrics(y: np.ndarray, probas: np.ndarray, threshold: float) -> Dict:
+    from sklearn.metrics import roc_auc_score
+
+    predicted = probas >= threshold
+    tp = int(np.sum(predicted & (y == 1)))
+    fp = int(np.sum(predicted & (y == 0)))
+    fn = int(np.sum(~predicted & (y == 1)))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        "roc_auc": round(float(roc_auc_score(y, probas)), 4),
+        "true_positive": tp,
+        "false_positive": fp,
+    }
+
+
+def evaluate(lows: List[float], high: float, threshold: float,
+             first_name: Optional[str] = None, second_name: Optional[str] = None) -> Dict:
+    """Каскад против одной второй модели на data/transactions.csv + data/patterns.csv"""
+    from ml.dataset_loader import DatasetLoader
+    from ml.model_loader import ModelLoader
+    from ml.predictor import FraudPredictor
+
+    first_name = first_name or settings.CASCADE_FIRST_MODEL
+    second_name = second_name or settings.CASCADE_SECOND_MODEL
+
+    if not ModelLoader.models:
+        ModelLoader.load_models()
+    first_model = ModelLoader.models[first_name]["model"]
+    second_model = ModelLoader.models[second_name]["model"]
+
+    frame = DatasetLoader.load_scoring_frame()
+    predictor = FraudPredictor()
+    _, x = predictor.transform(frame.reindex(columns=predictor.feature_names))
+    y = frame["target"].to_numpy()
+
+    started = time.perf_counter()
+    baseline = second_model.predict_proba(x)[:, 1]
+    baseline_seconds = time.perf_counter() - started
+
+    results = []
+    for low in lows:
+        started = time.perf_counter()
+        probas, escalated = cascade_proba(first_model, second_model, x, low, high, record=False)
+        seconds = time.perf_counter() - started
+
+        results.append({
+            "band": [low, high],
+            "pass_through_rate": round(float(escalated.mean()), 4),
+            "fraud_exited_early": int(np.sum(~escalated & (y == 1))),
+            "decision_agreement": round(float(np.mean((probas >= threshold) == (baseline >= threshold))), 4),
+            "us_per_row": round(1e6 * seconds / len(x), 2),
+            **_metrics(y, probas, threshold),
+        })
+
+    return {
+        "rows": len(x),
+        "frauds": int(y.sum()),
+        "threshold": threshold,
+        "first_model": first_name,
+        "second_model": second_name,
+        "baseline": {
+            "us_per_row": round(1e6 * baseline_seconds / len(x), 2),
+            **_metrics(y, baseline, threshold),
+        },
+        "cascade": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Офлайн-оценка каскадного скоринга на data/")
+    parser.add_argument("--low", type=float, default=settings.CASCADE_LOW)
+    parser.add_argument("--high", type=float, default=settings.CASCADE_HIGH)
+    parser.add_argument("--threshold", type=float, default=settings.DEFAULT_FRAUD_THRESHOLD)
+    parser.add_argument("--sweep", action="store_true", help="Несколько нижних границ полосы")
+    args = parser.parse_args(argv)
+
+    lows = [0.05, 0.1, 0.15, 0.2, 0.25, 0.3] if args.sweep else [args.low]
+    print(json.dumps(evaluate(lows, args.high, args.threshold), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from core.config import settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_DIR = PROJECT_ROOT / "data"
+TRANSACTIONS_PATH = DATA_DIR / "transactions.csv"
+PATTERNS_PATH = DATA_DIR / "patterns.csv"
+
+CACHE_FORMAT_VERSION = 1
+
+# Колонки patterns.csv -> признаки модели (как в ml.ipynb)
+PATTERN_FEATURES = {
+    "monthly_os_changes": "os_ver_count_30d",
+    "monthly_phone_model_changes": "phone_model_count_30d",
+    "logins_last_7_days": "logins_7d",
+    "logins_last_30_days": "logins_30d",
+    "login_frequency_7d": "logins_per_day_7",
+    "login_frequency_30d": "logins_per_day_30",
+    "freq_change_7d_vs_mean": "rel_change_7_vs_30",
+    "logins_7d_over_30d_ratio": "share_7_of_30",
+    "avg_login_interval_30d": "mean_interval_30d",
+    "std_login_interval_30d": "std_interval_30d",
+    "var_login_interval_30d": "var_interval_30d",
+    "ewm_login_interval_7d": "ewm_interval_7d",
+    "burstiness_login_interval": "burstiness",
+    "fano_factor_login_interval": "fano_factor",
+    "zscore_avg_login_interval_7d": "z_score_7d_vs_30d",
+}
+
+TRANSACTIONS_SCHEMA = {
+    "cst_dim_id": "id",
+    "transdate": "datetime",
+    "transdatetime": "datetime",
+    "amount": "float",
+    "docno": "int",
+    "direction": "category",
+    "target": "int",
+}
+
+PATTERNS_SCHEMA = {
+    "transdate": "datetime",
+    "cst_dim_id": "id",
+    **{column: "float" for column in PATTERN_FEATURES},
+    "last_phone_model_categorical": "category",
+    "last_os_categorical": "category",
+}
+
+# Колонки, в которых выгрузка из Excel оставила "01.фев" и "4,23E+11": читаются
+# текстом и приводятся к числу с NaN на месте испорченных значений, как при обучении
+TEXT_NUMERIC_COLUMNS = {"login_frequency_30d", "freq_change_7d_vs_mean", "var_login_interval_30d"}
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class DatasetLoader:
+    """Чтение cp1251 CSV из data/ с кэшем в .npy по хэшу исходного файла"""
+
+    @staticmethod
+    def load_transactions(path: Path = TRANSACTIONS_PATH) -> "pd.DataFrame":
+        return DatasetLoader.load_csv(path, TRANSACTIONS_SCHEMA)
+
+    @staticmethod
+    def load_patterns(path: Path = PATTERNS_PATH) -> "pd.DataFrame":
+        return DatasetLoader.load_csv(path, PATTERNS_SCHEMA)
+
+    @staticmethod
+    def load_scoring_frame(transactions_path: Path = TRANSACTIONS_PATH,
+                           patterns_path: Path = PATTERNS_PATH) -> "pd.DataFrame":
+        """Транзакции в порядке времени, к каждой — последняя строка паттернов клиента на её дату"""
+        import pandas as pd
+
+        transactions = DatasetLoader.load_transactions(transactions_path)
+        patterns = DatasetLoader.load_patterns(patterns_path)
+        patterns = patterns[["cst_dim_id", "transdate"] + list(PATTERN_FEATURES)].rename(columns=PATTERN_FEATURES)
+
+        frame = pd.merge_asof(
+            transactions.sort_values("transdate", kind="stable"),
+            patterns.sort_values("transdate", kind="stable"),
+            on="transdate",
+            by="cst_dim_id",
+            direction="backward"
+        )
+
+        frame = frame.rename(columns={"transdatetime": "event_time", "direction": "destination_id"})
+        frame["destination_id"] = frame["destination_id"].astype(str)
+        frame["client_id"] = frame["cst_dim_id"].astype(str)
+        return frame.sort_values("event_time", kind="stable").reset_index(drop=True)
+
+    @staticmethod
+    def load_csv(path: Path, schema: Dict[str, str]) -> "pd.DataFrame":
+        path = Path(path)
+        cache_dir = DatasetLoader.cache_dir_for(path)
+
+        if (cache_dir / "meta.json").exists():
+            try:
+                return DatasetLoader._load_cached(cache_dir)
+            except Exception as e:
+                print(f"⚠Кэш {cache_dir} повреждён, повторный разбор CSV: {e}")
+
+        frame = DatasetLoader.parse_csv(path, schema)
+        DatasetLoader._write_cache(frame, cache_dir)
+        return DatasetLoader._load_cached(cache_dir)
+
+    @staticmethod
+    def load_columns(path: Path, schema: Dict[str, str], columns: List[str]) -> Dict[str, np.ndarray]:
+        """Числовые колонки и даты (datetime64) прямо из кэша .npy, без pandas.
+
+        pandas нужен, только если кэша ещё нет и CSV разбирается впервые.
+        """
+        path = Path(path)
+        cache_dir = DatasetLoader.cache_dir_for(path)
+
+        if (cache_dir / "meta.json").exists():
+            try:
+                return DatasetLoader._read_cached_columns(cache_dir, columns)
+            except Exception as e:
+                print(f"⚠Кэш {cache_dir} повреждён, повторный разбор CSV: {e}")
+
+        frame = DatasetLoader.parse_csv(path, schema)
+        DatasetLoader._write_cache(frame, cache_dir)
+        return DatasetLoader._read_cached_columns(cache_dir, columns)
+
+    @staticmethod
+    def _read_cached_columns(cache_dir: Path, columns: List[str]) -> Dict[str, np.ndarray]:
+        meta = json.loads((cache_dir / "meta.json").read_text())
+        positions = {entry["name"]: (index, entry) for index, entry in enumerate(meta["columns"])}
+
+        data = {}
+        for name in columns:
+            index, entry = positions[name]
+            if "categories" in entry:
+                raise ValueError(f"{name}: категориальная колонка читается только через load_csv")
+            values = np.load(cache_dir / f"{index}.npy", mmap_mode="r")
+            data[name] = values.view("datetime64[ns]") if entry.get("datetime") else values
+        return data
+
+    @staticmethod
+    def cache_dir_for(path: Path) -> Path:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+        return PROJECT_ROOT / settings.DATA_CACHE_DIR / f"{path.stem}-v{CACHE_FORMAT_VERSION}-{digest.hexdigest()[:16]}"
+
+    @staticmethod
+    def parse_csv(path: Path, schema: Dict[str, str]) -> "pd.DataFrame":
+        import pandas as pd
+
+        dtypes = {
+            column: "float64" if kind in ("float", "id") and column not in TEXT_NUMERIC_COLUMNS else str
+            for column, kind in schema.items()
+        }
+        dtypes.update({column: "int64" for column, kind in schema.items() if kind == "int"})
+
+        read_kwargs = dict(
+            sep=";",
+            encoding="cp1251",
+            # Первая строка — русские описания колонок, заголовок во второй
+            header=1,
+            usecols=list(schema),
+            dtype=dtypes,
+        )
+
+        if os.path.getsize(path) > settings.DATA_CSV_CHUNK_BYTES:
+            chunks = pd.read_csv(path, chunksize=settings.DATA_CSV_CHUNK_ROWS, **read_kwargs)
+            frame = pd.concat([DatasetLoader._normalize(chunk, schema) for chunk in chunks], ignore_index=True)
+        else:
+            frame = DatasetLoader._normalize(pd.read_csv(path, **read_kwargs), schema)
+
+        for column, kind in schema.items():
+            if kind == "category":
+                frame[column] = frame[column].astype("category")
+
+        return frame[list(schema)]
+
+    @staticmethod
+    def _normalize(frame: "pd.DataFrame", schema: Dict[str, str]) -> "pd.DataFrame":
+        import pandas as pd
+
+        for column, kind in schema.items():
+            if kind == "datetime":
+                frame[column] = pd.to_datetime(frame[column].str.strip("'"), format=DATETIME_FORMAT, errors="coerce")
+            elif column in TEXT_NUMERIC_COLUMNS:
+                frame[column] = pd.to_numeric(frame[column], errors="coerce")
+
+        required = [column for column, kind in schema.items() if kind in ("id", "datetime")]
+        frame = frame.dropna(subset=required).copy()
+
+        for column, kind in schema.items():
+            if kind == "id":
+                frame[column] = frame[column].astype("int64")
+
+        return frame
+
+    @staticmethod
+    def _write_cache(frame: "pd.DataFrame", cache_dir: Path):
+        import pandas as pd
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        columns: List[Dict] = []
+
+        for column in frame.columns:
+            series = frame[column]
+            entry = {"name": column}
+
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                values = series.cat.codes.to_numpy().astype(np.int32)
+                entry["categories"] = [str(c) for c in series.cat.categories]
+            elif pd.api.types.is_datetime64_any_dtype(series):
+                values = series.to_numpy().astype("datetime64[ns]").view("int64")
+                entry["datetime"] = True
+            else:
+                values = series.to_numpy()
+
+            np.save(cache_dir / f"{len(columns)}.npy", np.ascontiguousarray(values))
+            columns.append(entry)
+
+        # meta.json пишется последним: его наличие означает, что кэш целиком готов
+        tmp_path = cache_dir / "meta.json.tmp"
+        tmp_path.write_text(json.dumps({"rows": len(frame), "columns": columns}, ensure_ascii=False))
+        os.replace(tmp_path, cache_dir / "meta.json")
+
+    @staticmethod
+    def _load_cached(cache_dir: Path) -> "pd.DataFrame":
+        import pandas as pd
+
+        meta = json.loads((cache_dir / "meta.json").read_text())
+        data = {}
+
+        for index, entry in enumerate(meta["columns"]):
+            values = np.load(cache_dir / f"{index}.npy", mmap_mode="r")
+
+            if "categories" in entry:
+                data[entry["name"]] = pd.Categorical.from_codes(values, categories=entry["categories"])
+            elif entry.get("datetime"):
+                data[entry["name"]] = values.view("datetime64[ns]")
+            else:
+                data[entry["name"]] = values
+
+        # copy=False: числовые колонки остаются отображениями .npy в память
+        return pd.DataFrame(data, copy=False)
+
+    @staticmethod
+    def clear_cache(path: Optional[Path] = None):
+        cache_root = PROJECT_ROOT / settings.DATA_CACHE_DIR
+        if not cache_root.exists():
+            return
+
+        prefix = f"{Path(path).stem}-" if path else ""
+        for cache_dir in cache_root.iterdir():
+            if cache_dir.is_dir() and cache_dir.name.startswith(prefix):
+                for file in cache_dir.iterdir():
+                    file.unlink()
+                cache_dir.rmdir()
@@ -0,0 +1,231 @@
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class ModelExplainer:
+    """Вклады признаков в отдельные предсказания.
+
+    Для деревьев — разложение по пути от корня к листу (Saabas): для каждого дерева один раз
+    строится таблица "лист -> вклад каждого признака на пути", после чего объяснение пачки —
+    это model.apply и сумма строк таблиц. Для логистической регрессии — coef * x.
+    Сумма вкладов и base_value равна выходу модели в output_space.
+    """
+
+    # id(model) -> (model, explainer): таблицы строятся один раз на снимок модели
+    cache: Dict[int, Tuple[object, "ModelExplainer"]] = {}
+    lock = threading.Lock()
+
+    MAX_CACHED = 8
+    # С такого размера пачки model.apply (дерево за деревом в Cython) обгоняет общий обход
+    SKLEARN_APPLY_ROWS = 1000
+
+    def __init__(self, model, feature_names: List[str]):
+        self.model = model
+        self.feature_names = list(feature_names)
+        self.kind = None
+        self.output_space = None
+        self.base_value = 0.0
+
+        if hasattr(model, "estimators_") and hasattr(model, "learning_rate"):
+            self._init_gradient_boosting()
+        elif hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+            self._init_forest()
+        elif hasattr(model, "get_booster"):
+            self.kind = "xgboost"
+            self.output_space = "log_odds"
+        elif hasattr(model, "coef_"):
+            self.kind = "linear"
+            self.output_space = "log_odds"
+            self.coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+            self.base_value = float(np.ravel(model.intercept_)[0])
+
+        self.global_importance = self._global_importance()
+
+    @classmethod
+    def for_model(cls, model, feature_names: List[str]) -> "ModelExplainer":
+        entry = cls.cache.get(id(model))
+        if entry is not None and entry[0] is model:
+            return entry[1]
+
+        with cls.lock:
+            entry = cls.cache.get(id(model))
+            if entry is not None and entry[0] is model:
+                return entry[1]
+
+            explainer = cls(model, feature_names)
+            if len(cls.cache) >= cls.MAX_CACHED:
+                cls.cache.pop(next(iter(cls.cache)))
+            cls.cache[id(model)] = (model, explainer)
+            return explainer
+
+    @property
+    def supported(self) -> bool:
+        return self.kind is not None
+
+    def _init_gradient_boosting(self):
+        model = self.model
+        trees = [estimator.tree_ for estimator in model.estimators_[:, 0]]
+
+        if model.init_ == "zero":
+            self.base_value = 0.0
+        else:
+            prior = float(model.init_.predict_proba(np.zeros((1, len(self.feature_names))))[0, 1])
+            self.base_value = math.log(prior / (1 - prior))
+
+        self._build_tables(trees, [tree.value[:, 0, 0] for tree in trees], float(model.learning_rate))
+        self.kind = "gradient_boosting"
+        self.output_space = "log_odds"
+
+    def _init_forest(self):
+        trees = [estimator.tree_ for estimator in self.model.estimators_]
+        # Доля класса 1 в узле: в зависимости от версии sklearn value — счётчики или доли
+        values = [tree.value[:, 0, 1] / tree.value[:, 0, :].sum(axis=1) for tree in trees]
+
+        self._build_tables(trees, values, 1.0 / len(trees))
+        self.kind = "random_forest"
+        self.output_space = "probability"
+
+    def _build_tables(self, trees, values: List[np.ndarray], scale: float):
+        tables = []
+        offsets = []
+        offset = 0
+
+        for tree, leaf_values in zip(trees, values):
+            node_values = self._node_expectations(tree, np.asarray(leaf_values, dtype=np.float64))
+            self.base_value += scale * node_values[0]
+
+            table = np.zeros((tree.node_count, len(self.feature_names)))
+            # Узлы в прямом порядке обхода: родитель всегда раньше детей
+            for node in range(tree.node_count):
+                feature = tree.feature[node]
+                for child in (tree.children_left[node], tree.children_right[node]):
+                    if child != -1:
+                        table[child] = table[node]
+                        table[child, feature] += scale * (node_values[child] - node_values[node])
+
+            tables.append(table)
+            offsets.append(offset)
+            offset += tree.node_count
+
+        self.table = np.ascontiguousarray(np.concatenate(tables))
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+        # Все деревья одним набором массивов: обход идёт сразу по всем деревьям и строкам,
+        # без model.apply, который проходит деревья по одному в цикле Python
+        self.node_feature = np.concatenate([np.maximum(tree.feature, 0) for tree in trees])
+        self.node_threshold = np.concatenate([tree.threshold for tree in trees])
+        # [левый, правый] ребёнок подряд: переход — один gather по 2 * узел + (идём вправо)
+        self.node_children = np.stack([
+            np.concatenate([self._children(tree.children_left, base) for tree, base in zip(trees, offsets)]),
+            np.concatenate([self._children(tree.children_right, base) for tree, base in zip(trees, offsets)]),
+        ], axis=1).ravel()
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+    @staticmethod
+    def _children(children: np.ndarray, base: int) -> np.ndarray:
+        """Глобальные номера детей; лист ссылается сам на себя и остаётся на месте"""
+        nodes = np.arange(len(children))
+        return np.where(children == -1, nodes, children) + base
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        """Глобальные номера листьев (n_samples, n_trees), как model.apply"""
+        if len(x) >= self.SKLEARN_APPLY_ROWS:
+            return self.model.apply(x).reshape(len(x), -1).astype(np.int64) + self.offsets
+
+        # sklearn сравнивает признаки во float32
+        x = np.asarray(x, dtype=np.float32).astype(np.float64)
+        row_starts = (np.arange(len(x)) * x.shape[1])[:, None]
+        x = x.ravel()
+        nodes = np.tile(self.offsets, (len(row_starts), 1))
+
+        for _ in range(self.max_depth):
+            go_right = ~(x[row_starts + self.node_feature[nodes]] <= self.node_threshold[nodes])
+            nodes = self.node_children[2 * nodes + go_right]
+
+        return nodes
+
+    @staticmethod
+    def _node_expectations(tree, values: np.ndarray) -> np.ndarray:
+        """Значение внутреннего узла — среднее листьев под ним с весами обучающей выборки.
+
+        В градиентном бустинге листья пересчитываются после построения дерева, поэтому
+        value внутренних узлов с ними не согласовано.
+        """
+        values = values.copy()
+        weights = tree.weighted_n_node_samples
+        for node in range(tree.node_count - 1, -1, -1):
+            left, right = tree.children_left[node], tree.children_right[node]
+            if left != -1:
+                values[node] = (weights[left] * values[left] + weights[right] * values[right]) / (
+                    weights[left] + weights[right]
+                )
+        return values
+
+    def _global_importance(self) -> Optional[np.ndarray]:
+        if hasattr(self.model, "feature_importances_"):
+            return np.asarray(self.model.feature_importances_, dtype=np.float64)
+        if self.kind == "linear":
+            magnitude = np.abs(self.coef)
+            return magnitude / magnitude.sum() if magnitude.sum() else magnitude
+        return None
+
+    def contributions(self, x: np.ndarray) -> np.ndarray:
+        """Вклады признаков (n_samples, n_features) для входа модели x — после импьютера и скейлера"""
+        if self.kind in ("gradient_boosting", "random_forest"):
+            from scipy import sparse
+
+            leaves = self.apply(x)
+            # Разреженная индикаторная матрица листьев на таблицу вкладов: без (n, деревья, признаки) в памяти
+            n_samples, n_trees = leaves.shape
+            indicator = sparse.csr_matrix(
+                (np.ones(leaves.size), leaves.ravel(), np.arange(0, leaves.size + 1, n_trees)),
+                shape=(n_samples, len(self.table))
+            )
+            return np.asarray(indicator @ self.table)
+
+        if self.kind == "linear":
+            return x * self.coef
+
+        if self.kind == "xgboost":
+            import xgboost
+
+            contribs = self.model.get_booster().predict(xgboost.DMatrix(x), pred_contribs=True)
+            self.base_value = float(contribs[0, -1])
+            return contribs[:, :-1]
+
+        raise ValueError(f"Объяснение не поддерживается для модели {type(self.model).__name__}")
+
+    def explain(self, x: np.ndarray, values: np.ndarray) -> List[Dict]:
+        """values — значения признаков для ответа (после импьютера, до масштабирования)"""
+        contributions = self.contributions(x)
+        order = np.argsort(-np.abs(contributions), axis=1, kind="stable")
+
+        return [
+            {
+                "base_value": self.base_value,
+                "output_space": self.output_space,
+                "contributions": [
+                    {
+                        "feature": self.feature_names[i],
+                        "value": float(row_values[i]),
+                        "contribution": float(row[i]),
+                    }
+                    for i in row_order
+                ],
+            }
+            for row, row_values, row_order in zip(contributions, values, order)
+        ]
+
+    def get_global_importance(self) -> Optional[List[Dict]]:
+        if self.global_importance is None:
+            return None
+
+        features = [
+            {"feature": name, "importance": float(importance)}
+            for name, importance in zip(self.feature_names, self.global_importance)
+        ]
+        features.sort(key=lambda item: item["importance"], reverse=True)
+        return features
@@ -1,6 +1,71 @@
-import joblib
+import asyncio
+import math
+import threading
+import time
+import numpy as np
 from pathlib import Path
 from datetime import datetime
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from core.config import settings
+
+
+MODEL_FILES = {
+    "GradientBoosting": "GradientBoosting_fraud_model.pkl",
+    "XGBoost": "XGBoost_fraud_model.pkl",
+    "RandomForest": "RandomForest_fraud_model.pkl",
+    "LogisticRegression": "LogisticRegression_fraud_model.pkl"
+}
+
+
+class ModelSnapshot:
+    """Согласованный набор артефактов: imputer, scaler и модели из одной загрузки"""
+
+    def __init__(self, models: Dict, imputer, scaler, fingerprint: Dict, version: int):
+        self.models = models
+        self.imputer = imputer
+        self.scaler = scaler
+        self.fingerprint = fingerprint
+        self.version = version
+        self.loaded_at = datetime.utcnow().isoformat()
+        self.preprocessing = self.numpy_preprocessing(imputer, scaler)
+
+    @staticmethod
+    def numpy_preprocessing(imputer, scaler) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(значения заполнения, сдвиг, масштаб), если imputer и scaler сводятся к арифметике numpy.
+
+        Для SimpleImputer по NaN без индикаторов и StandardScaler это те же числа, что дают их
+        transform, но без проверок sklearn на каждом вызове и без DataFrame ради имён колонок.
+        Для остального None — FraudPredictor вызывает transform самих объектов.
+        """
+        from sklearn.impute import SimpleImputer
+        from sklearn.preprocessing import StandardScaler
+
+        if type(imputer) is not SimpleImputer or type(scaler) is not StandardScaler:
+            return None
+        missing = imputer.missing_values
+        if imputer.add_indicator or not (isinstance(missing, float) and math.isnan(missing)):
+            return None
+
+        fill = np.asarray(imputer.statistics_, dtype=np.float64)
+        # Колонки без статистики sklearn отбрасывает при transform — форма выхода другая
+        if np.isnan(fill).any():
+            return None
+
+        mean = np.asarray(scaler.mean_, dtype=np.float64) if scaler.with_mean else np.zeros(len(fill))
+        scale = np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std else np.ones(len(fill))
+        return fill, mean, scale
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "models": {
+                name: {key: value for key, value in entry.items() if key != "model"}
+                for name, entry in self.models.items()
+            },
+        }
 
 
 class ModelLoader:
@@ -10,9 +75,34 @@ class ModelLoader:
     scaler = None
     active_model_name = "GradientBoosting"
 
+    # Действующий снимок и предыдущий — для отката; FraudPredictor читает snapshot одним присваиванием
+    snapshot: Optional[ModelSnapshot] = None
+    previous: Optional[ModelSnapshot] = None
+    swap_lock = threading.Lock()
+    reload_lock = threading.Lock()
+    reload_history = deque(maxlen=20)
+    # Отпечаток файлов, не прошедших проверку или откаченных: наблюдатель не берёт их повторно
+    rejected_fingerprint: Optional[Dict] = None
+    # Счётчик версий снимков: номер не повторяется после отката
+    last_version = 0
+    golden_set = None
+
+    @staticmethod
+    def model_dir() -> Path:
+        return Path(__file__).parent.parent / "trained_model"
+
+    @staticmethod
+    def fingerprint(model_dir: Path) -> Dict[str, list]:
+        """(mtime, размер) каждого .pkl: изменение означает новую выкладку"""
+        return {
+            path.name: [path.stat().st_mtime_ns, path.stat().st_size]
+            for path in sorted(model_dir.glob("*.pkl"))
+        }
+
     @classmethod
-    def load_models(cls):
-        model_dir = Path(__file__).parent.parent / "trained_model"
+    def read_snapshot(cls) -> ModelSnapshot:
+        """Загрузить артефакты с диска, не трогая действующий снимок"""
+        model_dir = cls.model_dir()
 
         if not model_dir.exists():
             raise FileNotFoundError(f"Директория с моделями не найдена: {model_dir}")
@@ -23,24 +113,22 @@ class ModelLoader:
         if not imputer_path.exists() or not scaler_path.exists():
             raise FileNotFoundError("Не найдены imputer.pkl или scaler.pkl")
 
-        cls.imputer = joblib.load(imputer_path)
-        cls.scaler = joblib.load(scaler_path)
+        # joblib тянет за собой sklearn при распаковке — только когда модели действительно грузятся
+        import joblib
 
-        print(f"Загружены imputer и scaler")
+        fingerprint = cls.fingerprint(model_dir)
+        imputer = joblib.load(imputer_path)
+        scaler = joblib.load(scaler_path)
 
-        model_files = {
-            "GradientBoosting": "GradientBoosting_fraud_model.pkl",
-            "XGBoost": "XGBoost_fraud_model.pkl",
-            "RandomForest": "RandomForest_fraud_model.pkl",
-            "LogisticRegression": "LogisticRegression_fraud_model.pkl"
-        }
+        print(f"Загружены imputer и scaler")
 
-        for name, filename in model_files.items():
+        models = {}
+        for name, filename in MODEL_FILES.items():
             model_path = model_dir / filename
             if model_path.exists():
                 try:
                     model = joblib.load(model_path)
-                    cls.models[name] = {
+                    models[name] = {
                         "model": model,
                         "loaded_at": datetime.utcnow().isoformat(),
                         "version": "1.0",
@@ -52,9 +140,27 @@ class ModelLoader:
             else:
                 print(f"⚠Файл не найден: {filename}")
 
-        if not cls.models:
+        if not models:
             raise RuntimeError("Ни одна модель не была загружена")
 
+        cls.last_version += 1
+        return ModelSnapshot(models, imputer, scaler, fingerprint, cls.last_version)
+
+    @classmethod
+    def install(cls, snapshot: ModelSnapshot):
+        """Атомарная подмена: запросы, уже создавшие FraudPredictor, дорабатывают на старом снимке"""
+        with cls.swap_lock:
+            cls.previous = cls.snapshot
+            cls.snapshot = snapshot
+            cls.models = snapshot.models
+            cls.imputer = snapshot.imputer
+            cls.scaler = snapshot.scaler
+
+    @classmethod
+    def load_models(cls):
+        snapshot = cls.read_snapshot()
+        cls.install(snapshot)
+
         print(f"Всего загружено моделей: {len(cls.models)}")
 
     @classmethod
@@ -69,3 +175,163 @@ class ModelLoader:
         if model_name not in cls.models:
             raise ValueError(f"Модель {model_name} не загружена")
         cls.active_model_name = model_name
+
+    @classmethod
+    def load_golden_set(cls):
+        """Транзакции из data/ с метками: все мошеннические и случайная выборка остальных"""
+        if cls.golden_set is None:
+            from ml.dataset_loader import DatasetLoader
+
+            frame = DatasetLoader.load_scoring_frame()
+            frauds = frame[frame["target"] == 1]
+            rows = max(settings.MODEL_RELOAD_GOLDEN_ROWS - len(frauds), 0)
+            normals = frame[frame["target"] == 0]
+            normals = normals.sample(min(rows, len(normals)), random_state=0)
+            cls.golden_set = frame.loc[frauds.index.union(normals.index)].reset_index(drop=True)
+        return cls.golden_set
+
+    @classmethod
+    def validate(cls, snapshot: ModelSnapshot) -> Dict:
+        """Прогрев и проверка снимка на эталонном наборе; исключение — снимок не ставится"""
+        from sklearn.metrics import roc_auc_score
+        from ml.explainer import ModelExplainer
+        from ml.predictor import FraudPredictor
+
+        golden = cls.load_golden_set()
+        feature_names = list(getattr(snapshot.imputer, "feature_names_in_", FraudPredictor.FEATURE_NAMES))
+        x = snapshot.scaler.transform(snapshot.imputer.transform(golden.reindex(columns=feature_names)))
+        y = golden["target"].to_numpy()
+
+        report = {}
+        for name, entry in snapshot.models.items():
+            model = entry["model"]
+            n_features = getattr(model, "n_features_in_", x.shape[1])
+            if n_features != x.shape[1]:
+                raise ValueError(f"{name}: модель ждёт {n_features} признаков, пайплайн даёт {x.shape[1]}")
+
+            # Первый вызов прогревает модель, второй показывает установившееся время
+            model.predict_proba(x[:1])
+            started = time.perf_counter()
+            probas = model.predict_proba(x)[:, 1]
+            seconds = time.perf_counter() - started
+
+            if not np.all(np.isfinite(probas)) or probas.min() < 0 or probas.max() > 1:
+                raise ValueError(f"{name}: вероятности вне [0, 1] на эталонном наборе")
+
+            auc = float(roc_auc_score(y, probas)) if 0 < y.sum() < len(y) else None
+            if auc is not None and auc < settings.MODEL_RELOAD_MIN_AUC:
+                raise ValueError(f"{name}: ROC AUC {auc:.3f} ниже {settings.MODEL_RELOAD_MIN_AUC}")
+
+            # Таблицы объяснений строятся здесь, а не на первом запросе с ?explain=true
+            ModelExplainer.for_model(model, feature_names)
+
+            report[name] = {
+                "roc_auc": round(auc, 4) if auc is not None else None,
+                "fraud_rate": round(float(np.mean(probas >= settings.DEFAULT_FRAUD_THRESHOLD)), 4),
+                "us_per_row": round(1e6 * seconds / len(x), 2),
+            }
+
+        if cls.active_model_name not in snapshot.models:
+            raise ValueError(f"В новой выкладке нет активной модели {cls.active_model_name}")
+
+        return {"rows": len(x), "frauds": int(y.sum()), "models": report}
+
+    @classmethod
+    def check_live(cls):
+        """Полный путь запроса на действующем снимке: режим скоринга, объяснения, причины"""
+        from ml.predictor import FraudPredictor
+
+        golden = cls.load_golden_set().head(100)
+        features_list = golden.to_dict("records")
+        FraudPredictor(threshold=settings.DEFAULT_FRAUD_THRESHOLD).predict_batch(features_list, explain=True)
+
+    @classmethod
+    def reload(cls, trigger: str = "api") -> Dict:
+        """Загрузить, проверить и подменить снимок; при любой ошибке остаётся действующий"""
+        if not cls.reload_lock.acquire(blocking=False):
+            return {"status": "in_progress"}
+
+        started = time.perf_counter()
+        result = {"trigger": trigger, "started_at": datetime.utcnow().isoformat()}
+        try:
+            snapshot = cls.read_snapshot()
+            result["validation"] = cls.validate(snapshot)
+
+            previous = cls.previous
+            cls.install(snapshot)
+            try:
+                cls.check_live()
+            except Exception:
+                cls.install(cls.previous)
+                cls.previous = previous
+                raise
+
+            result.update(status="success", version=snapshot.version)
+            print(f"Модели перезагружены, версия снимка {snapshot.version}")
+        except Exception as e:
+            cls.rejected_fingerprint = cls.fingerprint(cls.model_dir())
+            result.update(status="rolled_back", error=str(e), version=cls.snapshot.version if cls.snapshot else None)
+            print(f"⚠Перезагрузка моделей отклонена, остаётся прежний снимок: {e}")
+        finally:
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            cls.reload_history.appendleft(result)
+            cls.reload_lock.release()
+
+        return result
+
+    @classmethod
+    def rollback(cls) -> Dict:
+        """Вернуть предыдущий снимок"""
+        with cls.reload_lock:
+            if cls.previous is None:
+                raise ValueError("Нет предыдущего снимка для отката")
+            cls.install(cls.previous)
+            # Файлы на диске — те, от которых откатились: наблюдатель ждёт новой выкладки
+            try:
+                cls.rejected_fingerprint = cls.fingerprint(cls.model_dir())
+            except OSError:
+                pass
+            result = {
+                "trigger": "rollback",
+                "status": "success",
+                "version": cls.snapshot.version,
+                "started_at": datetime.utcnow().isoformat(),
+            }
+            cls.reload_history.appendleft(result)
+        return result
+
+    @classmethod
+    async def watch_periodically(cls):
+        """Перезагрузка по изменению файлов trained_model/; файлы должны не меняться между двумя проверками"""
+        pending = None
+        while True:
+            await asyncio.sleep(settings.MODEL_RELOAD_CHECK_SECONDS)
+            if cls.snapshot is None:
+                continue
+
+            try:
+                current = cls.fingerprint(cls.model_dir())
+            except OSError:
+                continue
+
+            if current in (cls.snapshot.fingerprint, cls.rejected_fingerprint):
+                pending = None
+                continue
+            if current != pending:
+                # Выкладка ещё может идти — ждём, пока файлы перестанут меняться
+                pending = current
+                continue
+
+            pending = None
+            await asyncio.to_thread(cls.reload, "watch")
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return {
+            "active_model": cls.active_model_name,
+            "snapshot": cls.snapshot.to_dict() if cls.snapshot else None,
+            "previous_version": cls.previous.version if cls.previous else None,
+            "watching": settings.MODEL_RELOAD_WATCH,
+            "reload_in_progress": cls.reload_lock.locked(),
+            "history": list(cls.reload_history),
+        }
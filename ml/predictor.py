@@ -1,9 +1,12 @@
 import numpy as np
-import pandas as pd
-from typing import Dict, List
-import joblib
+from typing import Dict, List, Optional, Tuple
 
+from core.config import settings
+from core.request_profiler import RequestProfiler
+from ml.cascade import cascade_proba
+from ml.explainer import ModelExplainer
 from ml.model_loader import ModelLoader
+from ml.shadow import ShadowScorer
 
 
 class FraudPredictor:
@@ -27,53 +30,146 @@ class FraudPredictor:
         "z_score_7d_vs_30d",
     ]
 
-    def __init__(self, threshold: float = 0.5):
+    def __init__(self, threshold: float = 0.5, model_name: Optional[str] = None):
+        """model_name — конкретная загруженная модель вместо активной (и вместо каскада)"""
         self.threshold = threshold
-        self.imputer = ModelLoader.imputer
-        self.scaler = ModelLoader.scaler
-        self.model = ModelLoader.get_active_model()
+        # Все артефакты из одного снимка: горячая перезагрузка не смешает старый скейлер с новой моделью
+        snapshot = ModelLoader.snapshot
+        models = snapshot.models if snapshot else {}
+        self.imputer = snapshot.imputer if snapshot else None
+        self.scaler = snapshot.scaler if snapshot else None
+        self.preprocessing = snapshot.preprocessing if snapshot else None
+
+        # Теневое сравнение — только с активной моделью: оценки дешёвой модели режима cheap
+        # или прогрева отдельных моделей не должны смешиваться с оценками чемпиона
+        self.is_champion = model_name is None
+        self.model_version = model_name or ModelLoader.active_model_name
+        if model_name is None and self.model_version not in models and models:
+            self.model_version = next(iter(models))
+        entry = models.get(self.model_version)
+        self.model = entry["model"] if entry else None
+        # Колонки, на которых обучен пайплайн: переобученная модель с дополнительными
+        # входами (например, скоростями из VelocityIndex) получит их по имени
+        self.feature_names = list(getattr(self.imputer, "feature_names_in_", self.FEATURE_NAMES))
+
+        # Каскад: первая модель оценивает всё, вторая — только строки в неуверенной полосе
+        self.cascade = None
+        if settings.SCORING_MODE == "cascade" and model_name is None:
+            first = models.get(settings.CASCADE_FIRST_MODEL)
+            second = models.get(settings.CASCADE_SECOND_MODEL)
+            if first and second:
+                self.cascade = (first["model"], second["model"])
+                self.model = second["model"]
+                self.model_version = f"cascade:{settings.CASCADE_FIRST_MODEL}>{settings.CASCADE_SECOND_MODEL}"
 
         if not self.model or not self.imputer or not self.scaler:
             raise RuntimeError("Модели не загружены. Проверьте ModelLoader.")
 
-    def predict_single(self, features: Dict) -> Dict:
-
-        feature_values = [features.get(name, 0) for name in self.FEATURE_NAMES]
-
-        df = pd.DataFrame([feature_values], columns=self.FEATURE_NAMES)
-
-        x_imp = self.imputer.transform(df)
-        x_scaled = self.scaler.transform(x_imp)
-
-        proba = self.model.predict_proba(x_scaled)[0, 1]
-        is_fraud = proba >= self.threshold
-
-        return {
-            "fraud_probability": float(proba),
-            "is_fraud": bool(is_fraud),
-            "model_version": ModelLoader.active_model_name
-        }
+    def transform(self, x) -> Tuple[np.ndarray, np.ndarray]:
+        """(после импьютера, после скейлера) — второе подаётся в модель.
+
+        x — матрица или DataFrame с колонками в порядке feature_names.
+        """
+        with RequestProfiler.stage("preprocess"):
+            if self.preprocessing is not None:
+                fill, mean, scale = self.preprocessing
+                x = np.asarray(x, dtype=np.float64)
+                x_imp = np.where(np.isnan(x), fill, x)
+                return x_imp, (x_imp - mean) / scale
+
+            # Нестандартный пайплайн — через sklearn; ему нужны имена колонок, как при обучении
+            import pandas as pd
+
+            x_imp = self.imputer.transform(pd.DataFrame(np.asarray(x, dtype=np.float64), columns=self.feature_names))
+            return x_imp, self.scaler.transform(x_imp)
+
+    def score(self, x_scaled: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Вероятности и, в режиме каскада, маска строк, дошедших до второй модели"""
+        with RequestProfiler.stage("model"):
+            if self.cascade is None:
+                probas, escalated = self.model.predict_proba(x_scaled)[:, 1], None
+            else:
+                first_model, second_model = self.cascade
+                probas, escalated = cascade_proba(
+                    first_model, second_model, x_scaled, settings.CASCADE_LOW, settings.CASCADE_HIGH
+                )
+
+        if self.is_champion:
+            ShadowScorer.offer(x_scaled, probas, self.model_version, self.threshold)
+        return probas, escalated
+
+    def predict_proba(self, x) -> np.ndarray:
+        _, x_scaled = self.transform(x)
+
+        return self.score(x_scaled)[0]
+
+    @property
+    def explainer(self) -> ModelExplainer:
+        return ModelExplainer.for_model(self.model, self.feature_names)
+
+    def predict_single(self, features: Dict, explain: bool = False) -> Dict:
+        return self.predict_batch([features], explain=explain)[0]
+
+    def predict_batch(self, features_list: List[Dict], explain: bool = False) -> List[Dict]:
+        if not features_list:
+            return []
+
+        # None (признак не передан) становится NaN и заполняется импьютером
+        x = np.array(
+            [[features.get(name, 0) for name in self.feature_names] for features in features_list],
+            dtype=np.float64
+        )
+
+        x_imp, x_scaled = self.transform(x)
+        probas, escalated = self.score(x_scaled)
+
+        if escalated is None:
+            model_versions = [self.model_version] * len(probas)
+        else:
+            model_versions = np.where(
+                escalated, settings.CASCADE_SECOND_MODEL, settings.CASCADE_FIRST_MODEL
+            ).tolist()
+
+        predictions = [
+            {
+                "fraud_probability": float(proba),
+                "is_fraud": bool(proba >= self.threshold),
+                "model_version": model_version
+            }
+            for proba, model_version in zip(probas, model_versions)
+        ]
 
-    def predict_batch(self, features_list: List[Dict]) -> List[Dict]:
-        results = []
-        for features in features_list:
-            result = self.predict_single(features)
-            results.append(result)
-        return results
+        if explain:
+            with RequestProfiler.stage("explain"):
+                for prediction, explanation in zip(predictions, self._explain(x_scaled, x_imp, escalated)):
+                    if explanation is not None:
+                        prediction["explanation"] = explanation
+
+        return predictions
+
+    def _explain(self, x_scaled: np.ndarray, x_imp: np.ndarray, escalated: Optional[np.ndarray]) -> List[Optional[Dict]]:
+        """Каждая строка объясняется той моделью, которая поставила ей оценку"""
+        if escalated is None:
+            stages = [(self.model, np.arange(len(x_scaled)))]
+        else:
+            first_model, second_model = self.cascade
+            stages = [(first_model, np.flatnonzero(~escalated)), (second_model, np.flatnonzero(escalated))]
+
+        explanations: List[Optional[Dict]] = [None] * len(x_scaled)
+        for model, rows in stages:
+            explainer = ModelExplainer.for_model(model, self.feature_names)
+            if len(rows) and explainer.supported:
+                for row, explanation in zip(rows, explainer.explain(x_scaled[rows], x_imp[rows])):
+                    explanations[row] = explanation
+        return explanations
 
     def get_feature_importance(self) -> Dict:
-        if not hasattr(self.model, 'feature_importances_'):
+        """Глобальная важность признаков, посчитанная один раз на снимок модели"""
+        features = self.explainer.get_global_importance()
+        if features is None:
             return {"error": "Модель не поддерживает feature_importances_"}
 
-        importances = self.model.feature_importances_
-
-        feature_importance = [
-            {"feature": name, "importance": float(imp)}
-            for name, imp in zip(self.FEATURE_NAMES, importances)
-        ]
-        feature_importance.sort(key=lambda x: x['importance'], reverse=True)
-
         return {
             "model": ModelLoader.active_model_name,
-            "features": feature_importance
-        }
\ No newline at end of file
+            "features": features
+        }
@@ -0,0 +1,221 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.config import settings
+from core.token_bucket import TokenBucket
+
+
+class ShadowComparison:
+    """Сводка "претендент против чемпиона" без хранения самих строк"""
+
+    __slots__ = ("rows", "agreements", "champion_positive", "challenger_positive",
+                 "delta_sum", "abs_delta_sum", "sq_delta_sum", "max_abs_delta", "seconds")
+
+    def __init__(self):
+        self.rows = 0
+        self.agreements = 0
+        self.champion_positive = 0
+        self.challenger_positive = 0
+        self.delta_sum = 0.0
+        self.abs_delta_sum = 0.0
+        self.sq_delta_sum = 0.0
+        self.max_abs_delta = 0.0
+        self.seconds = 0.0
+
+    def add(self, champion: np.ndarray, challenger: np.ndarray, threshold: float, seconds: float):
+        delta = challenger - champion
+        champion_flag = champion >= threshold
+        challenger_flag = challenger >= threshold
+
+        self.rows += len(delta)
+        self.agreements += int(np.sum(champion_flag == challenger_flag))
+        self.champion_positive += int(champion_flag.sum())
+        self.challenger_positive += int(challenger_flag.sum())
+        self.delta_sum += float(delta.sum())
+        self.abs_delta_sum += float(np.abs(delta).sum())
+        self.sq_delta_sum += float(np.square(delta).sum())
+        self.max_abs_delta = max(self.max_abs_delta, float(np.abs(delta).max()))
+        self.seconds += seconds
+
+    def to_dict(self) -> Dict:
+        rows = self.rows or 1
+        return {
+            "rows": self.rows,
+            "agreement_rate": self.agreements / rows,
+            "champion_fraud_rate": self.champion_positive / rows,
+            "challenger_fraud_rate": self.challenger_positive / rows,
+            "mean_delta": self.delta_sum / rows,
+            "mean_abs_delta": self.abs_delta_sum / rows,
+            "rmse_delta": (self.sq_delta_sum / rows) ** 0.5,
+            "max_abs_delta": self.max_abs_delta,
+            "us_per_row": 1e6 * self.seconds / rows,
+        }
+
+
+class ShadowScorer:
+    """Теневой скоринг: выборка запросов копируется в ограниченную очередь, фоновый поток
+    прогоняет её через претендентов из SHADOW_MODELS и копит сравнение с чемпионом.
+
+    На пути запроса — только выборка строк и put_nowait: при переполнении очереди или
+    превышении SHADOW_MAX_ROWS_PER_SECOND строки отбрасываются, а не ждут.
+    """
+
+    queue: "queue.Queue" = queue.Queue(maxsize=settings.SHADOW_QUEUE_SIZE)
+    comparisons: Dict[str, ShadowComparison] = {}
+    budget = TokenBucket(settings.SHADOW_MAX_ROWS_PER_SECOND, settings.SHADOW_MAX_ROWS_PER_SECOND)
+    lock = threading.Lock()
+    worker: Optional[threading.Thread] = None
+    stop_event = threading.Event()
+    # Последние расхождения решений для разбора: (время, чемпион, претендент, p чемпиона, p претендента)
+    disagreements = deque(maxlen=50)
+    stats = {"offered": 0, "sampled": 0, "shed_queue_full": 0, "shed_rate_limit": 0,
+             "processed": 0, "errors": 0}
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(settings.SHADOW_MODELS) and settings.SHADOW_SAMPLE_RATE > 0
+
+    @classmethod
+    def offer(cls, x: np.ndarray, probas: np.ndarray, champion: str, threshold: float):
+        """Вызывается на пути запроса после скоринга: стоит микросекунды и никогда не блокирует"""
+        if not cls.enabled() or cls.worker is None:
+            return
+
+        n = len(x)
+        cls.stats["offered"] += n
+        if n == 1:
+            if random.random() >= settings.SHADOW_SAMPLE_RATE:
+                return
+            rows = np.zeros(1, dtype=np.int64)
+        else:
+            rows = np.flatnonzero(np.random.random(n) < settings.SHADOW_SAMPLE_RATE)
+            if not len(rows):
+                return
+
+        # Сверх бюджета строк в секунду выборка урезается
+        with cls.lock:
+            allowed = cls.budget.take(len(rows))
+        cls.stats["shed_rate_limit"] += len(rows) - allowed
+        if not allowed:
+            return
+        rows = rows[:allowed]
+
+        try:
+            cls.queue.put_nowait((x[rows], np.array(probas[rows], dtype=np.float64), champion, threshold))
+            cls.stats["sampled"] += allowed
+        except queue.Full:
+            cls.stats["shed_queue_full"] += allowed
+
+    @classmethod
+    def start(cls):
+        if not cls.enabled() or (cls.worker is not None and cls.worker.is_alive()):
+            return
+
+        cls.stop_event.clear()
+        cls.worker = threading.Thread(target=cls._run, name="shadow-scoring", daemon=True)
+        cls.worker.start()
+        print(f"Теневой скоринг: {', '.join(settings.SHADOW_MODELS)}, выборка {settings.SHADOW_SAMPLE_RATE:.0%}")
+
+    @classmethod
+    def stop(cls, timeout: float = 2.0):
+        if cls.worker is None:
+            return
+        cls.stop_event.set()
+        cls.worker.join(timeout)
+        cls.worker = None
+
+    @classmethod
+    def _run(cls):
+        from ml.model_loader import ModelLoader
+
+        while not cls.stop_event.is_set():
+            try:
+                batch = [cls.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            # Всё, что накопилось, одним вызовом на модель
+            rows = len(batch[0][0])
+            while rows < settings.SHADOW_BATCH_SIZE:
+                try:
+                    item = cls.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            try:
+                cls._score(batch, ModelLoader.models)
+            except Exception as e:
+                cls.stats["errors"] += 1
+                print(f"Ошибка теневого скоринга: {e}")
+
+    @classmethod
+    def _score(cls, batch: List, models: Dict):
+        # Пачка группируется по чемпиону и порогу, на случай смены активной модели
+        groups: Dict = {}
+        for x, probas, champion, threshold in batch:
+            groups.setdefault((champion, threshold), []).append((x, probas))
+
+        for (champion, threshold), items in groups.items():
+            x = np.concatenate([item[0] for item in items])
+            champion_probas = np.concatenate([item[1] for item in items])
+
+            for name in settings.SHADOW_MODELS:
+                entry = models.get(name)
+                if entry is None or name == champion:
+                    continue
+
+                started = time.perf_counter()
+                challenger_probas = entry["model"].predict_proba(x)[:, 1]
+                seconds = time.perf_counter() - started
+
+                key = f"{name} vs {champion}"
+                with cls.lock:
+                    comparison = cls.comparisons.setdefault(key, ShadowComparison())
+                    comparison.add(champion_probas, challenger_probas, threshold, seconds)
+
+                    flipped = np.flatnonzero((champion_probas >= threshold) != (challenger_probas >= threshold))
+                    for row in flipped[-5:]:
+                        cls.disagreements.append({
+                            "at": time.time(),
+                            "champion": champion,
+                            "challenger": name,
+                            "champion_probability": float(champion_probas[row]),
+                            "challenger_probability": float(challenger_probas[row]),
+                        })
+
+            cls.stats["processed"] += len(x)
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.comparisons.clear()
+            cls.disagreements.clear()
+            for key in cls.stats:
+                cls.stats[key] = 0
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        with cls.lock:
+            comparisons = {key: comparison.to_dict() for key, comparison in cls.comparisons.items()}
+            disagreements = list(cls.disagreements)
+
+        return {
+            "enabled": cls.enabled(),
+            "running": cls.worker is not None and cls.worker.is_alive(),
+            "models": settings.SHADOW_MODELS,
+            "sample_rate": settings.SHADOW_SAMPLE_RATE,
+            "max_rows_per_second": settings.SHADOW_MAX_ROWS_PER_SECOND,
+            "queue_depth": cls.queue.qsize(),
+            "queue_size": settings.SHADOW_QUEUE_SIZE,
+            **cls.stats,
+            "comparisons": comparisons,
+            "recent_disagreements": disagreements,
+        }
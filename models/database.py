@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Boolean, DateTime, Integer, Text, JSON
+from sqlalchemy import Column, String, Float, Boolean, DateTime, Integer, BigInteger, Text, JSON, Index
 from sqlalchemy.sql import func
 from datetime import datetime
 import uuid
@@ -36,6 +36,8 @@ class Transaction(Base):
     is_fraud = Column(Boolean, nullable=True)
     risk_level = Column(String, nullable=True)
     reasons = Column(JSON, nullable=True)
+    # Биты кодов причин из rules/fraud_rules.json, NULL — ещё не заполнено бэкфиллом
+    reason_mask = Column(BigInteger, nullable=True, index=True)
     model_version = Column(String, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -46,6 +48,20 @@ class Transaction(Base):
     review_status = Column(String, nullable=True)
 
 
+class TransactionReason(Base):
+    """Таблица поиска: строка на каждую причину транзакции, фильтр по причине идёт по индексу"""
+    __tablename__ = "transaction_reasons"
+
+    id = Column(Integer, primary_key=True)
+    transaction_id = Column(String, nullable=False)
+    reason_bit = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_transaction_reasons_bit_transaction", "reason_bit", "transaction_id"),
+        Index("ix_transaction_reasons_transaction", "transaction_id"),
+    )
+
+
 class AlertLog(Base):
     __tablename__ = "alert_logs"
 
@@ -62,3 +78,71 @@ class AlertLog(Base):
     acknowledged_at = Column(DateTime(timezone=True), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ScoringJob(Base):
+    """Задача пакетного скоринга из API; состояние переживает перезапуск сервиса"""
+    __tablename__ = "scoring_jobs"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, unique=True, index=True, default=lambda: str(uuid.uuid4()))
+    status = Column(String, nullable=False, index=True)
+    # data, файл из data/ или inline (вход сохранён в SCORING_JOB_INPUT_DIR)
+    source = Column(String, nullable=False)
+    input_path = Column(String, nullable=True)
+    chunk_size = Column(Integer, nullable=False)
+    model_name = Column(String, nullable=True)
+    threshold = Column(Float, nullable=False)
+
+    total_rows = Column(Integer, nullable=True)
+    rows_done = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    fraud_detected = Column(Integer, default=0)
+    # Сколько раз пул воркеров пересоздавался после падения процесса
+    worker_restarts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    # Процесс, который считает задачу (хост:pid), и срок его аренды
+    owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ScoringJobChunk(Base):
+    """Контрольная точка: пачка записана вместе со своими результатами одной транзакцией"""
+    __tablename__ = "scoring_job_chunks"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+    rows = Column(Integer, nullable=False)
+    seconds = Column(Float, nullable=True)
+    finished_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_scoring_job_chunks_job_chunk", "job_id", "chunk_index", unique=True),
+    )
+
+
+class ScoringJobResult(Base):
+    __tablename__ = "scoring_job_results"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, nullable=False)
+    # Номер строки во входе задачи: курсор постраничной выдачи
+    row_number = Column(Integer, nullable=False)
+    transaction_id = Column(String, nullable=True)
+    client_id = Column(String, nullable=True)
+    fraud_probability = Column(Float, nullable=False)
+    is_fraud = Column(Boolean, nullable=False)
+    risk_level = Column(String, nullable=False)
+    reason_mask = Column(BigInteger, nullable=False)
+    # JSON-массив текстов причин, как в выходе ml.bulk_scoring
+    reasons = Column(Text, nullable=False)
+    model_version = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_scoring_job_results_job_row", "job_id", "row_number", unique=True),
+    )
@@ -0,0 +1,208 @@
+"""Многопроцессный production-запуск с общей памятью моделей.
+
+    python -m serve --workers 4 --port 8000
+
+Модели, таблицы объяснений, правила и кэш профилей загружаются один раз в родительском
+процессе, затем он открывает сокет и делает fork воркеров uvicorn: страницы с артефактами
+остаются общими (копирование при записи), память не растёт кратно числу воркеров.
+Упавший воркер перезапускается новым fork того же родителя.
+"""
+import sys
+
+from core.startup import StartupProfile
+
+# Таймер импортов ставится до первых тяжёлых импортов, поэтому флаг проверяется раньше argparse
+if "--profile-startup" in sys.argv:
+    StartupProfile.enable()
+
+import argparse
+import gc
+import importlib
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from core.config import settings
+
+# До импорта numpy/sklearn: пулы потоков BLAS/OpenMP создаются при загрузке библиотек.
+# Параллелизм дают процессы, N воркеров x N потоков только мешали бы друг другу
+for _name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_name, str(settings.WORKER_BLAS_THREADS))
+
+
+def preload():
+    """Всё, что только читается после загрузки, — до fork"""
+    from ml.explainer import ModelExplainer
+    from ml.model_loader import ModelLoader
+    from services.profile_cache import ClientProfileCache
+    from services.rules_engine import RulesEngine
+
+    with StartupProfile.stage("models"):
+        ModelLoader.load_models()
+    with StartupProfile.stage("explainer_tables"):
+        feature_names = list(getattr(ModelLoader.imputer, "feature_names_in_", []))
+        for entry in ModelLoader.models.values():
+            ModelExplainer.for_model(entry["model"], feature_names)
+    with StartupProfile.stage("rules"):
+        print(f"Загружено правил причин: {RulesEngine.load()}")
+    with StartupProfile.stage("profile_cache"):
+        ClientProfileCache.load_from_patterns()
+
+    # Схема БД — один раз здесь: create_all из нескольких воркеров сразу гонится на новой базе
+    from core.database import Base, engine
+    from services.reason_index import ReasonIndex
+    from services.scoring_jobs import ScoringJobService
+    import models.database  # noqa: F401
+
+    with StartupProfile.stage("db_schema"):
+        Base.metadata.create_all(bind=engine)
+        ReasonIndex.ensure_schema(engine)
+        ScoringJobService.ensure_schema(engine)
+        engine.dispose()
+
+    # Уцелевшие объекты — в постоянное поколение: сборщик мусора воркера не обходит их
+    # и не пишет в заголовки, иначе общие страницы копировались бы при первой сборке
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index: int, sock: socket.socket, stats_dir: Path):
+    """Тело процесса-воркера после fork; не возвращается"""
+    import uvicorn
+    from threadpoolctl import threadpool_limits
+    from datetime import datetime
+
+    from core.database import engine, read_engine
+    from main import app
+    from services.event_bus import EventBus
+    from services.worker_stats import WorkerStats
+
+    class WorkerServer(uvicorn.Server):
+
+        def handle_exit(self, sig, frame):
+            # Сервер ждёт завершения ответов до остановки, а онлайн-лента бесконечна
+            EventBus.close()
+            super().handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    threadpool_limits(settings.WORKER_BLAS_THREADS)
+    # Соединения из пула родителя не переиспользуются в дочернем процессе
+    engine.dispose(close=False)
+    if read_engine is not None:
+        read_engine.dispose(close=False)
+
+    WorkerStats.index = index
+    WorkerStats.stats_dir = stats_dir
+    WorkerStats.started_at = datetime.utcnow()
+
+    code = 1
+    try:
+        server = WorkerServer(uvicorn.Config(app, log_level="info", access_log=False))
+        server.run(sockets=[sock])
+        # Server.run не завершает процесс с ошибкой, если не прошёл lifespan
+        code = 0 if server.started else 3
+    except BaseException as e:
+        print(f"Воркер {index} завершился с ошибкой: {e}")
+    finally:
+        os._exit(code)
+
+
+class Supervisor:
+
+    def __init__(self, workers: int, sock: socket.socket, stats_dir: Path):
+        self.workers = workers
+        self.sock = sock
+        self.stats_dir = stats_dir
+        self.children: Dict[int, int] = {}
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(index, self.sock, self.stats_dir)
+        self.children[pid] = index
+        print(f"Воркер {index} запущен, pid {pid}")
+
+    def stop(self, signum, _frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        print(f"Остановка воркеров по сигналу {signal.Signals(signum).name}")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for index in range(self.workers):
+            self.spawn(index)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+
+            print(f"Воркер {index} (pid {pid}) завершился с кодом {os.waitstatus_to_exitcode(status)}, перезапуск")
+            time.sleep(1)
+            if not self.stopping:
+                self.spawn(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Production-запуск: предзагрузка моделей и fork воркеров uvicorn")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS,
+                        help="Число воркеров, 0 — по числу ядер; состояние в памяти у каждого своё (README)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Время импорта модулей и этапов загрузки; отчёт — при первой готовности воркера 0")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    preload()
+    # Импорт приложения тоже до fork: модули и их объекты общие для воркеров
+    with StartupProfile.stage("import_app"):
+        importlib.import_module("main")
+    gc.freeze()
+    print(f"Предзагрузка завершена за {time.perf_counter() - started:.1f} с, воркеров: {workers}")
+
+    from services.worker_stats import WorkerStats
+
+    WorkerStats.workers = workers
+    sock = bind_socket(args.host, args.port)
+    stats_dir = Path(tempfile.mkdtemp(prefix="forte-fraud-workers-"))
+    try:
+        Supervisor(workers, sock, stats_dir).run()
+    finally:
+        sock.close()
+        shutil.rmtree(stats_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
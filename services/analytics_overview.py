@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from api.responses import dumps
+from core.config import settings
+from core.database import ReadRouting
+from models.database import Transaction as DBTransaction
+from services.analytics_service import AnalyticsService
+from services.reason_index import ReasonIndex
+from services.transaction_service import TransactionService
+
+# Паттернов в панели дашборда, как в /dashboard
+DASHBOARD_PATTERNS = 5
+
+
+class AnalyticsOverview:
+    """Все панели веб-интерфейса одним запросом /api/v1/analytics/overview.
+
+    Чтения идут через ReadRouting (реплика или отдельный пул чтения, если исправны).
+    Снимок данных — максимальный id транзакции на момент запроса: части считаются
+    одновременно в потоках, каждая в своей сессии, но все по строкам с id не больше снимка,
+    поэтому сводка, дашборд и список согласованы между собой. Сводка и дашборд при одном
+    периоде берут общие агрегаты. ETag строится из параметров, снимка, минуты начала
+    периода, версий модели и правил и состояния /health: пока они не менялись, ответ
+    берётся из кэша воркера, а If-None-Match с тем же ETag получает 304 без расчёта.
+    """
+
+    cache: "OrderedDict[str, bytes]" = OrderedDict()
+    pending: Dict[str, "asyncio.Future[bytes]"] = {}
+    stats = {"computed": 0, "cache_hits": 0, "not_modified": 0}
+
+    @staticmethod
+    def watermark() -> int:
+        """Снимок: максимальный id транзакции (поиск по первичному ключу, без обхода таблицы)"""
+        db = ReadRouting.open_session()
+        try:
+            return db.query(func.max(DBTransaction.id)).scalar() or 0
+        finally:
+            db.close()
+
+    @staticmethod
+    def period_end() -> datetime:
+        """Граница периода с точностью до минуты: без новых транзакций ETag меняется раз в минуту"""
+        return datetime.utcnow().replace(second=0, microsecond=0)
+
+    @staticmethod
+    def etag(params: Dict, watermark: int, period_end: datetime, health: Dict) -> str:
+        from ml.model_loader import ModelLoader
+        from services.rules_engine import RulesEngine
+
+        snapshot = ModelLoader.snapshot
+        key = dumps({
+            "params": params,
+            "watermark": watermark,
+            "period_end": period_end.isoformat(),
+            "model": snapshot.version if snapshot is not None else None,
+            "rules": RulesEngine.loaded_at.isoformat() if RulesEngine.loaded_at else None,
+            "health": {"status": health["status"], "components": health["components"]},
+        })
+        # Слабый ETag: тело при повторном расчёте может отличаться временем генерации
+        return 'W/"' + hashlib.sha1(key).hexdigest()[:24] + '"'
+
+    @staticmethod
+    def matches(if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+    @staticmethod
+    def _in_session(query, *args, **kwargs):
+        db = ReadRouting.open_session()
+        try:
+            return query(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _transactions(db, watermark: int, limit: int, risk_level: Optional[str],
+                      is_fraud: Optional[bool]) -> List[Dict]:
+        from api.schemas import TransactionResponse
+
+        transactions = TransactionService.get_filtered_transactions(
+            db=db, limit=limit, is_fraud=is_fraud, risk_level=risk_level, until_id=watermark
+        )
+        return [TransactionResponse.model_validate(t).model_dump(mode="json") for t in transactions]
+
+    @staticmethod
+    def _feature_importance() -> Dict:
+        from ml.predictor import FraudPredictor
+
+        try:
+            return FraudPredictor().get_feature_importance()
+        except Exception as e:
+            return {"error": str(e)}
+
+    @classmethod
+    async def compute(cls, params: Dict, watermark: int, period_end: datetime, health: Dict) -> Dict:
+        days = params["days"]
+        summary_days = params["summary_days"]
+        starts = {period: period_end - timedelta(days=period) for period in {days, summary_days}}
+
+        def run(query, *args, **kwargs):
+            return asyncio.to_thread(cls._in_session, query, *args, **kwargs)
+
+        # Независимые части — одновременно; одинаковые периоды сводки и дашборда считаются один раз
+        periods = sorted(starts)
+        results = await asyncio.gather(
+            *(run(AnalyticsService.get_period_aggregates, starts[period], watermark) for period in periods),
+            *(run(ReasonIndex.get_reason_counts, starts[period], watermark) for period in periods),
+            run(AnalyticsService.get_top_risk_patterns, max(params["patterns_limit"], DASHBOARD_PATTERNS), watermark),
+            run(cls._transactions, watermark, params["limit"], params["risk_level"], params["is_fraud"]),
+            asyncio.to_thread(cls._feature_importance),
+        )
+        aggregates = dict(zip(periods, results[:len(periods)]))
+        reason_counts = dict(zip(periods, results[len(periods):2 * len(periods)]))
+        patterns, transactions, feature_importance = results[2 * len(periods):]
+
+        dashboard = aggregates[days]
+        summary = aggregates[summary_days]
+        return {
+            "generated_at": datetime.utcnow().isoformat(),
+            "snapshot": {"max_transaction_id": watermark, "period_end": period_end.isoformat()},
+            "health": health,
+            "summary": {
+                **summary,
+                "reason_counts": reason_counts[summary_days],
+                "period_start": starts[summary_days].isoformat(),
+                "period_end": period_end.isoformat(),
+            },
+            "dashboard": {
+                "total_transactions": dashboard["total_transactions"],
+                "fraud_detected": dashboard["fraud_detected"],
+                "fraud_rate": dashboard["fraud_rate"],
+                "avg_fraud_amount": dashboard["avg_fraud_amount"],
+                "period_days": days,
+                "period_start": starts[days].isoformat(),
+                "period_end": period_end.isoformat(),
+                "reason_counts": reason_counts[days],
+                "top_risk_patterns": patterns[:DASHBOARD_PATTERNS],
+            },
+            "risk_patterns": patterns[:params["patterns_limit"]],
+            "feature_importance": feature_importance,
+            "transactions": transactions,
+        }
+
+    @classmethod
+    async def _compute_body(cls, params: Dict, etag: str, watermark: int, period_end: datetime,
+                            health: Dict) -> bytes:
+        body = dumps(await cls.compute(params, watermark, period_end, health))
+        cls.stats["computed"] += 1
+        cls.cache[etag] = body
+        while len(cls.cache) > settings.OVERVIEW_CACHE_SIZE:
+            cls.cache.popitem(last=False)
+        return body
+
+    @classmethod
+    async def get(cls, params: Dict, etag: str, watermark: int, period_end: datetime, health: Dict) -> bytes:
+        """Тело ответа по ETag: из кэша воркера, из уже идущего расчёта или новым расчётом"""
+        body = cls.cache.get(etag)
+        if body is not None:
+            cls.cache.move_to_end(etag)
+            cls.stats["cache_hits"] += 1
+            return body
+
+        # Одновременные одинаковые запросы (страница открыта у многих) ждут один расчёт
+        task = cls.pending.get(etag)
+        if task is None:
+            task = asyncio.ensure_future(cls._compute_body(params, etag, watermark, period_end, health))
+            cls.pending[etag] = task
+            task.add_done_callback(lambda _: cls.pending.pop(etag, None))
+        else:
+            cls.stats["cache_hits"] += 1
+        # Отключение одного клиента не отменяет расчёт для остальных
+        return await asyncio.shield(task)
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return {"cached": len(cls.cache), **cls.stats}
@@ -1,46 +1,73 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from models.database import Transaction as DBTransaction
+from services.reason_index import ReasonIndex
 
 
 class AnalyticsService:
     @staticmethod
-    def get_dashboard_metrics(db: Session, days: int) -> Dict:
-        start_date = datetime.utcnow() - timedelta(days=days)
-
-        total = db.query(func.count(DBTransaction.id)).filter(
-            DBTransaction.created_at >= start_date
-        ).scalar() or 0
+    def get_period_aggregates(db: Session, start_date: datetime, until_id: Optional[int] = None) -> Dict:
+        """Счётчики периода одним запросом с группировкой по (risk_level, is_fraud):
+        всего, мошеннических, средняя сумма мошеннических, распределение по уровням риска
+        """
+        query = db.query(
+            DBTransaction.risk_level,
+            DBTransaction.is_fraud,
+            func.count(DBTransaction.id),
+            func.sum(DBTransaction.amount)
+        ).filter(DBTransaction.created_at >= start_date)
+        if until_id is not None:
+            query = query.filter(DBTransaction.id <= until_id)
+
+        total = 0
+        fraud_count = 0
+        fraud_amount = 0.0
+        risk_distribution: Dict[str, int] = {}
+        for risk_level, is_fraud, count, amount in query.group_by(DBTransaction.risk_level, DBTransaction.is_fraud):
+            total += count
+            if is_fraud:
+                fraud_count += count
+                fraud_amount += amount or 0.0
+            if risk_level:
+                risk_distribution[risk_level] = risk_distribution.get(risk_level, 0) + count
 
-        fraud_count = db.query(func.count(DBTransaction.id)).filter(
-            DBTransaction.created_at >= start_date,
-            DBTransaction.is_fraud == True
-        ).scalar() or 0
+        return {
+            "total_transactions": total,
+            "fraud_detected": fraud_count,
+            "fraud_rate": (fraud_count / total) if total else 0,
+            "avg_fraud_amount": (fraud_amount / fraud_count) if fraud_count else 0,
+            "risk_distribution": risk_distribution,
+        }
 
-        avg_fraud_amount = db.query(func.avg(DBTransaction.amount)).filter(
-            DBTransaction.created_at >= start_date,
-            DBTransaction.is_fraud == True
-        ).scalar() or 0
+    @staticmethod
+    def get_dashboard_metrics(db: Session, days: int) -> Dict:
+        period_end = datetime.utcnow()
+        start_date = period_end - timedelta(days=days)
+        aggregates = AnalyticsService.get_period_aggregates(db, start_date)
 
         patterns = AnalyticsService.get_top_risk_patterns(db, 5)
 
         return {
-            "total_transactions": total,
-            "fraud_detected": fraud_count,
-            "fraud_rate": (fraud_count / total) if total else 0,
-            "avg_fraud_amount": float(avg_fraud_amount),
+            "total_transactions": aggregates["total_transactions"],
+            "fraud_detected": aggregates["fraud_detected"],
+            "fraud_rate": aggregates["fraud_rate"],
+            "avg_fraud_amount": aggregates["avg_fraud_amount"],
             "period_days": days,
+            "period_start": start_date.isoformat(),
+            "period_end": period_end.isoformat(),
+            "reason_counts": ReasonIndex.get_reason_counts(db, start_date),
             "top_risk_patterns": patterns
         }
 
     @staticmethod
-    def get_top_risk_patterns(db: Session, limit: int) -> List[Dict]:
-        fraud_transactions = db.query(DBTransaction).filter(
-            DBTransaction.is_fraud == True
-        ).limit(100).all()
+    def get_top_risk_patterns(db: Session, limit: int, until_id: Optional[int] = None) -> List[Dict]:
+        query = db.query(DBTransaction).filter(DBTransaction.is_fraud == True)
+        if until_id is not None:
+            query = query.filter(DBTransaction.id <= until_id)
+        fraud_transactions = query.limit(100).all()
 
         if not fraud_transactions:
             return []
@@ -0,0 +1,296 @@
+import uuid
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from core.config import settings
+from core.request_profiler import RequestProfiler
+from ml.model_loader import ModelLoader
+from ml.predictor import FraudPredictor
+from services.feature_store import FeatureStore
+from services.fraud_service import FraudService
+from services.overload import CHEAP, RULES_ONLY, ScoringTicket
+from services.profile_cache import ClientProfileCache, PROFILE_FEATURES
+from services.rules_engine import RulesEngine
+from services.velocity_index import VELOCITY_FEATURE_NAMES, VelocityIndex
+
+ID_COLUMNS = ("client_id", "destination_id")
+
+
+class ColumnarBatch:
+    """Пачка по колонкам: признак -> float64-массив, идентификатор -> object-массив"""
+
+    __slots__ = ("rows", "features", "ids")
+
+    def __init__(self, rows: int, features: Dict[str, np.ndarray], ids: Dict[str, np.ndarray]):
+        self.rows = rows
+        self.features = features
+        self.ids = ids
+
+
+class ColumnarScoring:
+    """Скоринг пачки, переданной массивами по признакам.
+
+    Проверка, дополнение профилей, модель и правила работают с колонками целиком —
+    без pydantic-объекта и словаря на строку.
+    """
+
+    @staticmethod
+    def allowed_features() -> List[str]:
+        trained = list(getattr(ModelLoader.imputer, "feature_names_in_", []))
+        return list(dict.fromkeys(FraudPredictor.FEATURE_NAMES + VELOCITY_FEATURE_NAMES + trained))
+
+    @staticmethod
+    def _float_column(name: str, values, rows: int) -> np.ndarray:
+        if not isinstance(values, list):
+            raise HTTPException(status_code=422, detail=f"{name}: ожидается массив")
+        if len(values) != rows:
+            raise HTTPException(status_code=422, detail=f"{name}: {len(values)} значений вместо {rows}")
+
+        try:
+            column = np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            # Медленный путь только для ответа об ошибке: какие строки не числа
+            import pandas as pd
+
+            parsed = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+            bad = np.flatnonzero(parsed.isna().to_numpy() & pd.notna(pd.Series(values, dtype=object)).to_numpy())
+            raise HTTPException(status_code=422, detail=f"{name}: не числа в строках {bad[:10].tolist()}")
+
+        if column.ndim != 1:
+            raise HTTPException(status_code=422, detail=f"{name}: ожидается плоский массив")
+        if np.isinf(column).any():
+            raise HTTPException(status_code=422, detail=f"{name}: бесконечные значения в строках "
+                                                        f"{np.flatnonzero(np.isinf(column))[:10].tolist()}")
+        return column
+
+    @classmethod
+    def parse(cls, payload) -> ColumnarBatch:
+        if not isinstance(payload, dict) or "amount" not in payload:
+            raise HTTPException(status_code=422, detail="Ожидается объект массивов по признакам с обязательным amount")
+
+        allowed = cls.allowed_features()
+        unknown = sorted(set(payload) - set(allowed) - set(ID_COLUMNS))
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Неизвестные колонки: {', '.join(unknown)}")
+
+        amount = payload["amount"]
+        rows = len(amount) if isinstance(amount, list) else 0
+        if rows == 0:
+            raise HTTPException(status_code=422, detail="amount: ожидается непустой массив")
+        if rows > settings.COLUMNAR_BATCH_MAX_ROWS:
+            raise HTTPException(status_code=400, detail=f"Максимум {settings.COLUMNAR_BATCH_MAX_ROWS} транзакций за раз")
+
+        features = {
+            name: cls._float_column(name, payload[name], rows)
+            for name in allowed if name in payload
+        }
+
+        invalid = np.flatnonzero(~(features["amount"] >= 0))
+        if len(invalid):
+            raise HTTPException(status_code=422, detail=f"amount: пропуски или отрицательные суммы в строках "
+                                                        f"{invalid[:10].tolist()}")
+
+        ids = {}
+        for name in ID_COLUMNS:
+            if name in payload:
+                values = payload[name]
+                if not isinstance(values, list) or len(values) != rows:
+                    raise HTTPException(status_code=422, detail=f"{name}: ожидается массив из {rows} значений")
+                ids[name] = np.array(values, dtype=object)
+
+        return ColumnarBatch(rows, features, ids)
+
+    @classmethod
+    def from_records(cls, records: List) -> Tuple[ColumnarBatch, np.ndarray, Dict[int, str]]:
+        """Строки (например, из NDJSON) в колонки: (пачка, номера принятых строк, ошибки по номеру)
+
+        В отличие от parse, ошибка в строке исключает только эту строку.
+        """
+        allowed = set(cls.allowed_features()) | set(ID_COLUMNS)
+        errors: Dict[int, str] = {}
+        present = {"amount"}
+        for index, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors[index] = "Ожидается объект"
+            elif not allowed.issuperset(record):
+                errors[index] = f"Неизвестные поля: {', '.join(sorted(set(record) - allowed))}"
+            else:
+                present.update(record)
+
+        features = {}
+        for name in cls.allowed_features():
+            if name not in present:
+                continue
+            values = [record.get(name) if index not in errors else None for index, record in enumerate(records)]
+            try:
+                features[name] = np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                column = np.full(len(records), np.nan)
+                for index, value in enumerate(values):
+                    try:
+                        column[index] = np.nan if value is None else float(value)
+                    except (TypeError, ValueError):
+                        errors.setdefault(index, f"{name}: не число")
+                features[name] = column
+
+        for index in np.flatnonzero(~(features["amount"] >= 0) | np.isinf(features["amount"])):
+            errors.setdefault(int(index), "amount: пропуск или отрицательная сумма")
+
+        accepted = np.array([index for index in range(len(records)) if index not in errors], dtype=np.int64)
+        ids = {
+            name: np.array([records[index].get(name) for index in accepted], dtype=object)
+            for name in ID_COLUMNS if name in present
+        }
+        features = {name: column[accepted] for name, column in features.items()}
+        return ColumnarBatch(len(accepted), features, ids), accepted, errors
+
+    @staticmethod
+    def resolve_profiles(batch: ColumnarBatch) -> int:
+        """Пропущенные поведенческие признаки по client_id: хранилище признаков, затем кэш профилей.
+
+        Возвращает число строк, у которых пропуски остались (их заполнит импьютер).
+        """
+        rows = batch.rows
+        for name in PROFILE_FEATURES:
+            if name not in batch.features:
+                batch.features[name] = np.full(rows, np.nan)
+
+        profile = np.column_stack([batch.features[name] for name in PROFILE_FEATURES])
+        incomplete = np.isnan(profile).any(axis=1)
+        client_ids = batch.ids.get("client_id")
+        if client_ids is None or not incomplete.any():
+            return int(incomplete.sum())
+
+        present = np.array([client_id is not None and client_id == client_id for client_id in client_ids], dtype=bool)
+        rows_to_fill = np.flatnonzero(incomplete & present)
+        found_values = np.full((len(rows_to_fill), len(PROFILE_FEATURES)), np.nan)
+        found = np.zeros(len(rows_to_fill), dtype=bool)
+
+        # Хранилище признаков обычно небольшое: поштучно только клиенты, которые в нём есть
+        if FeatureStore.clients:
+            for position, client_id in enumerate(client_ids[rows_to_fill]):
+                if str(client_id) in FeatureStore.clients:
+                    stored = FeatureStore.get_features(client_id)
+                    if stored is not None:
+                        found_values[position] = [stored[name] for name in PROFILE_FEATURES]
+                        found[position] = True
+
+        rest = np.flatnonzero(~found)
+        if len(rest):
+            cached, hit = ClientProfileCache.get_many(client_ids[rows_to_fill[rest]])
+            found_values[rest[hit]] = cached[hit]
+            found[rest[hit]] = True
+
+        fill_rows = rows_to_fill[found]
+        current = profile[fill_rows]
+        profile[fill_rows] = np.where(np.isnan(current), found_values[found], current)
+        for index, name in enumerate(PROFILE_FEATURES):
+            batch.features[name] = profile[:, index]
+
+        return int(np.isnan(profile).any(axis=1).sum())
+
+    @staticmethod
+    def resolve_velocity(batch: ColumnarBatch, observe: bool):
+        """Скорости клиента и получателя по строкам, как в /predict и /batch: переданные значения заменяются.
+
+        observe — учесть строки в VelocityIndex; только для сохраняемых в БД транзакций.
+        """
+        none = np.full(batch.rows, None, dtype=object)
+        velocity = VelocityIndex.resolve_many(
+            batch.ids.get("client_id", none), batch.ids.get("destination_id", none),
+            batch.features["amount"], observe
+        )
+        for index, name in enumerate(VELOCITY_FEATURE_NAMES):
+            batch.features[name] = velocity[:, index]
+
+    @classmethod
+    def score(cls, batch: ColumnarBatch, ticket: ScoringTicket) -> Tuple[np.ndarray, np.ndarray, str]:
+        """(вероятности, маски причин, версия модели) в режиме, выбранном OverloadGuard"""
+        if ticket.mode == RULES_ONLY:
+            masks = RulesEngine.evaluate(batch.features, np.zeros(batch.rows))
+            return FraudService.rules_only_probabilities(masks), masks, "rules"
+
+        predictor = FraudPredictor(
+            threshold=settings.DEFAULT_FRAUD_THRESHOLD,
+            model_name=settings.OVERLOAD_CHEAP_MODEL if ticket.mode == CHEAP else None
+        )
+        missing = np.full(batch.rows, np.nan)
+        x = np.column_stack([batch.features.get(name, missing) for name in predictor.feature_names])
+
+        probas = predictor.predict_proba(x)
+        with RequestProfiler.stage("reasons"):
+            masks = RulesEngine.evaluate(batch.features, probas)
+        return probas, masks, predictor.model_version
+
+    @classmethod
+    def run(cls, payload, ticket: ScoringTicket, persist: bool) -> Tuple[Dict, List[Dict]]:
+        """Ответ массивами и, при persist, записи для save_transactions_bulk"""
+        with RequestProfiler.stage("parse"):
+            batch = cls.parse(payload)
+        with RequestProfiler.stage("profiles"):
+            unresolved = cls.resolve_profiles(batch)
+        with RequestProfiler.stage("velocity"):
+            cls.resolve_velocity(batch, observe=persist)
+        with RequestProfiler.stage("score"):
+            probas, masks, model_version = cls.score(batch, ticket)
+
+        is_fraud = probas >= settings.DEFAULT_FRAUD_THRESHOLD
+        risk_levels = FraudService.determine_risk_levels(probas)
+        fraud_count = int(is_fraud.sum())
+
+        response = {
+            "total_transactions": batch.rows,
+            "fraud_detected": fraud_count,
+            "fraud_rate": fraud_count / batch.rows,
+            "unresolved_rows": unresolved,
+            "model_version": model_version,
+            "scoring_mode": ticket.mode,
+            "processed_at": datetime.utcnow().isoformat(),
+            "reason_codes": {rule.code: rule.bit for rule in RulesEngine.get_rules()},
+            "fraud_probability": np.ascontiguousarray(probas),
+            "is_fraud": is_fraud,
+            "risk_level": risk_levels.tolist(),
+            "reason_mask": masks,
+        }
+
+        records = []
+        if persist:
+            with RequestProfiler.stage("records"):
+                records = cls.build_records(batch, probas, is_fraud, risk_levels, masks, model_version)
+            response["transaction_id"] = [record["transaction_id"] for record in records]
+
+        return response, records
+
+    @staticmethod
+    def build_records(batch: ColumnarBatch, probas: np.ndarray, is_fraud: np.ndarray,
+                      risk_levels: np.ndarray, masks: np.ndarray, model_version: str) -> List[Dict]:
+        # Все переданные признаки нужны шаблонам причин, в БД — только FEATURE_NAMES
+        # NaN -> None построчно: в БД и шаблоны причин попадает отсутствие значения
+        names = list(batch.features)
+        columns = [
+            [None if value != value else value for value in batch.features[name].tolist()]
+            for name in names
+        ]
+        feature_records = [dict(zip(names, values)) for values in zip(*columns)]
+        client_ids = batch.ids.get("client_id", [None] * batch.rows)
+        destination_ids = batch.ids.get("destination_id", [None] * batch.rows)
+
+        records = []
+        for row, features in enumerate(feature_records):
+            mask = int(masks[row])
+            records.append({
+                **{name: features.get(name) for name in FraudPredictor.FEATURE_NAMES},
+                "transaction_id": str(uuid.uuid4()),
+                "client_id": None if client_ids[row] is None else str(client_ids[row]),
+                "destination_id": None if destination_ids[row] is None else str(destination_ids[row]),
+                "fraud_probability": float(probas[row]),
+                "is_fraud": bool(is_fraud[row]),
+                "risk_level": risk_levels[row],
+                "reasons": RulesEngine.render(mask, features, float(probas[row])) if mask else [],
+                "reason_mask": mask,
+                "model_version": model_version,
+            })
+        return records
@@ -0,0 +1,207 @@
+import asyncio
+import socket
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from api.responses import dumps
+from core.config import settings
+
+# Виды событий онлайн-ленты
+TRANSACTIONS = "transactions"
+ALERTS = "alerts"
+# Очередь подписчика переполнилась и сброшена: клиент перечитывает состояние через REST
+RESYNC = "resync"
+
+# Как часто воркер перечитывает список воркеров с подписчиками
+PEERS_REFRESH_SECONDS = 1.0
+
+_CLOSE = object()
+
+
+class Subscriber:
+
+    __slots__ = ("queue", "dropped", "connected_at")
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.dropped = 0
+        self.connected_at = datetime.utcnow()
+
+
+class EventBus:
+    """Шина событий для онлайн-ленты /api/v1/events/stream (Server-Sent Events).
+
+    publish вызывается из любого потока (фоновая запись в БД), событие кодируется в кадр
+    SSE один раз и раскладывается по ограниченным очередям подписчиков в цикле событий.
+    Переполненная очередь медленного клиента сбрасывается, вместо неё приходит resync.
+    Под serve.py воркер, у которого есть подписчики, слушает датаграммный сокет в каталоге
+    снимков воркеров, и остальные воркеры пересылают туда свои события. Без подписчиков
+    publish сводится к проверке списка, а открытая лента без событий — к пингу раз в
+    EVENTS_HEARTBEAT_SECONDS.
+    """
+
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    subscribers: List[Subscriber] = []
+    closing = False
+
+    relay_socket: Optional[socket.socket] = None
+    sender: Optional[socket.socket] = None
+    peers: List[str] = []
+    peers_checked = 0.0
+
+    stats = {"published": 0, "delivered": 0, "relayed": 0, "relay_dropped": 0, "dropped": 0, "resyncs": 0}
+
+    @staticmethod
+    def frame(kind: str, data) -> bytes:
+        return b"event: " + kind.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+    @classmethod
+    def _peers(cls) -> List[str]:
+        """Сокеты других воркеров, у которых сейчас есть подписчики"""
+        from services.worker_stats import WorkerStats
+
+        if WorkerStats.stats_dir is None:
+            return []
+        now = time.monotonic()
+        if now - cls.peers_checked >= PEERS_REFRESH_SECONDS:
+            own = f"events-{WorkerStats.index}.sock"
+            cls.peers = [str(path) for path in WorkerStats.stats_dir.glob("events-*.sock") if path.name != own]
+            cls.peers_checked = now
+        return cls.peers
+
+    @classmethod
+    def has_subscribers(cls) -> bool:
+        return bool(cls.subscribers) or bool(cls._peers())
+
+    @classmethod
+    def publish(cls, kind: str, data):
+        """Из любого потока; данные события собирать после проверки has_subscribers"""
+        local = bool(cls.subscribers)
+        peers = cls._peers()
+        if not local and not peers:
+            return
+
+        frame = cls.frame(kind, data)
+        cls.stats["published"] += 1
+        if local and cls.loop is not None:
+            try:
+                cls.loop.call_soon_threadsafe(cls._deliver, frame)
+            except RuntimeError:
+                # Цикл событий уже закрыт — процесс завершается
+                pass
+        if peers:
+            cls._relay(frame, peers)
+
+    @classmethod
+    def _relay(cls, frame: bytes, peers: List[str]):
+        if cls.sender is None:
+            cls.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            cls.sender.setblocking(False)
+        for path in peers:
+            try:
+                cls.sender.sendto(frame, path)
+                cls.stats["relayed"] += 1
+            except BlockingIOError:
+                # Воркер-получатель не успевает читать — событие теряется, как при переполнении очереди
+                cls.stats["relay_dropped"] += 1
+            except OSError:
+                # Подписчики у воркера закончились или он перезапущен — список обновится
+                cls.peers_checked = 0.0
+
+    @classmethod
+    def _receive(cls):
+        """Датаграммы от других воркеров; вызывается циклом событий, когда сокет готов к чтению"""
+        while cls.relay_socket is not None:
+            try:
+                frame = cls.relay_socket.recv(settings.EVENTS_MAX_FRAME_BYTES)
+            except BlockingIOError:
+                return
+            except OSError:
+                return
+            cls._deliver(frame)
+
+    @classmethod
+    def _deliver(cls, frame):
+        for subscriber in cls.subscribers:
+            try:
+                subscriber.queue.put_nowait(frame)
+                cls.stats["delivered"] += 1
+            except asyncio.QueueFull:
+                dropped = subscriber.queue.qsize()
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.dropped += dropped + 1
+                cls.stats["dropped"] += dropped + 1
+                cls.stats["resyncs"] += 1
+                subscriber.queue.put_nowait(cls.frame(RESYNC, {"dropped": dropped + 1}))
+
+    @classmethod
+    def subscribe(cls) -> Subscriber:
+        """Вызывается в цикле событий"""
+        from services.worker_stats import WorkerStats
+
+        cls.loop = asyncio.get_running_loop()
+        subscriber = Subscriber()
+        cls.subscribers.append(subscriber)
+
+        if cls.relay_socket is None and WorkerStats.stats_dir is not None:
+            path = WorkerStats.stats_dir / f"events-{WorkerStats.index}.sock"
+            path.unlink(missing_ok=True)
+            relay_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            relay_socket.bind(str(path))
+            relay_socket.setblocking(False)
+            cls.relay_socket = relay_socket
+            cls.loop.add_reader(relay_socket.fileno(), cls._receive)
+        return subscriber
+
+    @classmethod
+    def unsubscribe(cls, subscriber: Subscriber):
+        from services.worker_stats import WorkerStats
+
+        if subscriber in cls.subscribers:
+            cls.subscribers.remove(subscriber)
+
+        if not cls.subscribers and cls.relay_socket is not None:
+            # Сокет есть, только пока есть подписчики: другие воркеры по нему решают, пересылать ли события
+            cls.loop.remove_reader(cls.relay_socket.fileno())
+            cls.relay_socket.close()
+            cls.relay_socket = None
+            (WorkerStats.stats_dir / f"events-{WorkerStats.index}.sock").unlink(missing_ok=True)
+
+    @classmethod
+    async def stream(cls, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """Кадры SSE подписчика; комментарий-пинг держит соединение через прокси"""
+        try:
+            yield f"retry: {settings.EVENTS_RETRY_MS}\n\n".encode()
+            while not cls.closing:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if frame is _CLOSE:
+                    return
+                yield frame
+        finally:
+            cls.unsubscribe(subscriber)
+
+    @classmethod
+    def close(cls):
+        """Завершить открытые ленты: сервер при остановке ждёт завершения ответов, а лента
+        бесконечна. Вызывается в цикле событий по сигналу остановки (serve.py).
+        """
+        cls.closing = True
+        for subscriber in cls.subscribers:
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(_CLOSE)
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return {
+            "subscribers": len(cls.subscribers),
+            "queued": [subscriber.queue.qsize() for subscriber in cls.subscribers],
+            "peers_with_subscribers": len(cls._peers()),
+            **cls.stats,
+        }
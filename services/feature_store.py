@@ -0,0 +1,315 @@
+import math
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from core.config import settings
+
+
+DAY = 86400.0
+WINDOW_7D = 7 * DAY
+WINDOW_30D = 30 * DAY
+# Коэффициент затухания ewm_interval_7d из описания patterns.csv
+EWM_ALPHA = 0.3
+
+
+def _timestamp(value: datetime) -> float:
+    return value.timestamp() if value.tzinfo else (value - datetime(1970, 1, 1)).total_seconds()
+
+
+class SlidingStats:
+    """Среднее и дисперсия по скользящему окну: Welford с удалением старых значений"""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x: float):
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        self.n -= 1
+        delta = x - self.mean
+        self.mean -= delta / self.n
+        self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else math.nan
+
+
+class SlidingEWM:
+    """EWM (adjust=True) по скользящему окну: S = Σ(1-α)^k·x, W = Σ(1-α)^k, удаление старейшего за O(1)"""
+
+    __slots__ = ("s", "w", "n")
+
+    def __init__(self):
+        self.s = 0.0
+        self.w = 0.0
+        self.n = 0
+
+    def add(self, x: float):
+        self.s = (1 - EWM_ALPHA) * self.s + x
+        self.w = (1 - EWM_ALPHA) * self.w + 1.0
+        self.n += 1
+
+    def remove_oldest(self, x: float):
+        if self.n <= 1:
+            self.s, self.w, self.n = 0.0, 0.0, 0
+            return
+        weight = (1 - EWM_ALPHA) ** (self.n - 1)
+        self.s -= weight * x
+        self.w -= weight
+        self.n -= 1
+
+    @property
+    def value(self) -> float:
+        return self.s / self.w if self.n else math.nan
+
+
+class ClientFeatureState:
+    """Окна сессий одного клиента; каждое событие обновляет состояние за амортизированное O(1)"""
+
+    __slots__ = (
+        "sessions_7d", "sessions_30d", "last_slot", "last_session",
+        "intervals_7d", "intervals_30d", "stats_7d", "stats_30d", "ewm_7d",
+        "os_events", "os_counts", "phone_events", "phone_counts", "updated_at", "expired_until",
+    )
+
+    def __init__(self):
+        self.sessions_7d = deque()
+        self.sessions_30d = deque()
+        self.last_slot = None
+        self.last_session = None
+        # (время сессии, интервал до предыдущей сессии)
+        self.intervals_7d = deque()
+        self.intervals_30d = deque()
+        self.stats_7d = SlidingStats()
+        self.stats_30d = SlidingStats()
+        self.ewm_7d = SlidingEWM()
+        # (время, значение) + счётчики значений в окне 30 дней для distinct
+        self.os_events = deque()
+        self.os_counts: Dict[str, int] = {}
+        self.phone_events = deque()
+        self.phone_counts: Dict[str, int] = {}
+        self.updated_at = 0.0
+        # Время самого позднего выброшенного из окна 30 дней события: раньше него истории нет
+        self.expired_until = -math.inf
+
+    def add_session(self, ts: float, os_ver: Optional[str], phone_model: Optional[str]) -> bool:
+        if self.last_session is not None and ts < self.last_session:
+            return False
+
+        self.expire(ts)
+
+        # Сессия — уникальный минутный слот, повторные события в ту же минуту не считаются
+        slot = int(ts // 60)
+        if slot != self.last_slot:
+            if self.last_session is not None:
+                interval = ts - self.last_session
+                self.intervals_7d.append((ts, interval))
+                self.intervals_30d.append((ts, interval))
+                self.stats_7d.add(interval)
+                self.stats_30d.add(interval)
+                self.ewm_7d.add(interval)
+
+            self.sessions_7d.append(ts)
+            self.sessions_30d.append(ts)
+            self.last_slot = slot
+            self.last_session = ts
+
+            if os_ver:
+                self._track(self.os_events, self.os_counts, ts, os_ver)
+            if phone_model:
+                self._track(self.phone_events, self.phone_counts, ts, phone_model)
+
+        return True
+
+    @staticmethod
+    def _track(events: deque, counts: Dict[str, int], ts: float, value: str):
+        events.append((ts, value))
+        counts[value] = counts.get(value, 0) + 1
+
+    def _expire_values(self, events: deque, counts: Dict[str, int], cutoff: float):
+        while events and events[0][0] < cutoff:
+            ts, value = events.popleft()
+            self.expired_until = max(self.expired_until, ts)
+            counts[value] -= 1
+            if counts[value] == 0:
+                del counts[value]
+
+    def expire(self, now: float):
+        self.updated_at = max(self.updated_at, now)
+
+        cutoff_7d = now - WINDOW_7D
+        cutoff_30d = now - WINDOW_30D
+
+        while self.sessions_7d and self.sessions_7d[0] < cutoff_7d:
+            self.sessions_7d.popleft()
+        while self.sessions_30d and self.sessions_30d[0] < cutoff_30d:
+            self.expired_until = max(self.expired_until, self.sessions_30d.popleft())
+
+        while self.intervals_7d and self.intervals_7d[0][0] < cutoff_7d:
+            _, interval = self.intervals_7d.popleft()
+            self.stats_7d.remove(interval)
+            self.ewm_7d.remove_oldest(interval)
+        while self.intervals_30d and self.intervals_30d[0][0] < cutoff_30d:
+            ts, interval = self.intervals_30d.popleft()
+            self.expired_until = max(self.expired_until, ts)
+            self.stats_30d.remove(interval)
+
+        self._expire_values(self.os_events, self.os_counts, cutoff_30d)
+        self._expire_values(self.phone_events, self.phone_counts, cutoff_30d)
+
+    def _is_current(self, now: float) -> bool:
+        """Окна уже совпадают с окнами на момент now: нет событий позже now и нечего выбрасывать"""
+        cutoff_7d = now - WINDOW_7D
+        cutoff_30d = now - WINDOW_30D
+        return (
+            (self.last_session is None or self.last_session <= now)
+            and not (self.sessions_7d and self.sessions_7d[0] < cutoff_7d)
+            and not (self.sessions_30d and self.sessions_30d[0] < cutoff_30d)
+            and not (self.intervals_7d and self.intervals_7d[0][0] < cutoff_7d)
+            and not (self.intervals_30d and self.intervals_30d[0][0] < cutoff_30d)
+            and not (self.os_events and self.os_events[0][0] < cutoff_30d)
+            and not (self.phone_events and self.phone_events[0][0] < cutoff_30d)
+        )
+
+    def as_of(self, now: float) -> "ClientFeatureState":
+        """Состояние на момент now без изменения текущего: при необходимости — копия из событий окна 30 дней
+        не позже now, с выброшенными по окнам now старыми событиями
+        """
+        if self._is_current(now):
+            return self
+
+        state = ClientFeatureState()
+        for ts in self.sessions_30d:
+            if ts > now:
+                break
+            state.sessions_7d.append(ts)
+            state.sessions_30d.append(ts)
+            state.last_session = ts
+        for ts, interval in self.intervals_30d:
+            if ts > now:
+                break
+            state.intervals_7d.append((ts, interval))
+            state.intervals_30d.append((ts, interval))
+            state.stats_7d.add(interval)
+            state.stats_30d.add(interval)
+            state.ewm_7d.add(interval)
+        for events, counts, target, target_counts in (
+                (self.os_events, self.os_counts, state.os_events, state.os_counts),
+                (self.phone_events, self.phone_counts, state.phone_events, state.phone_counts),
+        ):
+            for ts, value in events:
+                if ts > now:
+                    break
+                state._track(target, target_counts, ts, value)
+
+        state.expire(now)
+        return state
+
+    def features(self) -> Dict[str, float]:
+        logins_7d = len(self.sessions_7d)
+        logins_30d = len(self.sessions_30d)
+        per_day_7 = logins_7d / 7
+        per_day_30 = logins_30d / 30
+
+        mean_30d = self.stats_30d.mean if self.stats_30d.n else math.nan
+        var_30d = self.stats_30d.variance
+        std_30d = math.sqrt(var_30d) if not math.isnan(var_30d) else math.nan
+        mean_7d = self.stats_7d.mean if self.stats_7d.n else math.nan
+
+        def ratio(a: float, b: float) -> float:
+            return a / b if b and not math.isnan(a) and not math.isnan(b) else math.nan
+
+        # Неопределённые значения остаются NaN и заполняются импьютером, как при обучении
+        return {
+            "os_ver_count_30d": float(len(self.os_counts)),
+            "phone_model_count_30d": float(len(self.phone_counts)),
+            "logins_7d": float(logins_7d),
+            "logins_30d": float(logins_30d),
+            "logins_per_day_7": per_day_7,
+            "logins_per_day_30": per_day_30,
+            "rel_change_7_vs_30": ratio(per_day_7 - per_day_30, per_day_30),
+            "share_7_of_30": ratio(logins_7d, logins_30d),
+            "mean_interval_30d": mean_30d,
+            "std_interval_30d": std_30d,
+            "var_interval_30d": var_30d,
+            "ewm_interval_7d": self.ewm_7d.value,
+            "burstiness": ratio(std_30d - mean_30d, std_30d + mean_30d),
+            "fano_factor": ratio(var_30d, mean_30d),
+            "z_score_7d_vs_30d": ratio(mean_7d - mean_30d, std_30d),
+        }
+
+
+class FeatureStore:
+
+    clients: "OrderedDict[str, ClientFeatureState]" = OrderedDict()
+    lock = threading.Lock()
+    stats = {"events_ingested": 0, "events_late": 0, "clients_evicted": 0}
+
+    @classmethod
+    def ingest(cls, events: List[Dict]) -> Dict:
+        """События: client_id, timestamp, os_ver, phone_model. Ожидаются примерно по возрастанию времени"""
+        accepted = 0
+        with cls.lock:
+            for event in sorted(events, key=lambda e: _timestamp(e["timestamp"])):
+                client_id = str(event["client_id"])
+                state = cls.clients.get(client_id)
+                if state is None:
+                    state = cls.clients[client_id] = ClientFeatureState()
+                    cls._evict()
+                else:
+                    cls.clients.move_to_end(client_id)
+
+                if state.add_session(_timestamp(event["timestamp"]), event.get("os_ver"), event.get("phone_model")):
+                    accepted += 1
+
+            cls.stats["events_ingested"] += accepted
+            cls.stats["events_late"] += len(events) - accepted
+
+        return {"accepted": accepted, "rejected_late": len(events) - accepted}
+
+    @classmethod
+    def _evict(cls):
+        while len(cls.clients) > settings.FEATURE_STORE_MAX_CLIENTS:
+            cls.clients.popitem(last=False)
+            cls.stats["clients_evicted"] += 1
+
+    @classmethod
+    def get_features(cls, client_id: str, at: Optional[datetime] = None) -> Optional[Dict[str, float]]:
+        """Вектор FraudPredictor.FEATURE_NAMES без amount на момент at (по умолчанию сейчас).
+        Чтение не меняет окна клиента. ValueError, если явный at в будущем или его окно 30 дней
+        захватывает уже выброшенную историю
+        """
+        now = _timestamp(datetime.utcnow())
+        moment = now if at is None else _timestamp(at)
+        if moment > now:
+            raise ValueError("Момент расчёта в будущем")
+
+        with cls.lock:
+            state = cls.clients.get(str(client_id))
+            if state is None:
+                return None
+            if at is not None and moment - WINDOW_30D <= state.expired_until:
+                raise ValueError("События окна 30 дней на этот момент уже выброшены из хранилища")
+            return state.as_of(moment).features()
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return {
+            "clients": len(cls.clients),
+            "max_clients": settings.FEATURE_STORE_MAX_CLIENTS,
+            **cls.stats,
+        }
@@ -1,63 +1,114 @@
+import numpy as np
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import Dict, List
+from typing import Dict, List, Sequence, Tuple
 from datetime import datetime
 
+from core.config import settings
+from core.request_profiler import RequestProfiler
 from models.database import Transaction as DBTransaction, AlertLog
 from api.schemas import TransactionPredictRequest, TransactionPredictResponse, RiskLevel
+from ml.predictor import FraudPredictor
+from services.event_bus import ALERTS, TRANSACTIONS, EventBus
+from services.feature_store import FeatureStore
+from services.profile_cache import ClientProfileCache, PROFILE_FEATURES
+from services.reason_index import ReasonIndex
+from services.rules_engine import RulesEngine
+
+
+# Нижние границы вероятности для уровней риска, от высшего к низшему
+RISK_THRESHOLDS = [
+    (0.9, RiskLevel.CRITICAL),
+    (0.7, RiskLevel.HIGH),
+    (0.4, RiskLevel.MEDIUM),
+]
+
+SEVERITY_MAP = {
+    RiskLevel.LOW: "low",
+    RiskLevel.MEDIUM: "medium",
+    RiskLevel.HIGH: "high",
+    RiskLevel.CRITICAL: "critical"
+}
 
 
 class FraudService:
 
     @staticmethod
     def determine_risk_level(fraud_probability: float) -> RiskLevel:
-        if fraud_probability >= 0.9:
-            return RiskLevel.CRITICAL
-        elif fraud_probability >= 0.7:
-            return RiskLevel.HIGH
-        elif fraud_probability >= 0.4:
-            return RiskLevel.MEDIUM
-        else:
-            return RiskLevel.LOW
+        for threshold, level in RISK_THRESHOLDS:
+            if fraud_probability >= threshold:
+                return level
+        return RiskLevel.LOW
 
     @staticmethod
-    def generate_fraud_reasons(features: Dict, probability: float) -> List[str]:
-        reasons = []
+    def determine_risk_levels(probabilities: np.ndarray) -> np.ndarray:
+        return np.select(
+            [probabilities >= threshold for threshold, _ in RISK_THRESHOLDS],
+            [level.value for _, level in RISK_THRESHOLDS],
+            default=RiskLevel.LOW.value
+        )
 
-        if features.get('amount', 0) > 1000000:
-            reasons.append(f"Крупная сумма транзакции ({features['amount']:.0f} тг)")
-        elif features.get('amount', 0) > 500000:
-            reasons.append(f"Повышенная сумма транзакции ({features['amount']:.0f} тг)")
-
-        if features.get('phone_model_count_30d', 0) >= 5:
-            reasons.append(f"Множество устройств за 30 дней ({features['phone_model_count_30d']:.0f})")
+    @staticmethod
+    def resolve_missing_features(features: Dict) -> List[str]:
+        """Дополняет непереданные признаки по client_id: хранилище признаков, затем кэш профилей.
 
-        if features.get('os_ver_count_30d', 0) >= 5:
-            reasons.append(f"Частая смена ОС ({features['os_ver_count_30d']:.0f} версий)")
+        Возвращает признаки, которые так и не нашлись.
+        """
+        missing = [name for name in PROFILE_FEATURES if features.get(name) is None]
+        client_id = features.get("client_id")
+        if not missing or client_id is None:
+            return missing
 
-        if features.get('logins_30d', 0) < 5:
-            reasons.append(f"Низкая активность входов ({features.get('logins_30d', 0):.0f} за 30 дней)")
+        for lookup in (FeatureStore.get_features, ClientProfileCache.get):
+            found = lookup(client_id)
+            if found is not None:
+                features.update({name: found[name] for name in missing})
+                return []
 
-        if features.get('rel_change_7_vs_30', 0) > 3:
-            reasons.append("Резкий всплеск активности за последнюю неделю")
+        return missing
 
-        if features.get('burstiness', 0) > 0.8:
-            reasons.append("Аномальная нестабильность паттерна входов")
+    @staticmethod
+    def generate_fraud_reasons(features: Dict, probability: float) -> Tuple[List[str], int]:
+        """(текст причин, маска причин) для одной транзакции"""
+        with RequestProfiler.stage("reasons"):
+            reasons, masks = RulesEngine.explain([features], [probability])
+        return reasons[0], masks[0]
 
-        if abs(features.get('z_score_7d_vs_30d', 0)) > 3:
-            reasons.append("Сильное отклонение поведения от нормы")
+    @staticmethod
+    def generate_fraud_reasons_batch(features_list: List[Dict],
+                                     probabilities: Sequence[float]) -> Tuple[List[List[str]], List[int]]:
+        """(тексты причин, маски причин) для пачки: правила проверяются разом по всем строкам"""
+        with RequestProfiler.stage("reasons"):
+            return RulesEngine.explain(features_list, probabilities)
 
-        if not reasons and probability > 0.7:
-            reasons.append("Множественные аномалии в паттернах поведения")
+    @staticmethod
+    def predict_rules_only(features_list: List[Dict], threshold: float = 0.5) -> List[Dict]:
+        """Оценка без модели для режима перегрузки: вероятность растёт с числом сработавших правил"""
+        with RequestProfiler.stage("rules_only"):
+            masks = RulesEngine.evaluate_records(features_list, np.zeros(len(features_list)))
+        return [
+            {
+                "fraud_probability": float(probability),
+                "is_fraud": bool(probability >= threshold),
+                "model_version": "rules"
+            }
+            for probability in FraudService.rules_only_probabilities(masks)
+        ]
 
-        return reasons
+    @staticmethod
+    def rules_only_probabilities(masks: np.ndarray) -> np.ndarray:
+        reasons = np.bitwise_count(np.asarray(masks, dtype=np.uint64)).astype(np.float64)
+        return np.minimum(1.0, reasons * settings.OVERLOAD_RULES_PROBABILITY_PER_REASON)
 
     @staticmethod
-    def save_transaction(db: Session, request: TransactionPredictRequest, response: TransactionPredictResponse):
+    def save_transaction(db: Session, request: TransactionPredictRequest, response: TransactionPredictResponse,
+                         reason_mask: int):
         try:
             transaction = DBTransaction(
                 transaction_id=response.transaction_id,
                 client_id=request.client_id,
                 amount=request.amount,
+                destination_id=request.destination_id,
 
                 os_ver_count_30d=request.os_ver_count_30d,
                 phone_model_count_30d=request.phone_model_count_30d,
@@ -79,12 +130,25 @@ class FraudService:
                 is_fraud=response.is_fraud,
                 risk_level=response.risk_level.value,
                 reasons=response.reasons,
+                reason_mask=int(reason_mask),
                 model_version=response.model_version
             )
 
             db.add(transaction)
+            ReasonIndex.insert_reason_rows(db, [
+                {"transaction_id": transaction.transaction_id, "reason_mask": transaction.reason_mask}
+            ])
             db.commit()
             db.refresh(transaction)
+            FraudService.publish_transactions([{
+                "transaction_id": transaction.transaction_id,
+                "client_id": transaction.client_id,
+                "amount": transaction.amount,
+                "fraud_probability": transaction.fraud_probability,
+                "is_fraud": transaction.is_fraud,
+                "risk_level": transaction.risk_level,
+                "model_version": transaction.model_version,
+            }])
 
             if response.is_fraud:
                 FraudService.create_alert(db, transaction, response)
@@ -93,31 +157,141 @@ class FraudService:
             db.rollback()
             print(f"Error saving transaction: {e}")
 
+    @staticmethod
+    def build_transaction_record(features: Dict, response: TransactionPredictResponse, reason_mask: int) -> Dict:
+        """reason_mask — маска, посчитанная RulesEngine вместе с текстом причин"""
+        record = {name: features.get(name) for name in FraudPredictor.FEATURE_NAMES}
+        record.update(
+            transaction_id=response.transaction_id,
+            client_id=features.get("client_id"),
+            destination_id=features.get("destination_id"),
+            fraud_probability=response.fraud_probability,
+            is_fraud=response.is_fraud,
+            risk_level=response.risk_level.value,
+            reasons=response.reasons,
+            reason_mask=int(reason_mask),
+            model_version=response.model_version
+        )
+        return record
+
+    @staticmethod
+    def save_transactions_bulk(db: Session, records: List[Dict]) -> int:
+        """Одна вставка executemany на пачку вместо commit на каждую транзакцию"""
+        if not records:
+            return 0
+
+        try:
+            db.execute(insert(DBTransaction), records)
+            ReasonIndex.insert_reason_rows(db, records)
+
+            alerts = [
+                FraudService._build_alert_record(
+                    record["transaction_id"],
+                    RiskLevel(record["risk_level"]),
+                    record["reasons"] or []
+                )
+                for record in records if record["is_fraud"]
+            ]
+            if alerts:
+                db.execute(insert(AlertLog), alerts)
+
+            db.commit()
+            FraudService.publish_transactions(records)
+            FraudService.publish_alerts(alerts)
+            return len(records)
+        except Exception as e:
+            db.rollback()
+            print(f"Error saving transactions: {e}")
+            return 0
+
     @staticmethod
     def save_batch_transactions(db: Session, transactions: List[TransactionPredictRequest],
-                                results: List[TransactionPredictResponse]):
-        for trans, result in zip(transactions, results):
-            FraudService.save_transaction(db, trans, result)
+                                results: List[TransactionPredictResponse], masks: List[int]):
+        records = [
+            FraudService.build_transaction_record(trans.dict(), result, mask)
+            for trans, result, mask in zip(transactions, results, masks)
+        ]
+        FraudService.save_transactions_bulk(db, records)
+
+    @staticmethod
+    def _build_alert_record(transaction_id: str, risk_level: RiskLevel, reasons: List[str]) -> Dict:
+        return {
+            "transaction_id": transaction_id,
+            "alert_type": "fraud_detected",
+            "severity": SEVERITY_MAP[risk_level],
+            "message": f"Обнаружена подозрительная транзакция: {', '.join(reasons)}"
+        }
 
     @staticmethod
     def create_alert(db: Session, transaction: DBTransaction, response: TransactionPredictResponse):
         try:
-            severity_map = {
-                RiskLevel.LOW: "low",
-                RiskLevel.MEDIUM: "medium",
-                RiskLevel.HIGH: "high",
-                RiskLevel.CRITICAL: "critical"
-            }
-
-            alert = AlertLog(
-                transaction_id=transaction.transaction_id,
-                alert_type="fraud_detected",
-                severity=severity_map[response.risk_level],
-                message=f"Обнаружена подозрительная транзакция: {', '.join(response.reasons)}"
+            record = FraudService._build_alert_record(
+                transaction.transaction_id,
+                response.risk_level,
+                response.reasons
             )
-
-            db.add(alert)
+            db.add(AlertLog(**record))
             db.commit()
+            FraudService.publish_alerts([record])
         except Exception as e:
             db.rollback()
-            print(f"Error creating alert: {e}")
\ No newline at end of file
+            print(f"Error creating alert: {e}")
+
+    @staticmethod
+    def publish_transactions(records: List[Dict]):
+        """Событие онлайн-ленты после commit: последние строки пачки и приращения агрегатов,
+        чтобы клиент обновлял сводку без повторного запроса к БД
+        """
+        if not records or not EventBus.has_subscribers():
+            return
+
+        created_at = datetime.utcnow().isoformat()
+        by_risk: Dict[str, int] = {}
+        fraud_detected = 0
+        fraud_amount = 0.0
+        for record in records:
+            by_risk[record["risk_level"]] = by_risk.get(record["risk_level"], 0) + 1
+            if record["is_fraud"]:
+                fraud_detected += 1
+                fraud_amount += record["amount"] or 0.0
+
+        EventBus.publish(TRANSACTIONS, {
+            "items": [
+                {
+                    "transaction_id": record["transaction_id"],
+                    "client_id": record["client_id"],
+                    "amount": record["amount"],
+                    "fraud_probability": record["fraud_probability"],
+                    "is_fraud": record["is_fraud"],
+                    "risk_level": record["risk_level"],
+                    "model_version": record["model_version"],
+                    "created_at": created_at,
+                }
+                for record in records[-settings.EVENTS_MAX_ITEMS:]
+            ],
+            "delta": {
+                "transactions": len(records),
+                "fraud_detected": fraud_detected,
+                "fraud_amount": round(fraud_amount, 2),
+                "by_risk": by_risk,
+            },
+        })
+
+    @staticmethod
+    def publish_alerts(alerts: List[Dict]):
+        if not alerts or not EventBus.has_subscribers():
+            return
+
+        created_at = datetime.utcnow().isoformat()
+        EventBus.publish(ALERTS, {
+            "items": [
+                {
+                    "transaction_id": alert["transaction_id"],
+                    "severity": alert["severity"],
+                    "message": alert["message"],
+                    "created_at": created_at,
+                }
+                for alert in alerts[-settings.EVENTS_MAX_ITEMS:]
+            ],
+            "count": len(alerts),
+        })
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from api.schemas import JobStatus
+from core.config import settings
+
+
+class BackgroundJob:
+
+    def __init__(self, kind: str, config: Dict, job_id: Optional[str] = None):
+        # job_id передаётся для задач, чьё состояние хранится в БД
+        self.job_id = job_id or str(uuid.uuid4())
+        self.kind = kind
+        self.config = config
+        self.status = JobStatus.PENDING
+        self.progress: Dict = {}
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        # Флаг для кода, работающего в потоках: task.cancel() туда не доходит
+        self.cancel_event = threading.Event()
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (JobStatus.PENDING, JobStatus.RUNNING)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status.value,
+            "config": self.config,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+
+    jobs: Dict[str, BackgroundJob] = {}
+
+    @classmethod
+    def submit(cls, kind: str, config: Dict,
+               runner: Callable[[BackgroundJob], Awaitable[None]],
+               job_id: Optional[str] = None) -> BackgroundJob:
+        job = BackgroundJob(kind, config, job_id)
+        cls.jobs[job.job_id] = job
+        job.task = asyncio.create_task(cls._run(job, runner))
+        cls._prune()
+        return job
+
+    @classmethod
+    async def _run(cls, job: BackgroundJob, runner: Callable[[BackgroundJob], Awaitable[None]]):
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+        try:
+            await runner(job)
+            job.status = JobStatus.CANCELLED if job.cancelled else JobStatus.COMPLETED
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            print(f"Задача {job.kind} {job.job_id} завершилась с ошибкой: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+
+    @classmethod
+    def get(cls, job_id: str) -> Optional[BackgroundJob]:
+        return cls.jobs.get(job_id)
+
+    @classmethod
+    def list(cls, kind: Optional[str] = None) -> List[BackgroundJob]:
+        jobs = [job for job in cls.jobs.values() if kind is None or job.kind == kind]
+        jobs.sort(key=lambda job: job.created_at, reverse=True)
+        return jobs
+
+    @classmethod
+    def count_active(cls, kind: Optional[str] = None) -> int:
+        return sum(1 for job in cls.list(kind) if job.is_active)
+
+    @classmethod
+    def cancel(cls, job_id: str) -> Optional[BackgroundJob]:
+        job = cls.jobs.get(job_id)
+        if job is None:
+            return None
+
+        job.cancel_event.set()
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        return job
+
+    @classmethod
+    async def shutdown(cls, timeout: float = 5.0):
+        tasks = []
+        for job in cls.jobs.values():
+            if job.is_active:
+                cls.cancel(job.job_id)
+                if job.task is not None:
+                    tasks.append(job.task)
+
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    @classmethod
+    def _prune(cls):
+        finished = [job for job in cls.list() if not job.is_active]
+        for job in finished[settings.JOBS_HISTORY_LIMIT:]:
+            cls.jobs.pop(job.job_id, None)
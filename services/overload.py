@@ -0,0 +1,348 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+from fastapi import BackgroundTasks, HTTPException, Request, Response
+
+from core.config import settings
+from core.request_profiler import RequestProfiler
+from core.token_bucket import TokenBucket
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+MODE_HEADER = "X-Scoring-Mode"
+
+# Ступени деградации, от полной обработки к самой дешёвой; дальше — 503
+FULL = "full"              # активная модель и запись в БД
+SPILL = "spill"            # активная модель, запись откладывается в буфер
+CHEAP = "cheap"            # дешёвая модель (OVERLOAD_CHEAP_MODEL), запись в буфер
+RULES_ONLY = "rules_only"  # только правила причин, запись в буфер
+MODES = (FULL, SPILL, CHEAP, RULES_ONLY)
+
+
+class ScoringTicket:
+    """Режим, выбранный для запроса при допуске, и его вклад в очередь"""
+
+    __slots__ = ("kind", "mode", "budget", "row_seconds", "rows", "started", "detached", "released")
+
+    def __init__(self, kind: str, mode: str, budget: float, row_seconds: float):
+        self.kind = kind
+        self.mode = mode
+        self.budget = budget
+        # EWMA времени обработки строки в режиме; строк до charge — одна
+        self.row_seconds = row_seconds
+        self.rows = 1
+        self.started = time.perf_counter()
+        # Потоковый ответ освобождает билет сам, когда тело ответа передано
+        self.detached = False
+        self.released = False
+
+    @property
+    def expected(self) -> float:
+        """Ожидаемое время обработки — вклад запроса в очередь"""
+        return self.rows * self.row_seconds
+
+    @property
+    def persist_now(self) -> bool:
+        return self.mode == FULL
+
+
+class OverloadGuard:
+    """Защита скоринга от перегрузки.
+
+    Режим выбирается по очереди перед запросом — ожидаемому времени запросов в работе
+    (строки x EWMA времени строки в их режиме) и отложенных записей в БД, — а не по времени
+    обработки самого запроса: один большой пакет без конкурентов обрабатывается полностью.
+    Пока очередь не больше OVERLOAD_HEADROOM бюджета (заголовок X-Deadline-Ms или
+    OVERLOAD_DEFAULT_BUDGET_MS) — full, без учёта записей — spill; дальше cheap до середины
+    между запасом и бюджетом и rules_only до бюджета, за бюджетом — 503 с Retry-After. Когда
+    очередь разгружается, следующие запросы снова получают full. Здесь же лимит запросов на
+    клиента API (RATE_LIMIT_PER_MINUTE, токен-бакет на IP) и буфер отложенных записей.
+    """
+
+    lock = threading.Lock()
+    in_flight = 0
+    # Сумма ожидаемого времени запросов в работе, секунды
+    in_flight_seconds = 0.0
+    pending_writes = 0
+    # вид запроса (predict, batch) -> режим -> EWMA времени обработки одной строки, секунды
+    latency: Dict[str, Dict[str, float]] = {}
+    write_ewma: Optional[float] = None
+    # вид запроса -> режим последнего допущенного запроса
+    last_mode: Dict[str, str] = {}
+
+    clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+    spill_buffer: deque = deque()
+
+    stats = {
+        "admitted": {mode: 0 for mode in MODES},
+        "rejected_overload": 0,
+        "rejected_deadline": 0,
+        "rate_limited": 0,
+        "spilled": 0,
+        "spill_dropped": 0,
+        "spill_flushed": 0,
+    }
+
+    @staticmethod
+    def _ewma(current: Optional[float], value: float) -> float:
+        if current is None:
+            return value
+        return current + settings.OVERLOAD_EWMA_ALPHA * (value - current)
+
+    @staticmethod
+    def client_key(request: Request) -> str:
+        return request.client.host if request.client else "unknown"
+
+    @classmethod
+    def check_rate_limit(cls, client_key: str):
+        """Токен-бакет на клиента API: RATE_LIMIT_PER_MINUTE запросов с запасом на минуту"""
+        limit = settings.RATE_LIMIT_PER_MINUTE
+        if limit <= 0:
+            return
+
+        with cls.lock:
+            bucket = cls.clients.get(client_key)
+            if bucket is None:
+                bucket = TokenBucket(limit / 60.0, limit)
+                cls.clients[client_key] = bucket
+                if len(cls.clients) > settings.RATE_LIMIT_MAX_CLIENTS:
+                    cls.clients.popitem(last=False)
+            else:
+                cls.clients.move_to_end(client_key)
+
+            if bucket.try_consume():
+                return
+            retry_after = bucket.time_until()
+            cls.stats["rate_limited"] += 1
+
+        raise HTTPException(
+            status_code=429,
+            detail=f"Превышен лимит {limit} запросов в минуту",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    @staticmethod
+    def parse_budget(header: Optional[str]) -> float:
+        """Бюджет ответа в секундах из X-Deadline-Ms (оставшиеся миллисекунды)"""
+        if header is None:
+            return settings.OVERLOAD_DEFAULT_BUDGET_MS / 1000
+        try:
+            return float(header) / 1000
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Некорректный заголовок {DEADLINE_HEADER}: {header}")
+
+    @classmethod
+    def backlog(cls) -> float:
+        """Оценка ожидания перед обработкой нового запроса, секунды"""
+        return max(0.0, cls.in_flight_seconds) + cls.pending_writes * (cls.write_ewma or 0.0)
+
+    @classmethod
+    def row_seconds(cls, kind: str, mode: str) -> float:
+        """EWMA времени строки; режим без замеров оценивается по full"""
+        latency = cls.latency.get(kind, {})
+        return latency.get(mode, latency.get(FULL, 0.0))
+
+    @classmethod
+    def choose_mode(cls, budget: float) -> Optional[str]:
+        """Первый режим, в который укладывается очередь перед запросом; None — отказ"""
+        from ml.model_loader import ModelLoader
+
+        if cls.in_flight >= settings.OVERLOAD_MAX_IN_FLIGHT:
+            return None
+
+        writes = cls.pending_writes * (cls.write_ewma or 0.0)
+        scoring = max(0.0, cls.in_flight_seconds)
+        headroom = budget * settings.OVERLOAD_HEADROOM
+
+        # Полная обработка и запись в БД — пока остаётся запас; дальше деградация по шагам
+        if writes + scoring <= headroom:
+            return FULL
+        if scoring <= headroom:
+            return SPILL
+        if settings.OVERLOAD_CHEAP_MODEL in ModelLoader.models and scoring <= (headroom + budget) / 2:
+            return CHEAP
+        if scoring <= budget:
+            return RULES_ONLY
+        return None
+
+    @classmethod
+    def admit(cls, kind: str, request: Request) -> ScoringTicket:
+        cls.check_rate_limit(cls.client_key(request))
+        budget = cls.parse_budget(request.headers.get(DEADLINE_HEADER))
+
+        if budget <= 0:
+            cls.stats["rejected_deadline"] += 1
+            raise HTTPException(status_code=503, detail="Дедлайн запроса истёк до начала обработки",
+                                headers={"Retry-After": "1"})
+
+        with cls.lock:
+            mode = cls.choose_mode(budget)
+            if mode is not None:
+                ticket = ScoringTicket(kind, mode, budget, cls.row_seconds(kind, mode))
+                cls.in_flight += 1
+                cls.in_flight_seconds += ticket.expected
+                cls.stats["admitted"][mode] += 1
+                cls.last_mode[kind] = mode
+
+        if mode is None:
+            cls.stats["rejected_overload"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Сервис перегружен, повторите запрос позже",
+                headers={"Retry-After": str(max(1, math.ceil(cls.backlog())))}
+            )
+        return ticket
+
+    @classmethod
+    def charge(cls, ticket: ScoringTicket, rows: int):
+        """Число строк запроса, когда оно стало известно: вклад в очередь — строки x EWMA строки.
+        Поток вызывает на каждую микропачку — в очереди только пачка в работе
+        """
+        with cls.lock:
+            if ticket.released:
+                return
+            previous = ticket.expected
+            ticket.rows = max(1, rows)
+            cls.in_flight_seconds += ticket.expected - previous
+
+    @classmethod
+    def observe(cls, kind: str, mode: str, seconds: float, rows: int):
+        with cls.lock:
+            modes = cls.latency.setdefault(kind, {})
+            modes[mode] = cls._ewma(modes.get(mode), seconds / max(1, rows))
+
+    @classmethod
+    def release(cls, ticket: ScoringTicket, measure: bool = True):
+        """Запрос обработан: убрать из очереди и, если measure, обновить EWMA строки режима"""
+        with cls.lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            cls.in_flight -= 1
+            cls.in_flight_seconds -= ticket.expected
+        if measure:
+            cls.observe(ticket.kind, ticket.mode, time.perf_counter() - ticket.started, ticket.rows)
+
+    @classmethod
+    def dependency(cls, kind: str) -> Callable:
+        """Зависимость FastAPI: допуск, режим в заголовке ответа и учёт запроса в работе"""
+
+        async def guard(request: Request, response: Response):
+            ticket = cls.admit(kind, request)
+            response.headers[MODE_HEADER] = ticket.mode
+            try:
+                yield ticket
+            except Exception:
+                # Ошибка запроса не замер скорости обработки
+                cls.release(ticket, measure=False)
+                raise
+            finally:
+                # Выход из зависимости — до передачи тела ответа: потоковый ответ
+                # (ticket.detached) освобождает билет сам
+                if not ticket.detached:
+                    cls.release(ticket)
+
+        return guard
+
+    @classmethod
+    def schedule_write(cls, background_tasks: BackgroundTasks, func: Callable, **kwargs):
+        """Запись в БД фоновой задачей с учётом в очереди отложенных записей"""
+        with cls.lock:
+            cls.pending_writes += 1
+        background_tasks.add_task(cls._write, func, kwargs)
+
+    @classmethod
+    def _write(cls, func: Callable, kwargs: Dict):
+        started = time.perf_counter()
+        try:
+            with RequestProfiler.stage("db_write"):
+                func(**kwargs)
+        finally:
+            # Сессия запроса к этому моменту уже закрыта зависимостью, запись открывает её
+            # заново: без повторного close соединение держалось бы до сборки мусора,
+            # и под нагрузкой пул исчерпывался
+            if kwargs.get("db") is not None:
+                kwargs["db"].close()
+            seconds = time.perf_counter() - started
+            with cls.lock:
+                cls.pending_writes -= 1
+                cls.write_ewma = cls._ewma(cls.write_ewma, seconds)
+
+    @classmethod
+    def spill(cls, records: List[Dict]):
+        """Отложить записи build_transaction_record; при переполнении буфера старейшие теряются"""
+        with cls.lock:
+            overflow = len(cls.spill_buffer) + len(records) - settings.OVERLOAD_SPILL_MAX_ROWS
+            for _ in range(max(0, overflow)):
+                if not cls.spill_buffer:
+                    break
+                cls.spill_buffer.popleft()
+            cls.stats["spill_dropped"] += max(0, overflow)
+            cls.spill_buffer.extend(records[-settings.OVERLOAD_SPILL_MAX_ROWS:])
+            cls.stats["spilled"] += len(records)
+
+    @classmethod
+    def flush_spill(cls, max_rows: Optional[int] = None) -> int:
+        """Записать накопленный буфер пачками одной вставкой; вызывается из потока"""
+        from core.database import SessionLocal
+        from services.fraud_service import FraudService
+
+        with cls.lock:
+            count = len(cls.spill_buffer) if max_rows is None else min(max_rows, len(cls.spill_buffer))
+            records = [cls.spill_buffer.popleft() for _ in range(count)]
+        if not records:
+            return 0
+
+        db = SessionLocal()
+        try:
+            saved = FraudService.save_transactions_bulk(db, records)
+        finally:
+            db.close()
+
+        if saved:
+            cls.stats["spill_flushed"] += saved
+        else:
+            # Запись не удалась — вернуть в начало буфера до следующей попытки
+            with cls.lock:
+                cls.spill_buffer.extendleft(reversed(records))
+        return saved
+
+    @classmethod
+    async def drain_periodically(cls):
+        """Сбрасывать буфер в БД, когда нагрузка позволяет полную обработку"""
+        while True:
+            await asyncio.sleep(settings.OVERLOAD_SPILL_FLUSH_SECONDS)
+            if not cls.spill_buffer:
+                continue
+            if cls.choose_mode(settings.OVERLOAD_DEFAULT_BUDGET_MS / 1000) != FULL:
+                continue
+            try:
+                await asyncio.to_thread(cls.flush_spill, settings.OVERLOAD_SPILL_FLUSH_BATCH)
+            except Exception as e:
+                print(f"Ошибка записи отложенных транзакций: {e}")
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        with cls.lock:
+            latency = {
+                kind: {mode: round(1000 * seconds, 3) for mode, seconds in modes.items()}
+                for kind, modes in cls.latency.items()
+            }
+            return {
+                "default_budget_ms": settings.OVERLOAD_DEFAULT_BUDGET_MS,
+                "in_flight": cls.in_flight,
+                "pending_writes": cls.pending_writes,
+                "backlog_ms": round(1000 * cls.backlog(), 3),
+                "row_latency_ewma_ms": latency,
+                "write_ewma_ms": round(1000 * cls.write_ewma, 3) if cls.write_ewma is not None else None,
+                "current_mode": cls.choose_mode(settings.OVERLOAD_DEFAULT_BUDGET_MS / 1000),
+                "last_mode": dict(cls.last_mode),
+                "spill_buffer": len(cls.spill_buffer),
+                "rate_limit_per_minute": settings.RATE_LIMIT_PER_MINUTE,
+                "tracked_clients": len(cls.clients),
+                "admitted": dict(cls.stats["admitted"]),
+                **{key: value for key, value in cls.stats.items() if key != "admitted"},
+            }
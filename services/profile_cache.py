@@ -0,0 +1,180 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import SessionLocal
+from ml.predictor import FraudPredictor
+from models.database import Transaction as DBTransaction
+
+
+PROFILE_FEATURES = [name for name in FraudPredictor.FEATURE_NAMES if name != "amount"]
+
+
+class ClientProfileCache:
+    """Поведенческие признаки известных клиентов: отсортированные int64 id + матрица float32.
+
+    Поиск — бинарный по id, таблица заменяется целиком, поэтому чтения идут без блокировки.
+    """
+
+    # (ids, values, touched): touched — номер обновления строки, по нему вытесняются старые клиенты
+    table = (
+        np.empty(0, dtype=np.int64),
+        np.empty((0, len(PROFILE_FEATURES)), dtype=np.float32),
+        np.empty(0, dtype=np.int64),
+    )
+    update_seq = 0
+    last_transaction_id = 0
+    loaded_at: Optional[datetime] = None
+    lock = threading.Lock()
+    stats = {"hits": 0, "misses": 0, "refreshes": 0, "rows_from_patterns": 0, "rows_from_db": 0}
+
+    @classmethod
+    def load_from_patterns(cls):
+        from ml.dataset_loader import DatasetLoader, PATTERN_FEATURES, PATTERNS_PATH, PATTERNS_SCHEMA
+
+        # Колонки из кэша .npy, без pandas на старте
+        source = {feature: column for column, feature in PATTERN_FEATURES.items()}
+        columns = DatasetLoader.load_columns(
+            PATTERNS_PATH, PATTERNS_SCHEMA, ["transdate", "cst_dim_id"] + [source[name] for name in PROFILE_FEATURES]
+        )
+
+        # Сначала самые поздние строки: в upsert побеждает первое вхождение клиента
+        order = np.argsort(columns["transdate"], kind="stable")[::-1]
+        ids = np.asarray(columns["cst_dim_id"])[order]
+        values = np.column_stack([np.asarray(columns[source[name]])[order] for name in PROFILE_FEATURES])
+
+        cls.upsert(ids, values)
+        clients = len(np.unique(ids))
+        cls.stats["rows_from_patterns"] = clients
+        print(f"Кэш профилей: загружено {clients} клиентов из patterns.csv")
+
+    @classmethod
+    def refresh_from_db(cls, db: Session) -> int:
+        """Подтянуть признаки из транзакций, сохранённых после прошлого обновления"""
+        rows = db.query(
+            DBTransaction.id,
+            DBTransaction.client_id,
+            *[getattr(DBTransaction, name) for name in PROFILE_FEATURES]
+        ).filter(
+            DBTransaction.id > cls.last_transaction_id
+        ).order_by(DBTransaction.id).limit(settings.PROFILE_CACHE_REFRESH_BATCH).all()
+
+        if not rows:
+            return 0
+
+        cls.last_transaction_id = rows[-1][0]
+        ids = []
+        values = []
+        # Поздние строки идут первыми, чтобы при upsert победила последняя транзакция клиента
+        for row in reversed(rows):
+            client_id = row[1]
+            if client_id is None or not str(client_id).isdigit():
+                continue
+            ids.append(int(client_id))
+            values.append([np.nan if value is None else value for value in row[2:]])
+
+        if ids:
+            cls.upsert(np.array(ids, dtype=np.int64), np.array(values, dtype=np.float64))
+        cls.stats["rows_from_db"] += len(ids)
+        cls.stats["refreshes"] += 1
+        return len(ids)
+
+    @classmethod
+    async def refresh_periodically(cls):
+        while True:
+            await asyncio.sleep(settings.PROFILE_CACHE_REFRESH_SECONDS)
+            try:
+                await asyncio.to_thread(cls._refresh_with_session)
+            except Exception as e:
+                print(f"Ошибка обновления кэша профилей: {e}")
+
+    @classmethod
+    def _refresh_with_session(cls):
+        db = SessionLocal()
+        try:
+            while cls.refresh_from_db(db) >= settings.PROFILE_CACHE_REFRESH_BATCH:
+                pass
+        finally:
+            db.close()
+
+    @classmethod
+    def upsert(cls, ids: np.ndarray, values: np.ndarray):
+        """Новые строки перекрывают старые; при первом вхождении id в ids побеждает оно"""
+        with cls.lock:
+            old_ids, old_values, old_touched = cls.table
+            cls.update_seq += 1
+
+            all_ids = np.concatenate([ids.astype(np.int64), old_ids])
+            all_values = np.concatenate([values.astype(np.float32), old_values])
+            all_touched = np.concatenate([np.full(len(ids), cls.update_seq, dtype=np.int64), old_touched])
+
+            # np.unique возвращает индекс первого вхождения — это новая строка
+            new_ids, index = np.unique(all_ids, return_index=True)
+            new_values = all_values[index]
+            new_touched = all_touched[index]
+
+            if len(new_ids) > settings.PROFILE_CACHE_MAX_CLIENTS:
+                keep = np.sort(np.argsort(-new_touched, kind="stable")[:settings.PROFILE_CACHE_MAX_CLIENTS])
+                new_ids, new_values, new_touched = new_ids[keep], new_values[keep], new_touched[keep]
+
+            cls.table = (new_ids, np.ascontiguousarray(new_values), new_touched)
+            cls.loaded_at = datetime.utcnow()
+
+    @classmethod
+    def get(cls, client_id: Optional[str]) -> Optional[Dict[str, float]]:
+        ids, values, _ = cls.table
+
+        if client_id is not None and str(client_id).isdigit() and len(ids):
+            key = int(client_id)
+            position = int(np.searchsorted(ids, key))
+            if position < len(ids) and ids[position] == key:
+                cls.stats["hits"] += 1
+                return dict(zip(PROFILE_FEATURES, values[position].tolist()))
+
+        cls.stats["misses"] += 1
+        return None
+
+    @classmethod
+    def get_many(cls, client_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Поиск пачки клиентов одним searchsorted: (матрица признаков, маска найденных)"""
+        ids, values, _ = cls.table
+        found = np.zeros(len(client_ids), dtype=bool)
+        result = np.full((len(client_ids), len(PROFILE_FEATURES)), np.nan, dtype=np.float32)
+
+        # id клиента — до 18 десятичных цифр (помещается в int64); остальное не ищется
+        keys = [None if key is None else str(key) for key in client_ids]
+        digits = np.array(
+            [key is not None and 0 < len(key) <= 18 and key.isascii() and key.isdigit() for key in keys],
+            dtype=bool
+        )
+        if len(ids) and digits.any():
+            rows = np.flatnonzero(digits)
+            wanted = np.array([int(keys[row]) for row in rows], dtype=np.int64)
+            positions = np.minimum(np.searchsorted(ids, wanted), len(ids) - 1)
+            hit = ids[positions] == wanted
+            found[rows[hit]] = True
+            result[rows[hit]] = values[positions[hit]]
+
+        hits = int(found.sum())
+        cls.stats["hits"] += hits
+        cls.stats["misses"] += len(client_ids) - hits
+        return result, found
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        ids, values, touched = cls.table
+        lookups = cls.stats["hits"] + cls.stats["misses"]
+        return {
+            "clients": len(ids),
+            "max_clients": settings.PROFILE_CACHE_MAX_CLIENTS,
+            "memory_bytes": ids.nbytes + values.nbytes + touched.nbytes,
+            "hit_rate": cls.stats["hits"] / lookups if lookups else 0.0,
+            "last_transaction_id": cls.last_transaction_id,
+            "loaded_at": cls.loaded_at,
+            **cls.stats,
+        }
@@ -0,0 +1,291 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from core.config import settings
+from core.database import ReadRouting, SessionLocal, engine
+from core.startup import StartupProfile
+
+
+class Readiness:
+    """Прогрев после старта и кэшированное состояние компонентов для /ready и /health.
+
+    Прогрев прогоняет синтетические транзакции через все пути скоринга (одиночный и пакетный
+    предсказатель каждой модели, объяснения, правила, колоночный и потоковый скоринг во всех
+    режимах перегрузки) и открывает соединения пула БД. Ничего не записывает и не трогает
+    индексы скоростей. Проверки компонентов идут в фоне раз в READINESS_PROBE_SECONDS,
+    поэтому опросы балансировщика не нагружают БД.
+    """
+
+    started_at = datetime.utcnow()
+    warmed_up = False
+    warmup: Dict = {"status": "pending"}
+    components: Dict[str, Dict] = {}
+    checked_at: Optional[float] = None
+
+    @staticmethod
+    def sample_rows(rows: int) -> List[Dict]:
+        """Строки вокруг статистик импьютера обученной модели; без снимка — единичные значения"""
+        from ml.model_loader import ModelLoader
+        from ml.predictor import FraudPredictor
+
+        imputer = ModelLoader.snapshot.imputer if ModelLoader.snapshot else None
+        names = list(getattr(imputer, "feature_names_in_", FraudPredictor.FEATURE_NAMES))
+        center = np.asarray(getattr(imputer, "statistics_", np.ones(len(names))), dtype=np.float64)
+        center = np.where(np.isfinite(center), center, 1.0)
+
+        # Разброс значений, чтобы прогон прошёл по разным ветвям деревьев
+        spread = np.random.default_rng(0).uniform(0.2, 3.0, size=(rows, len(names)))
+        values = np.abs(center) * spread
+        return [
+            {"client_id": f"warmup-{row}", "destination_id": None,
+             **{name: float(value) for name, value in zip(names, values[row])}}
+            for row in range(rows)
+        ]
+
+    @staticmethod
+    def _warm_database(connections: int):
+        """Открыть соединения пула разом: после возврата они остаются в пуле готовыми"""
+        from models.database import Transaction
+
+        opened = []
+        try:
+            for _ in range(connections):
+                connection = engine.connect()
+                opened.append(connection)
+                connection.execute(text("SELECT 1"))
+        finally:
+            for connection in opened:
+                connection.close()
+
+        # Компиляция ORM-запроса кэшируется, первый запрос к таблице платит за неё
+        db = SessionLocal()
+        try:
+            db.query(Transaction.id).order_by(Transaction.id.desc()).limit(1).all()
+        finally:
+            db.close()
+
+    @classmethod
+    def _warm_scoring(cls, steps: Dict[str, float]):
+        from api.responses import dumps
+        from api.schemas import TransactionPredictResponse
+        from ml.cascade import CascadeStats
+        from ml.model_loader import ModelLoader
+        from ml.predictor import FraudPredictor
+        from services.columnar_scoring import ColumnarScoring
+        from services.fraud_service import FraudService
+        from services.overload import CHEAP, FULL, RULES_ONLY, ScoringTicket
+        from services.stream_scoring import StreamScoring
+
+        def step(name: str, func, *args, **kwargs):
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            steps[name] = round(1000 * (time.perf_counter() - started), 1)
+            return result
+
+        rows = cls.sample_rows(settings.WARMUP_BATCH_ROWS)
+
+        if ModelLoader.snapshot is not None:
+            predictor = FraudPredictor()
+            step("predict_single", predictor.predict_batch, rows[:1], explain=True)
+            predictions = step("predict_batch", predictor.predict_batch, rows, explain=True)
+            for name in ModelLoader.snapshot.models:
+                model_predictor = FraudPredictor(model_name=name)
+                step(f"model:{name}", model_predictor.predict_batch, rows[:1])
+                step(f"model_batch:{name}", model_predictor.predict_batch, rows)
+
+            probabilities = [prediction["fraud_probability"] for prediction in predictions]
+            reasons, _ = step("reasons", FraudService.generate_fraud_reasons_batch, rows, probabilities)
+            response = TransactionPredictResponse(
+                transaction_id="warmup",
+                fraud_probability=probabilities[0],
+                is_fraud=predictions[0]["is_fraud"],
+                risk_level=FraudService.determine_risk_level(probabilities[0]),
+                reasons=reasons[0],
+                model_version=predictions[0]["model_version"],
+                timestamp=datetime.utcnow(),
+                explanation=predictions[0].get("explanation"),
+                scoring_mode=FULL
+            )
+            step("response_json", response.model_dump_json)
+        step("rules_only", FraudService.predict_rules_only, rows)
+
+        # Колоночный и потоковый пути в каждом режиме, который может выбрать OverloadGuard
+        modes = [RULES_ONLY]
+        if ModelLoader.snapshot is not None:
+            modes = [FULL, RULES_ONLY]
+            if settings.OVERLOAD_CHEAP_MODEL in ModelLoader.snapshot.models:
+                modes.insert(1, CHEAP)
+        columns = {name: [row[name] for row in rows] for name in ColumnarScoring.allowed_features() if name in rows[0]}
+        columns["client_id"] = [row["client_id"] for row in rows]
+        lines = [dumps(row) for row in rows]
+        for mode in modes:
+            ticket = ScoringTicket("warmup", mode, float("inf"), 0.0)
+            response, _ = step(f"columnar:{mode}", ColumnarScoring.run, columns, ticket, False)
+            dumps(response)
+            step(f"stream:{mode}", StreamScoring._score_lines, lines, 0, ticket, False)
+
+        # Прогрев не должен попадать в статистику каскада
+        CascadeStats.reset()
+
+    @classmethod
+    def run_warmup(cls) -> Dict:
+        """Прогрев целиком; вызывается из потока"""
+        steps: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        connections = getattr(engine.pool, "size", lambda: 1)()
+        database_started = time.perf_counter()
+        cls._warm_database(connections)
+        steps["database"] = round(1000 * (time.perf_counter() - database_started), 1)
+
+        cls._warm_scoring(steps)
+
+        return {
+            "status": "done",
+            "seconds": round(time.perf_counter() - started, 3),
+            "db_connections": connections,
+            "rows": settings.WARMUP_BATCH_ROWS,
+            "steps_ms": steps,
+        }
+
+    @classmethod
+    async def warm_up(cls):
+        if not settings.WARMUP_ENABLED:
+            cls.warmup = {"status": "disabled"}
+        else:
+            cls.warmup = {"status": "running"}
+            try:
+                with StartupProfile.stage("warmup"):
+                    cls.warmup = await asyncio.to_thread(cls.run_warmup)
+                print(f"Прогрев завершён за {cls.warmup['seconds']:.2f} с")
+            except Exception as e:
+                # Прогрев — оптимизация: при ошибке сервис всё равно становится готовым,
+                # если компоненты исправны, а ошибка видна в /ready
+                cls.warmup = {"status": "failed", "error": str(e)}
+                print(f"Ошибка прогрева: {e}")
+        cls.warmed_up = True
+        cls.note_first_ready()
+
+    @staticmethod
+    def _check_database() -> Dict:
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        return {"status": "ok", "latency_ms": round(1000 * (time.perf_counter() - started), 2)}
+
+    @classmethod
+    def probe(cls):
+        """Проверка компонентов; вызывается из потока фоновым опросом"""
+        from ml.model_loader import ModelLoader
+        from services.profile_cache import ClientProfileCache
+        from services.rules_engine import RulesEngine
+
+        snapshot = ModelLoader.snapshot
+        components = {
+            "ml_models": (
+                {"status": "ok", "models_loaded": len(snapshot.models), "snapshot_version": snapshot.version}
+                if snapshot is not None and snapshot.models else {"status": "not_loaded"}
+            ),
+            "database": cls._check_database(),
+            "rules": (
+                {"status": "ok", "rules_loaded": len(RulesEngine.get_rules())}
+                if RulesEngine.loaded_at is not None else {"status": "not_loaded"}
+            ),
+            # Без кэша профилей скоринг по client_id отвечает 422, но остальное работает
+            "profile_cache": (
+                {"status": "ok"} if ClientProfileCache.loaded_at is not None else {"status": "not_loaded"}
+            ),
+        }
+        cls.components = components
+        cls.checked_at = time.monotonic()
+        cls.note_first_ready()
+
+    @classmethod
+    def note_first_ready(cls):
+        """Время холодного старта — один раз, при первой готовности"""
+        from services.worker_stats import WorkerStats
+
+        if not cls.is_ready() or not StartupProfile.mark_ready():
+            return
+        seconds = StartupProfile.seconds_to_ready
+        target = settings.STARTUP_TARGET_SECONDS
+        exceeded = f", дольше цели {target:.1f} с" if seconds > target else ""
+        print(f"Готов к трафику через {seconds:.2f} с после запуска процесса{exceeded}")
+        if StartupProfile.enabled and WorkerStats.is_primary():
+            print(StartupProfile.report(target))
+
+    @classmethod
+    async def probe_periodically(cls):
+        while True:
+            try:
+                await asyncio.to_thread(cls.probe)
+            except Exception as e:
+                print(f"Ошибка проверки компонентов: {e}")
+            await asyncio.sleep(settings.READINESS_PROBE_SECONDS)
+
+    @classmethod
+    def cache_age(cls) -> Optional[float]:
+        return None if cls.checked_at is None else time.monotonic() - cls.checked_at
+
+    @classmethod
+    def status(cls) -> str:
+        """healthy / degraded / unhealthy по последней проверке"""
+        age = cls.cache_age()
+        if age is None or age > settings.READINESS_STALE_SECONDS:
+            return "unhealthy"
+        if any(cls.components.get(name, {}).get("status") != "ok" for name in ("ml_models", "database")):
+            return "unhealthy"
+        if any(component["status"] != "ok" for component in cls.components.values()):
+            return "degraded"
+        return "healthy"
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        """Готов принимать трафик: прогрев завершён и модели с БД исправны"""
+        return cls.warmed_up and cls.status() != "unhealthy"
+
+    @classmethod
+    def report(cls) -> Dict:
+        age = cls.cache_age()
+        return {
+            "status": cls.status(),
+            "ready": cls.is_ready(),
+            "warmup": cls.warmup,
+            "components": cls.components,
+            "checked_seconds_ago": None if age is None else round(age, 1),
+            # Отставание движка чтения не влияет на готовность: чтения уходят в основную базу
+            "read_routing": ReadRouting.get_stats(),
+            "uptime_seconds": round((datetime.utcnow() - cls.started_at).total_seconds(), 1),
+            "startup": {
+                "seconds_to_ready": None if StartupProfile.seconds_to_ready is None
+                else round(StartupProfile.seconds_to_ready, 2),
+                "target_seconds": settings.STARTUP_TARGET_SECONDS,
+                "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in StartupProfile.stages.items()},
+            },
+        }
+
+    @classmethod
+    def health(cls) -> Dict:
+        """Прежний формат /health (компоненты строками) по кэшу последней проверки"""
+        components = {"api": "ok"}
+        for name, component in cls.components.items():
+            status = component["status"]
+            components[name] = f"error: {component['error']}" if status == "error" else status
+        if "models_loaded" in cls.components.get("ml_models", {}):
+            components["models_loaded"] = cls.components["ml_models"]["models_loaded"]
+
+        age = cls.cache_age()
+        return {
+            "status": cls.status(),
+            "ready": cls.is_ready(),
+            "components": components,
+            "checked_seconds_ago": None if age is None else round(age, 1),
+        }
@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, inspect, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from ml.predictor import FraudPredictor
+from models.database import Transaction as DBTransaction, TransactionReason
+from services.rules_engine import RulesEngine
+
+
+class ReasonIndex:
+    """Коды причин транзакций: колонка reason_mask и таблица transaction_reasons"""
+
+    @staticmethod
+    def ensure_schema(engine: Engine):
+        """create_all не добавляет колонки в существующие таблицы — reason_mask добавляется здесь"""
+        columns = {column["name"] for column in inspect(engine).get_columns("transactions")}
+        if "reason_mask" in columns:
+            return
+
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE transactions ADD COLUMN reason_mask BIGINT"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_transactions_reason_mask ON transactions (reason_mask)"
+            ))
+        print("В таблицу transactions добавлена колонка reason_mask")
+
+    @staticmethod
+    def reason_rows(transaction_id: str, mask: Optional[int]) -> List[Dict]:
+        mask = int(mask or 0)
+        return [
+            {"transaction_id": transaction_id, "reason_bit": bit}
+            for bit in range(mask.bit_length())
+            if mask & (1 << bit)
+        ]
+
+    @staticmethod
+    def insert_reason_rows(db: Session, records: List[Dict]):
+        """Строки таблицы поиска для записей build_transaction_record; commit — на вызывающем"""
+        rows = [
+            row
+            for record in records
+            for row in ReasonIndex.reason_rows(record["transaction_id"], record.get("reason_mask"))
+        ]
+        if rows:
+            db.execute(insert(TransactionReason), rows)
+
+    @staticmethod
+    def mask_for_transaction(transaction: DBTransaction) -> int:
+        """Для старых строк: по сохранённому тексту, а без него — правилами по сохранённым признакам"""
+        if transaction.reasons:
+            return RulesEngine.mask_from_reasons(transaction.reasons)
+
+        features = {name: getattr(transaction, name) for name in FraudPredictor.FEATURE_NAMES}
+        masks = RulesEngine.evaluate_records([features], [transaction.fraud_probability or 0.0])
+        return int(masks[0])
+
+    @staticmethod
+    def backfill(db: Session, batch_size: Optional[int] = None) -> int:
+        """Заполнить reason_mask и transaction_reasons для строк, сохранённых до появления колонки"""
+        batch_size = batch_size or settings.REASON_BACKFILL_BATCH
+        filled = 0
+
+        while True:
+            transactions = db.query(DBTransaction).filter(
+                DBTransaction.reason_mask.is_(None)
+            ).order_by(DBTransaction.id).limit(batch_size).all()
+
+            if not transactions:
+                break
+
+            updates = [
+                {"id": transaction.id, "reason_mask": ReasonIndex.mask_for_transaction(transaction)}
+                for transaction in transactions
+            ]
+            db.execute(update(DBTransaction), updates)
+            ReasonIndex.insert_reason_rows(db, [
+                {"transaction_id": transaction.transaction_id, "reason_mask": row["reason_mask"]}
+                for transaction, row in zip(transactions, updates)
+            ])
+            db.commit()
+            db.expunge_all()
+
+            filled += len(updates)
+
+        return filled
+
+    @staticmethod
+    def get_reason_counts(db: Session, start_date: Optional[datetime] = None,
+                          until_id: Optional[int] = None) -> Dict[str, int]:
+        """Количество транзакций по каждому коду причины; until_id — только транзакции с id не больше"""
+        query = db.query(TransactionReason.reason_bit, func.count(TransactionReason.id))
+
+        if start_date or until_id is not None:
+            query = query.join(DBTransaction, DBTransaction.transaction_id == TransactionReason.transaction_id)
+        if start_date:
+            query = query.filter(DBTransaction.created_at >= start_date)
+        if until_id is not None:
+            query = query.filter(DBTransaction.id <= until_id)
+
+        counts = dict(query.group_by(TransactionReason.reason_bit).all())
+
+        return {
+            rule.code: counts.get(rule.bit, 0)
+            for rule in RulesEngine.get_rules()
+        }
@@ -0,0 +1,140 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional
+
+import numpy as np
+
+from core.database import SessionLocal
+from ml.dataset_loader import DatasetLoader
+from services.velocity_index import VELOCITY_FEATURE_NAMES, VelocityIndex
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class ReplayService:
+
+    @staticmethod
+    async def replay(job,
+                     speedup: float = 0,
+                     batch_size: int = 1000,
+                     persist: bool = True,
+                     limit: Optional[int] = None):
+        from ml.predictor import FraudPredictor
+
+        predictor = FraudPredictor()
+        frame = await asyncio.to_thread(DatasetLoader.load_scoring_frame)
+        if limit:
+            frame = frame.iloc[:limit]
+
+        total = len(frame)
+        event_seconds = (frame["event_time"] - frame["event_time"].iloc[0]).dt.total_seconds().to_numpy() \
+            if total else np.empty(0)
+
+        progress = job.progress
+        progress.update(
+            total_expected=total,
+            processed=0,
+            persisted=0,
+            true_positive=0,
+            false_positive=0,
+            false_negative=0,
+            true_negative=0,
+        )
+        started = time.monotonic()
+        position = 0
+
+        while position < total and not job.cancelled:
+            if speedup > 0:
+                # Расписание по времени событий: строка i должна уйти в event_seconds[i] / speedup
+                due_at = event_seconds[position] / speedup
+                delay = due_at - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                now = (time.monotonic() - started) * speedup
+                end = int(np.searchsorted(event_seconds, now, side="right"))
+                end = min(max(end, position + 1), position + batch_size)
+            else:
+                end = min(position + batch_size, total)
+
+            batch = await asyncio.to_thread(
+                ReplayService._process_replay_batch,
+                predictor, frame.iloc[position:end], persist
+            )
+            position = end
+
+            for key, value in batch.items():
+                progress[key] += value
+            progress["processed"] = position
+            ReplayService._update_metrics(progress, time.monotonic() - started)
+
+        if speedup > 0 and total:
+            progress["schedule_lag_seconds"] = round(
+                (time.monotonic() - started) - event_seconds[position - 1] / speedup, 3
+            )
+
+    @staticmethod
+    def _process_replay_batch(predictor, batch: "pd.DataFrame", persist: bool) -> Dict:
+        from services.fraud_service import FraudService
+        from services.rules_engine import RulesEngine
+        from api.schemas import TransactionPredictResponse
+
+        # Скорости как в /batch: в VelocityIndex учитываются только сохраняемые в БД транзакции
+        velocity = VelocityIndex.resolve_many(
+            batch["client_id"].to_numpy(), batch["destination_id"].to_numpy(), batch["amount"].to_numpy(),
+            observe=persist
+        )
+        batch = batch.assign(**{name: velocity[:, index] for index, name in enumerate(VELOCITY_FEATURE_NAMES)})
+
+        probas = predictor.predict_proba(batch.reindex(columns=predictor.feature_names))
+        predicted = probas >= predictor.threshold
+        actual = batch["target"].to_numpy() == 1
+
+        persisted = 0
+        if persist:
+            records = []
+            model_version = predictor.model_version
+            masks = RulesEngine.evaluate(batch, probas)
+            for features, proba, is_fraud, mask in zip(batch.to_dict("records"), probas, predicted, masks):
+                proba = float(proba)
+                response = TransactionPredictResponse(
+                    transaction_id=str(uuid.uuid4()),
+                    fraud_probability=proba,
+                    is_fraud=bool(is_fraud),
+                    risk_level=FraudService.determine_risk_level(proba),
+                    reasons=RulesEngine.render(mask, features, proba),
+                    model_version=model_version,
+                    timestamp=datetime.utcnow()
+                )
+                records.append(FraudService.build_transaction_record(features, response, mask))
+
+            db = SessionLocal()
+            try:
+                persisted = FraudService.save_transactions_bulk(db, records)
+            finally:
+                db.close()
+
+        return {
+            "persisted": persisted,
+            "true_positive": int(np.sum(predicted & actual)),
+            "false_positive": int(np.sum(predicted & ~actual)),
+            "false_negative": int(np.sum(~predicted & actual)),
+            "true_negative": int(np.sum(~predicted & ~actual)),
+        }
+
+    @staticmethod
+    def _update_metrics(progress: Dict, elapsed: float):
+        tp = progress["true_positive"]
+        fp = progress["false_positive"]
+        fn = progress["false_negative"]
+
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+
+        progress["precision"] = round(precision, 4)
+        progress["recall"] = round(recall, 4)
+        progress["f1"] = round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0
+        progress["elapsed_seconds"] = round(elapsed, 3)
+        progress["throughput_per_second"] = round(progress["processed"] / elapsed, 2) if elapsed > 0 else 0.0
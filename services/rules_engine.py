@@ -0,0 +1,262 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.config import settings
+
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# lo < x <= hi для between — так пороги соседних правил не пересекаются
+OPERATORS = {
+    "gt": lambda x, v: x > v,
+    "ge": lambda x, v: x >= v,
+    "lt": lambda x, v: x < v,
+    "le": lambda x, v: x <= v,
+    "eq": lambda x, v: x == v,
+    "abs_gt": lambda x, v: np.abs(x) > v,
+    "between": lambda x, v: (x > v[0]) & (x <= v[1]),
+}
+
+# Вероятность модели доступна правилам как обычный признак
+PROBABILITY_FEATURE = "probability"
+
+# Маска хранится в знаковом BIGINT, поэтому старший бит не используется
+MAX_RULES = 63
+
+
+class FraudRule:
+
+    __slots__ = ("code", "bit", "feature", "op", "value", "default", "message", "templated", "fallback")
+
+    def __init__(self, spec: Dict):
+        self.code = str(spec["code"])
+        self.bit = int(spec["bit"])
+        self.feature = str(spec["feature"])
+        self.op = spec["op"]
+        self.value = spec["value"]
+        # Отсутствующий признак считается нулём, NaN не срабатывает ни на одном сравнении
+        self.default = float(spec.get("default", 0))
+        self.message = str(spec["message"])
+        self.templated = "{" in self.message
+        # Резервная причина: только если другие правила не сработали
+        self.fallback = bool(spec.get("fallback", False))
+
+        if self.op not in OPERATORS:
+            raise ValueError(f"Правило {self.code}: неизвестный оператор {self.op}")
+        if not 0 <= self.bit < MAX_RULES:
+            raise ValueError(f"Правило {self.code}: bit должен быть от 0 до {MAX_RULES - 1}")
+        if self.op == "between" and (not isinstance(self.value, list) or len(self.value) != 2):
+            raise ValueError(f"Правило {self.code}: для between нужен [нижняя, верхняя] граница")
+
+    def to_dict(self) -> Dict:
+        return {
+            "code": self.code,
+            "bit": self.bit,
+            "feature": self.feature,
+            "op": self.op,
+            "value": self.value,
+            "default": self.default,
+            "message": self.message,
+            "fallback": self.fallback,
+        }
+
+
+class RulesEngine:
+    """Причины мошенничества как данные: правила из JSON, векторная проверка, битовые маски.
+
+    Маска строки — сумма 1 << bit сработавших правил; текст строится только по запросу.
+    Файл правил перечитывается при изменении mtime, без перезапуска сервиса.
+    """
+
+    # (rules, mtime) заменяется целиком, поэтому проверка идёт без блокировки
+    ruleset = ([], None)
+    loaded_at: Optional[datetime] = None
+    last_check = 0.0
+    failed_mtime: Optional[float] = None
+    mask_rules: Dict[int, tuple] = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def rules_path() -> Path:
+        path = Path(settings.FRAUD_RULES_PATH)
+        return path if path.is_absolute() else PROJECT_ROOT / path
+
+    @classmethod
+    def load(cls) -> int:
+        """Прочитать и проверить файл правил; при ошибке остаются прежние правила"""
+        path = cls.rules_path()
+        with cls.lock:
+            mtime = os.path.getmtime(path)
+            spec = json.loads(path.read_text(encoding="utf-8"))
+            rules = [FraudRule(item) for item in spec["rules"]]
+
+            bits = [rule.bit for rule in rules]
+            if len(set(bits)) != len(bits):
+                raise ValueError("Номера битов правил должны быть уникальными")
+
+            cls.ruleset = (rules, mtime)
+            cls.loaded_at = datetime.utcnow()
+            cls.last_check = time.monotonic()
+
+        return len(rules)
+
+    @classmethod
+    def get_rules(cls) -> List[FraudRule]:
+        rules, mtime = cls.ruleset
+
+        now = time.monotonic()
+        if mtime is None or now - cls.last_check >= settings.FRAUD_RULES_CHECK_SECONDS:
+            cls.last_check = now
+            try:
+                current = os.path.getmtime(cls.rules_path())
+            except OSError:
+                current = None
+
+            # Сломанный файл не перечитывается повторно, пока его снова не изменят
+            if current is not None and current != mtime and current != cls.failed_mtime:
+                try:
+                    cls.load()
+                    print(f"Правила причин перечитаны: {len(cls.ruleset[0])}")
+                except Exception as e:
+                    cls.failed_mtime = current
+                    print(f"⚠Ошибка загрузки правил, используются прежние: {e}")
+            rules, _ = cls.ruleset
+
+        return rules
+
+    @classmethod
+    def evaluate(cls, columns: Mapping[str, Sequence], probabilities: Sequence[float]) -> np.ndarray:
+        """Маски причин для матрицы признаков: columns — признак -> значения по строкам"""
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        masks = np.zeros(len(probabilities), dtype=np.uint64)
+        fallback = np.zeros(len(probabilities), dtype=np.uint64)
+
+        for rule in cls.get_rules():
+            if rule.feature == PROBABILITY_FEATURE:
+                values = probabilities
+            elif rule.feature in columns:
+                values = np.asarray(columns[rule.feature], dtype=np.float64)
+            else:
+                values = np.full(len(probabilities), rule.default)
+
+            with np.errstate(invalid="ignore"):
+                hit = OPERATORS[rule.op](values, rule.value)
+
+            target = fallback if rule.fallback else masks
+            target[hit] |= np.uint64(1 << rule.bit)
+
+        masks[masks == 0] = fallback[masks == 0]
+        return masks
+
+    @classmethod
+    def evaluate_records(cls, records: List[Dict], probabilities: Sequence[float]) -> np.ndarray:
+        rules = cls.get_rules()
+        if len(records) == 1:
+            return np.array([cls._evaluate_one(rules, records[0], float(probabilities[0]))], dtype=np.uint64)
+
+        # None в float-массиве становится NaN и не срабатывает
+        columns = {
+            rule.feature: [record.get(rule.feature, rule.default) for record in records]
+            for rule in rules
+            if rule.feature != PROBABILITY_FEATURE
+        }
+        return cls.evaluate(columns, probabilities)
+
+    @staticmethod
+    def _evaluate_one(rules: List[FraudRule], record: Mapping, probability: float) -> int:
+        """Одна строка без накладных расходов numpy: те же операторы на скалярах"""
+        mask = 0
+        fallback = 0
+        for rule in rules:
+            if rule.feature == PROBABILITY_FEATURE:
+                value = probability
+            else:
+                value = record.get(rule.feature, rule.default)
+                if value is None:
+                    continue
+
+            if OPERATORS[rule.op](value, rule.value):
+                if rule.fallback:
+                    fallback |= 1 << rule.bit
+                else:
+                    mask |= 1 << rule.bit
+
+        return mask or fallback
+
+    @classmethod
+    def render(cls, mask: int, features: Mapping, probability: float = 0.0) -> List[str]:
+        """Текст причин по маске в порядке правил в файле"""
+        return cls._render(cls.get_rules(), int(mask), features, probability)
+
+    @classmethod
+    def _render(cls, rules: List[FraudRule], mask: int, features: Mapping, probability: float) -> List[str]:
+        if not mask:
+            return []
+
+        # Различных масок немного: список правил по маске считается один раз на набор правил
+        selected = cls.mask_rules.get(mask)
+        if selected is None or selected[0] is not rules:
+            selected = (rules, [rule for rule in rules if mask & (1 << rule.bit)])
+            cls.mask_rules[mask] = selected
+
+        reasons = []
+        for rule in selected[1]:
+            if not rule.templated:
+                reasons.append(rule.message)
+            elif rule.feature == PROBABILITY_FEATURE:
+                reasons.append(rule.message.format(value=probability))
+            else:
+                reasons.append(rule.message.format(value=features.get(rule.feature, rule.default)))
+        return reasons
+
+    @classmethod
+    def explain(cls, records: List[Dict], probabilities: Sequence[float]) -> Tuple[List[List[str]], List[int]]:
+        """(текст причин, маски причин) по строкам: маска сохраняется в reason_mask как есть"""
+        masks = cls.evaluate_records(records, probabilities).tolist()
+        rules = cls.get_rules()
+        reasons = [
+            cls._render(rules, mask, record, probability)
+            for mask, record, probability in zip(masks, records, probabilities)
+        ]
+        return reasons, masks
+
+    @classmethod
+    def bit_for_code(cls, code: str) -> Optional[int]:
+        for rule in cls.get_rules():
+            if rule.code == code:
+                return rule.bit
+        return None
+
+    @classmethod
+    def codes_for_mask(cls, mask: int) -> List[str]:
+        return [rule.code for rule in cls.get_rules() if int(mask) & (1 << rule.bit)]
+
+    @classmethod
+    def mask_from_reasons(cls, reasons: Optional[List[str]]) -> int:
+        """Маска по сохранённому тексту причин (только для строк без reason_mask): сообщение
+        сверяется с шаблоном до {value}
+        """
+        mask = 0
+        for reason in reasons or []:
+            for rule in cls.get_rules():
+                prefix = rule.message.split("{", 1)[0]
+                if reason.startswith(prefix) if rule.templated else reason == rule.message:
+                    mask |= 1 << rule.bit
+                    break
+        return mask
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        rules = cls.get_rules()
+        return {
+            "path": str(cls.rules_path()),
+            "loaded_at": cls.loaded_at,
+            "rules": [rule.to_dict() for rule in rules],
+        }
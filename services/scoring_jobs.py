@@ -0,0 +1,637 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, inspect, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from api.responses import loads
+from api.schemas import JobStatus, ScoringJobRequest
+from core.config import settings
+from core.database import SessionLocal
+from ml.dataset_loader import DATA_DIR, PROJECT_ROOT
+from ml.model_loader import ModelLoader
+from models.database import ScoringJob, ScoringJobChunk, ScoringJobResult
+from services.columnar_scoring import ColumnarScoring
+from services.job_manager import BackgroundJob, JobManager
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SCORING_JOB_KIND = "scoring"
+INLINE_SOURCE = "inline"
+
+ACTIVE_STATUSES = (JobStatus.PENDING.value, JobStatus.RUNNING.value)
+
+
+class ScoringJobService:
+    """Пакетный скоринг задачами: вход делится на пачки, пачки считает пул процессов
+    ml.bulk_scoring, каждая готовая пачка пишется в БД вместе с результатами одной транзакцией.
+
+    Состояние задачи живёт в БД: после перезапуска сервиса незаконченные задачи продолжаются
+    с первой незаписанной пачки, после падения процесса-воркера пул пересоздаётся.
+
+    Задачу считает один процесс сервиса — владелец с арендой на SCORING_JOB_LEASE_SECONDS,
+    которую он продлевает. Задачу без живого владельца (аренда истекла, процесс на этом хосте
+    завершился или отпустил её при остановке) забирает любой воркер одним UPDATE по
+    прочитанным владельцу и сроку: из одновременных попыток проходит одна. Запись пачек
+    и статуса идёт только от текущего владельца.
+    """
+
+    # Создаётся в цикле событий при первом запуске: одновременно считаются SCORING_JOB_MAX_CONCURRENT задач
+    semaphore: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def ensure_schema(engine: Engine):
+        """create_all не добавляет колонки в существующие таблицы — колонки аренды добавляются здесь"""
+        columns = {column["name"] for column in inspect(engine).get_columns("scoring_jobs")}
+        missing = [
+            (name, kind) for name, kind in (("owner", "VARCHAR"), ("lease_expires_at", "TIMESTAMP"))
+            if name not in columns
+        ]
+        if not missing:
+            return
+
+        with engine.begin() as connection:
+            for name, kind in missing:
+                connection.execute(text(f"ALTER TABLE scoring_jobs ADD COLUMN {name} {kind}"))
+        print("В таблицу scoring_jobs добавлены колонки аренды")
+
+    # (pid, владелец): пересоздаётся после fork, чтобы у воркеров serve.py были свои значения
+    _owner: Tuple[int, str] = (0, "")
+
+    @classmethod
+    def owner_id(cls) -> str:
+        """Владелец задач — процесс: хост, pid и случайная метка. Метка отличает процесс,
+        перезапущенный с тем же pid (например, pid 1 в контейнере), от прежнего владельца
+        """
+        pid = os.getpid()
+        if cls._owner[0] != pid:
+            cls._owner = (pid, f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:12]}")
+        return cls._owner[1]
+
+    @staticmethod
+    def lease_until() -> datetime:
+        return datetime.utcnow() + timedelta(seconds=settings.SCORING_JOB_LEASE_SECONDS)
+
+    @staticmethod
+    def owner_gone(owner: Optional[str], lease_expires_at: Optional[datetime], now: datetime) -> bool:
+        if owner is None or lease_expires_at is None or lease_expires_at < now:
+            return True
+        # Владелец на этом же хосте проверяется сразу: перезапущенный воркер не ждёт конца аренды
+        host, _, rest = owner.partition(":")
+        pid = rest.partition(":")[0]
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            # Тот же pid с другой меткой — прежний процесс, убитый без освобождения аренды
+            return owner != ScoringJobService.owner_id()
+        try:
+            os.kill(int(pid), 0)
+            return False
+        except OSError:
+            return True
+
+    @staticmethod
+    def input_dir() -> Path:
+        return PROJECT_ROOT / settings.SCORING_JOB_INPUT_DIR
+
+    @staticmethod
+    def resolve_source(source: str) -> Optional[Path]:
+        """data — обучающий набор целиком (None), иначе CSV/Parquet внутри data/"""
+        if source == "data":
+            return None
+
+        path = (DATA_DIR / source).resolve()
+        if DATA_DIR.resolve() not in path.parents or path.suffix not in (".csv", ".parquet"):
+            raise HTTPException(status_code=400, detail="Источник: data, inline или файл .csv/.parquet из data/")
+        if not path.exists():
+            raise HTTPException(status_code=404, detail=f"Файл не найден: {source}")
+        return path
+
+    @staticmethod
+    def count_rows(source: str, path: Optional[Path]) -> int:
+        if path is None:
+            from ml.dataset_loader import DatasetLoader
+            return len(DatasetLoader.load_scoring_frame())
+
+        if path.suffix == ".parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(path).metadata.num_rows
+
+        # Строки файла без заголовка; переводы строк внутри кавычек не ожидаются
+        lines = 0
+        last = b"\n"
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                lines += block.count(b"\n")
+                last = block[-1:]
+        return lines + (last != b"\n") - 1
+
+    @classmethod
+    def create(cls, db: Session, payload: Dict) -> ScoringJob:
+        """Проверить параметры, сохранить вход inline-задачи и запись задачи; вызывается в потоке"""
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=422, detail="Ожидается объект JSON")
+        # columns разбираются по массивам ColumnarScoring.parse, pydantic проверяет только параметры
+        try:
+            options = ScoringJobRequest(**{key: value for key, value in payload.items() if key != "columns"})
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+        if options.model_name and options.model_name not in ModelLoader.models:
+            raise HTTPException(status_code=400, detail=f"Модель {options.model_name} не загружена")
+
+        job = ScoringJob(
+            status=JobStatus.PENDING.value,
+            source=options.source,
+            chunk_size=options.chunk_size or settings.SCORING_JOB_CHUNK_SIZE,
+            model_name=options.model_name,
+            threshold=options.threshold if options.threshold is not None else settings.DEFAULT_FRAUD_THRESHOLD,
+            owner=cls.owner_id(),
+            lease_expires_at=cls.lease_until(),
+        )
+
+        if options.source == INLINE_SOURCE:
+            if "columns" not in payload:
+                raise HTTPException(status_code=422, detail="Для source=inline нужны columns: массив на признак")
+            batch = ColumnarScoring.parse(payload["columns"])
+            # Как в /batch/columnar: пропущенные поведенческие признаки — из кэша профилей по client_id,
+            # скорости — на момент постановки; результаты задачи не попадают в транзакции, поэтому без учёта в индексе
+            ColumnarScoring.resolve_profiles(batch)
+            ColumnarScoring.resolve_velocity(batch, observe=False)
+
+            job.job_id = str(uuid.uuid4())
+            input_path = cls.input_dir() / f"{job.job_id}.csv"
+            input_path.parent.mkdir(parents=True, exist_ok=True)
+            import pandas as pd
+
+            frame = pd.DataFrame({**batch.features, **batch.ids})
+            frame.to_csv(input_path, index=False)
+            job.input_path = str(input_path)
+            job.total_rows = batch.rows
+        else:
+            path = cls.resolve_source(options.source)
+            job.input_path = str(path) if path is not None else None
+
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    @classmethod
+    def start(cls, job: ScoringJob) -> BackgroundJob:
+        config = {
+            "source": job.source,
+            "chunk_size": job.chunk_size,
+            "model_name": job.model_name,
+            "threshold": job.threshold,
+        }
+        return JobManager.submit(SCORING_JOB_KIND, config, lambda background: cls.run(background), job.job_id)
+
+    @classmethod
+    def claim(cls, db: Session, job: ScoringJob) -> bool:
+        """Забрать задачу, если владелец и срок аренды с момента чтения не менялись"""
+        query = db.query(ScoringJob).filter(ScoringJob.id == job.id, ScoringJob.status.in_(ACTIVE_STATUSES))
+        for column, value in ((ScoringJob.owner, job.owner), (ScoringJob.lease_expires_at, job.lease_expires_at)):
+            query = query.filter(column.is_(None) if value is None else column == value)
+        claimed = query.update(
+            {ScoringJob.owner: cls.owner_id(), ScoringJob.lease_expires_at: cls.lease_until()},
+            synchronize_session=False
+        )
+        db.commit()
+        return claimed == 1
+
+    @classmethod
+    def claim_orphaned(cls) -> List[ScoringJob]:
+        """Незаконченные задачи без живого владельца — этому процессу; вызывается из потока"""
+        owner = cls.owner_id()
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            candidates = db.query(ScoringJob).filter(
+                ScoringJob.status.in_(ACTIVE_STATUSES),
+                or_(ScoringJob.owner.is_(None), ScoringJob.owner != owner)
+            ).order_by(ScoringJob.id).all()
+
+            claimed = []
+            for job in candidates:
+                if cls.owner_gone(job.owner, job.lease_expires_at, now) and cls.claim(db, job):
+                    db.refresh(job)
+                    db.expunge(job)
+                    claimed.append(job)
+            return claimed
+        finally:
+            db.close()
+
+    @classmethod
+    def renew_leases(cls, job_ids: List[str]) -> int:
+        """Продлить аренду задач, которые в этом процессе считаются или ждут очереди"""
+        if not job_ids:
+            return 0
+        db = SessionLocal()
+        try:
+            renewed = db.query(ScoringJob).filter(
+                ScoringJob.job_id.in_(job_ids),
+                ScoringJob.owner == cls.owner_id(),
+                ScoringJob.status.in_(ACTIVE_STATUSES)
+            ).update({ScoringJob.lease_expires_at: cls.lease_until()}, synchronize_session=False)
+            db.commit()
+            return renewed
+        finally:
+            db.close()
+
+    @classmethod
+    def release_leases(cls) -> int:
+        """При остановке: незаконченные задачи процесса сразу доступны остальным воркерам"""
+        db = SessionLocal()
+        try:
+            released = db.query(ScoringJob).filter(
+                ScoringJob.owner == cls.owner_id(),
+                ScoringJob.status.in_(ACTIVE_STATUSES)
+            ).update({ScoringJob.owner: None, ScoringJob.lease_expires_at: None}, synchronize_session=False)
+            db.commit()
+            return released
+        finally:
+            db.close()
+
+    @classmethod
+    async def maintain_leases(cls):
+        """В каждом воркере: продление своей аренды и подхват задач, чей владелец пропал"""
+        while True:
+            try:
+                # Только задачи с живой задачей asyncio: упавший без записи статуса запуск
+                # не держит аренду бесконечно
+                running = [job.job_id for job in JobManager.list(SCORING_JOB_KIND) if job.is_active]
+                await asyncio.to_thread(cls.renew_leases, running)
+                jobs = await asyncio.to_thread(cls.claim_orphaned)
+                for job in jobs:
+                    cls.start(job)
+                if jobs:
+                    print(f"Продолжены задачи скоринга: {len(jobs)}")
+            except Exception as e:
+                print(f"Ошибка аренды задач скоринга: {e}")
+            await asyncio.sleep(settings.SCORING_JOB_LEASE_SECONDS / 3)
+
+    @staticmethod
+    def _load(job_id: str) -> Tuple[ScoringJob, set]:
+        db = SessionLocal()
+        try:
+            job = db.query(ScoringJob).filter(ScoringJob.job_id == job_id).one()
+            done = {index for (index,) in db.query(ScoringJobChunk.chunk_index).filter(ScoringJobChunk.job_id == job_id)}
+            db.expunge(job)
+            return job, done
+        finally:
+            db.close()
+
+    @classmethod
+    def _update(cls, job_id: str, **values) -> bool:
+        """Изменить задачу, если этот процесс всё ещё её владелец и она не закончена:
+        отмену, записанную другим воркером, не перетирает ни RUNNING, ни COMPLETED
+        """
+        db = SessionLocal()
+        try:
+            updated = db.query(ScoringJob).filter(
+                ScoringJob.job_id == job_id,
+                ScoringJob.owner == cls.owner_id(),
+                ScoringJob.status.in_(ACTIVE_STATUSES)
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return updated == 1
+        finally:
+            db.close()
+
+    @staticmethod
+    def _id_column(result: "pd.DataFrame", *names: str) -> Optional["pd.Series"]:
+        for name in names:
+            if name in result:
+                return result[name].astype(str).where(result[name].notna(), None)
+        return None
+
+    @classmethod
+    def _checkpoint(cls, job_id: str, index: int, offset: int, result: "pd.DataFrame",
+                    seconds: float) -> Tuple[int, str]:
+        """Результаты пачки, отметка о ней и счётчики задачи — одной транзакцией.
+
+        Возвращает и текущий статус: отмену могли записать в БД из другого воркера.
+        Статус None — аренду забрал другой процесс, пачка не записана.
+        """
+        import pandas as pd
+
+        frame = pd.DataFrame({
+            "row_number": np.arange(offset, offset + len(result)),
+            "transaction_id": cls._id_column(result, "transaction_id", "docno"),
+            "client_id": cls._id_column(result, "client_id"),
+            "fraud_probability": result["fraud_probability"],
+            "is_fraud": result["is_fraud"],
+            "risk_level": result["risk_level"],
+            "reason_mask": result["reason_mask"],
+            "reasons": result["reasons"],
+            "model_version": result["model_version"],
+        })
+        rows = frame.astype(object).where(frame.notna(), None).to_dict("records")
+        fraud = int(result["is_fraud"].sum())
+
+        db = SessionLocal()
+        try:
+            # Счётчики — первыми и только у владельца: без аренды пачка не пишется
+            owned = db.query(ScoringJob).filter(
+                ScoringJob.job_id == job_id,
+                ScoringJob.owner == cls.owner_id()
+            ).update({
+                ScoringJob.rows_done: ScoringJob.rows_done + len(rows),
+                ScoringJob.chunks_done: ScoringJob.chunks_done + 1,
+                ScoringJob.fraud_detected: ScoringJob.fraud_detected + fraud,
+            })
+            if not owned:
+                db.rollback()
+                return 0, None
+            db.execute(insert(ScoringJobResult), [{"job_id": job_id, **row} for row in rows])
+            db.add(ScoringJobChunk(job_id=job_id, chunk_index=index, rows=len(rows), seconds=round(seconds, 3)))
+            db.commit()
+            status = db.query(ScoringJob.status).filter(ScoringJob.job_id == job_id).scalar()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return len(rows), status
+
+    @staticmethod
+    def _new_pool(job: ScoringJob) -> ProcessPoolExecutor:
+        from ml.bulk_scoring import _init_worker
+
+        # spawn: fork процесса с циклом событий и фоновыми потоками может унаследовать захваченные блокировки
+        return ProcessPoolExecutor(
+            max_workers=settings.SCORING_JOB_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(job.model_name, job.threshold)
+        )
+
+    @classmethod
+    async def run(cls, background: BackgroundJob):
+        if cls.semaphore is None:
+            cls.semaphore = asyncio.Semaphore(settings.SCORING_JOB_MAX_CONCURRENT)
+
+        async with cls.semaphore:
+            if background.cancelled:
+                return
+            try:
+                await cls._run(background)
+            except asyncio.CancelledError:
+                # Остановка сервиса: статус running в БД остаётся, задача продолжится при старте
+                raise
+            except Exception as e:
+                await asyncio.to_thread(cls._update, background.job_id, status=JobStatus.FAILED.value,
+                                        error=str(e), finished_at=datetime.utcnow())
+                raise
+
+    @classmethod
+    async def _run(cls, background: BackgroundJob):
+        loop = asyncio.get_running_loop()
+        job_id = background.job_id
+        job, done = await asyncio.to_thread(cls._load, job_id)
+        if job.status not in ACTIVE_STATUSES or job.owner != cls.owner_id():
+            return
+
+        path = Path(job.input_path) if job.input_path else None
+        if job.total_rows is None:
+            job.total_rows = await asyncio.to_thread(cls.count_rows, job.source, path)
+        await asyncio.to_thread(
+            cls._update, job_id, status=JobStatus.RUNNING.value, total_rows=job.total_rows,
+            started_at=job.started_at or datetime.utcnow()
+        )
+
+        progress = background.progress
+        progress.update(
+            total_rows=job.total_rows,
+            rows_done=job.rows_done or 0,
+            chunks_done=len(done),
+            chunks_resumed=len(done),
+            chunks_in_flight=0,
+            rows_per_second=0.0,
+            eta_seconds=None,
+            worker_restarts=job.worker_restarts or 0,
+        )
+
+        from ml.bulk_scoring import iter_input_chunks, score_job_chunk
+
+        chunks = iter_input_chunks(str(path) if path is not None else "data", job.chunk_size)
+        max_pending = settings.SCORING_JOB_WORKERS * 2
+        # future -> (номер пачки, номер первой строки, пачка, время отправки)
+        pending: Dict[asyncio.Future, Tuple[int, int, pd.DataFrame, float]] = {}
+        next_index = 0
+        offset = 0
+        exhausted = False
+        started = time.perf_counter()
+        rows_this_run = 0
+
+        pool = cls._new_pool(job)
+        try:
+            while True:
+                broken: List[Tuple[int, int, pd.DataFrame, float]] = []
+
+                # Не читаем вход дальше, чем успевают обработать воркеры
+                while not exhausted and len(pending) < max_pending and not background.cancelled:
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    index, chunk_offset = next_index, offset
+                    next_index += 1
+                    offset += len(chunk)
+                    if index in done:
+                        continue
+                    entry = (index, chunk_offset, chunk, time.perf_counter())
+                    try:
+                        pending[loop.run_in_executor(pool, score_job_chunk, index, chunk)] = entry
+                    except BrokenProcessPool:
+                        # Пул сломался между пачками: отправка падает сразу
+                        broken.append(entry)
+                        break
+
+                progress["chunks_in_flight"] = len(pending)
+                if not broken:
+                    if not pending or background.cancelled:
+                        break
+
+                    finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in finished:
+                        index, chunk_offset, chunk, submitted = pending.pop(future)
+                        try:
+                            _, result = future.result()
+                        except BrokenProcessPool:
+                            broken.append((index, chunk_offset, chunk, submitted))
+                            continue
+
+                        rows, status = await asyncio.to_thread(
+                            cls._checkpoint, job_id, index, chunk_offset, result, time.perf_counter() - submitted
+                        )
+                        if status is None:
+                            print(f"Задача скоринга {job_id}: аренду забрал другой процесс, задача остановлена")
+                            background.cancel_event.set()
+                            continue
+                        if status == JobStatus.CANCELLED.value:
+                            background.cancel_event.set()
+                        rows_this_run += rows
+                        progress["rows_done"] += rows
+                        progress["chunks_done"] += 1
+                        cls._update_rates(progress, rows_this_run, time.perf_counter() - started)
+
+                if broken:
+                    pool, pending = await cls._restart_pool(job, pool, pending, broken, progress, loop)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if background.cancelled:
+            return
+
+        await asyncio.to_thread(
+            cls._update, job_id, status=JobStatus.COMPLETED.value, total_rows=progress["rows_done"],
+            finished_at=datetime.utcnow()
+        )
+        progress.update(total_rows=progress["rows_done"], eta_seconds=0.0, chunks_in_flight=0)
+
+    @classmethod
+    async def _restart_pool(cls, job: ScoringJob, pool: ProcessPoolExecutor, pending: Dict, broken: List,
+                            progress: Dict, loop) -> Tuple[ProcessPoolExecutor, Dict]:
+        """Воркер упал: остальные пачки старого пула тоже потеряны — всё незаписанное уходит в новый пул"""
+        from ml.bulk_scoring import score_job_chunk
+
+        job.worker_restarts = (job.worker_restarts or 0) + 1
+        progress["worker_restarts"] = job.worker_restarts
+        await asyncio.to_thread(cls._update, job.job_id, worker_restarts=job.worker_restarts)
+        if job.worker_restarts > settings.SCORING_JOB_MAX_WORKER_RESTARTS:
+            raise RuntimeError(f"Процесс-воркер падал {job.worker_restarts} раз, задача остановлена")
+
+        print(f"Задача скоринга {job.job_id}: процесс-воркер упал, пул пересоздаётся")
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = cls._new_pool(job)
+
+        resubmitted = {}
+        for index, chunk_offset, chunk, _ in broken + list(pending.values()):
+            future = loop.run_in_executor(pool, score_job_chunk, index, chunk)
+            resubmitted[future] = (index, chunk_offset, chunk, time.perf_counter())
+        return pool, resubmitted
+
+    @staticmethod
+    def _update_rates(progress: Dict, rows: int, elapsed: float):
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        progress["rows_per_second"] = round(rate, 1)
+        remaining = max(0, (progress["total_rows"] or 0) - progress["rows_done"])
+        progress["eta_seconds"] = round(remaining / rate, 1) if rate > 0 else None
+
+    @classmethod
+    def cancel(cls, db: Session, job: ScoringJob):
+        """Статус в БД — до отмены задачи: иначе прерванную задачу не отличить от остановки сервиса"""
+        if job.status in ACTIVE_STATUSES:
+            job.status = JobStatus.CANCELLED.value
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        JobManager.cancel(job.job_id)
+
+    @classmethod
+    def purge(cls, db: Session, job: ScoringJob):
+        db.query(ScoringJobResult).filter(ScoringJobResult.job_id == job.job_id).delete(synchronize_session=False)
+        db.query(ScoringJobChunk).filter(ScoringJobChunk.job_id == job.job_id).delete(synchronize_session=False)
+        if job.source == INLINE_SOURCE and job.input_path:
+            Path(job.input_path).unlink(missing_ok=True)
+        db.delete(job)
+        db.commit()
+
+    @staticmethod
+    def available_rows(db: Session, job: ScoringJob) -> int:
+        """Строки от начала входа, все пачки которых записаны: пачки завершаются не по порядку,
+        а курсор выдачи — номер строки, поэтому отдаётся только сплошное начало"""
+        if job.status == JobStatus.COMPLETED.value:
+            return job.rows_done or 0
+
+        rows = 0
+        expected = 0
+        chunks = db.query(ScoringJobChunk.chunk_index, ScoringJobChunk.rows) \
+            .filter(ScoringJobChunk.job_id == job.job_id).order_by(ScoringJobChunk.chunk_index)
+        for index, count in chunks:
+            if index != expected:
+                break
+            rows += count
+            expected += 1
+        return rows
+
+    @classmethod
+    def get_results(cls, db: Session, job: ScoringJob, after: int, limit: int,
+                    fraud_only: bool = False) -> Tuple[List[Dict], Optional[int]]:
+        """Страница результатов с номером строки больше after; (строки, курсор следующей страницы)"""
+        available = cls.available_rows(db, job)
+        query = db.query(ScoringJobResult).filter(
+            ScoringJobResult.job_id == job.job_id,
+            ScoringJobResult.row_number > after,
+            ScoringJobResult.row_number < available,
+        )
+        if fraud_only:
+            query = query.filter(ScoringJobResult.is_fraud.is_(True))
+        rows = query.order_by(ScoringJobResult.row_number).limit(limit).all()
+
+        results = [
+            {
+                "row_number": row.row_number,
+                "transaction_id": row.transaction_id,
+                "client_id": row.client_id,
+                "fraud_probability": row.fraud_probability,
+                "is_fraud": row.is_fraud,
+                "risk_level": row.risk_level,
+                "reason_mask": row.reason_mask,
+                "reasons": loads(row.reasons),
+                "model_version": row.model_version,
+            }
+            for row in rows
+        ]
+        next_after = rows[-1].row_number if len(rows) == limit else None
+        return results, next_after
+
+    @staticmethod
+    def to_dict(job: ScoringJob) -> Dict:
+        background = JobManager.get(job.job_id)
+        live = dict(background.progress) if background is not None and background.is_active else {}
+        total = job.total_rows
+        rows_done = live.get("rows_done", job.rows_done or 0)
+        rate = live.get("rows_per_second")
+        if rate is None and job.started_at and job.finished_at:
+            # Для завершённой задачи — средняя скорость, включая время простоя между перезапусками
+            elapsed = (job.finished_at - job.started_at).total_seconds()
+            rate = round(rows_done / elapsed, 1) if elapsed > 0 else None
+        return {
+            "job_id": job.job_id,
+            "status": job.status,
+            "source": job.source,
+            "chunk_size": job.chunk_size,
+            "model_name": job.model_name,
+            "threshold": job.threshold,
+            "total_rows": total,
+            "rows_done": rows_done,
+            "chunks_done": live.get("chunks_done", job.chunks_done or 0),
+            "fraud_detected": job.fraud_detected or 0,
+            "progress": round(rows_done / total, 4) if total else None,
+            "rows_per_second": rate,
+            "eta_seconds": live.get("eta_seconds"),
+            "chunks_in_flight": live.get("chunks_in_flight", 0),
+            "chunks_resumed": live.get("chunks_resumed", 0),
+            "worker_restarts": job.worker_restarts or 0,
+            # Для файлов и БД скорости берутся только из колонок входа, VelocityIndex не используется
+            "velocity_resolved": job.source == INLINE_SOURCE,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
@@ -4,10 +4,21 @@ import time
 import asyncio
 import uuid
 from datetime import datetime
+from core.config import settings
 from core.database import SessionLocal
+from core.token_bucket import TokenBucket
+from services.velocity_index import VELOCITY_FEATURE_NAMES, VelocityIndex
 from api.schemas import TransactionType
 
 
+# Сценарные вероятности потока: (fraud_probability, is_fraud)
+STREAM_SCENARIO_SCORES = {
+    TransactionType.NORMAL: (0.05, False),
+    TransactionType.FRAUD: (0.95, True),
+    TransactionType.SUSPICIOUS: (0.6, True),
+}
+
+
 class SimulationService:
 
     @staticmethod
@@ -217,65 +228,114 @@ class SimulationService:
 
 
     @staticmethod
-    async def stream_transactions(transactions_per_minute: int,
+    async def stream_transactions(job,
+                                  transactions_per_minute: int,
                                   duration_minutes: int,
-                                  fraud_ratio: float):
+                                  fraud_ratio: float,
+                                  transaction_type: TransactionType = TransactionType.MIXED,
+                                  batch_size: int = 500,
+                                  persist: bool = True):
         from ml.predictor import FraudPredictor
-        from services.fraud_service import FraudService
-        from api.schemas import TransactionPredictRequest, TransactionPredictResponse
-        from core.database import SessionLocal
 
         predictor = FraudPredictor()
-        interval = 60.0 / transactions_per_minute
-        end_time = time.time() + (duration_minutes * 60)
-
-        db = SessionLocal()
-        try:
-            while time.time() < end_time:
-                trans_data = SimulationService.generate_transactions(
-                    1,
-                    TransactionType.MIXED,
-                    fraud_ratio
-                )[0]
-
-                prediction = predictor.predict_single(trans_data)
-                base_proba = prediction["fraud_probability"]
-
-                scenario_type = trans_data.get("scenario_type", TransactionType.MIXED)
-
-                if scenario_type == TransactionType.NORMAL:
-                    proba = 0.05
-                    is_fraud = False
-                elif scenario_type == TransactionType.FRAUD:
-                    proba = 0.95
-                    is_fraud = True
-                elif scenario_type == TransactionType.SUSPICIOUS:
-                    proba = 0.6
-                    is_fraud = True
-                else:
-                    proba = base_proba
-                    is_fraud = base_proba >= predictor.threshold
-
-                risk_level = FraudService.determine_risk_level(proba)
-                reasons = FraudService.generate_fraud_reasons(trans_data, proba)
-
-                request = TransactionPredictRequest(**{k: v for k, v in trans_data.items() if k != "scenario_type"})
+        rate = transactions_per_minute / 60.0
+        total = transactions_per_minute * duration_minutes
+
+        # Запас бакета не больше секунды трафика: после задержки поток догоняет
+        # расписание, но не выстреливает всё накопленное разом
+        bucket = TokenBucket(rate=rate, capacity=max(batch_size, rate), initial=0)
+
+        progress = job.progress
+        progress.update(
+            total_expected=total,
+            generated=0,
+            persisted=0,
+            fraud_detected=0,
+            target_rate_per_second=rate,
+            achieved_rate_per_second=0.0,
+        )
+        started = time.monotonic()
+
+        while progress["generated"] < total and not job.cancelled:
+            wanted = min(batch_size, total - progress["generated"])
+            wait = bucket.time_until(wanted)
+            if wait > 0:
+                # Не держим уже накопленные токены дольше максимальной задержки пачки
+                await asyncio.sleep(min(wait, max(settings.STREAM_MAX_BATCH_WAIT_SECONDS, 1.0 / rate)))
+
+            count = bucket.take(wanted)
+            if count == 0:
+                continue
+
+            batch = await asyncio.to_thread(
+                SimulationService._process_stream_batch,
+                predictor, count, transaction_type, fraud_ratio, persist
+            )
+
+            progress["generated"] += count
+            progress["persisted"] += batch["persisted"]
+            progress["fraud_detected"] += batch["fraud_detected"]
+            elapsed = time.monotonic() - started
+            progress["elapsed_seconds"] = round(elapsed, 3)
+            progress["achieved_rate_per_second"] = round(progress["generated"] / elapsed, 2) if elapsed > 0 else 0.0
+
+    @staticmethod
+    def _process_stream_batch(predictor,
+                              count: int,
+                              transaction_type: TransactionType,
+                              fraud_ratio: float,
+                              persist: bool) -> Dict:
+        from services.fraud_service import FraudService
+        from api.schemas import TransactionPredictResponse
+
+        transactions = SimulationService.generate_transactions(count, transaction_type, fraud_ratio)
+        # Скорости как в /batch: в VelocityIndex учитываются только сохраняемые в БД транзакции
+        velocity = VelocityIndex.resolve_many(
+            [trans.get("client_id") for trans in transactions],
+            [trans.get("destination_id") for trans in transactions],
+            [trans["amount"] for trans in transactions],
+            observe=persist
+        )
+        for trans, row in zip(transactions, velocity.tolist()):
+            trans.update(zip(VELOCITY_FEATURE_NAMES, row))
+        predictions = predictor.predict_batch(transactions)
+
+        scores = [
+            STREAM_SCENARIO_SCORES.get(
+                trans_data.pop("scenario_type", TransactionType.MIXED),
+                (prediction["fraud_probability"], prediction["is_fraud"])
+            )
+            for trans_data, prediction in zip(transactions, predictions)
+        ]
+        fraud_detected = sum(int(is_fraud) for _, is_fraud in scores)
+
+        records = []
+        if persist:
+            reasons_list, masks = FraudService.generate_fraud_reasons_batch(
+                transactions, [proba for proba, _ in scores]
+            )
+
+            for trans_data, (proba, is_fraud), reasons, mask in zip(transactions, scores, reasons_list, masks):
                 response = TransactionPredictResponse(
                     transaction_id=str(uuid.uuid4()),
                     fraud_probability=proba,
                     is_fraud=is_fraud,
-                    risk_level=risk_level,
+                    risk_level=FraudService.determine_risk_level(proba),
                     reasons=reasons,
                     model_version="1.0",
                     timestamp=datetime.utcnow()
                 )
+                records.append(FraudService.build_transaction_record(trans_data, response, mask))
 
-                FraudService.save_transaction(db, request, response)
-
-                await asyncio.sleep(interval)
-        finally:
-            db.close()
+        persisted = 0
+        if records:
+            db = SessionLocal()
+            try:
+                persisted = FraudService.save_transactions_bulk(db, records)
+            finally:
+                db.close()
 
+        return {"persisted": persisted, "fraud_detected": fraud_detected}
 
     @staticmethod
     def get_templates() -> List[Dict]:
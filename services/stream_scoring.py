@@ -0,0 +1,190 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Tuple
+
+from api.responses import dumps, loads
+from core.config import settings
+from core.database import SessionLocal
+from core.request_profiler import RequestProfiler
+from services.columnar_scoring import ColumnarScoring
+from services.fraud_service import FraudService
+from services.overload import OverloadGuard, ScoringTicket
+from services.rules_engine import RulesEngine
+
+_END = object()
+
+
+class StreamScoring:
+    """Скоринг NDJSON-потока с постоянной памятью.
+
+    Тело запроса читается отдельной задачей в ограниченную очередь кусков: если скоринг или
+    клиент, читающий ответ, не успевают, чтение останавливается и TCP притормаживает отправителя.
+    Строки копятся в микропачку до STREAM_SCORING_BATCH_ROWS или STREAM_MAX_BATCH_WAIT_SECONDS,
+    пачка оценивается колонками в потоке и сразу уходит клиентом строками NDJSON.
+    """
+
+    @staticmethod
+    async def _read(chunks: AsyncIterator[bytes], queue: asyncio.Queue):
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    await queue.put(chunk)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    @staticmethod
+    def _score_lines(lines: List[bytes], first_line: int, ticket: ScoringTicket,
+                     persist: bool) -> Tuple[bytes, List[Dict], Dict[str, int]]:
+        """Микропачка строк -> (строки ответа, записи для БД, счётчики)"""
+        errors: Dict[int, str] = {}
+        parsed = []
+        for index, line in enumerate(lines):
+            try:
+                parsed.append(loads(line))
+            except ValueError:
+                parsed.append(None)
+                errors[index] = "Некорректный JSON"
+
+        batch, accepted, row_errors = ColumnarScoring.from_records(parsed)
+        for index, message in row_errors.items():
+            errors.setdefault(index, message)
+
+        results: Dict[int, Dict] = {}
+        records: List[Dict] = []
+        fraud = 0
+        if batch.rows:
+            ColumnarScoring.resolve_profiles(batch)
+            ColumnarScoring.resolve_velocity(batch, observe=persist)
+            probas, masks, model_version = ColumnarScoring.score(batch, ticket)
+            is_fraud = probas >= settings.DEFAULT_FRAUD_THRESHOLD
+            risk_levels = FraudService.determine_risk_levels(probas)
+            fraud = int(is_fraud.sum())
+
+            if persist:
+                records = ColumnarScoring.build_records(batch, probas, is_fraud, risk_levels, masks, model_version)
+
+            client_ids = batch.ids.get("client_id")
+            for row, index in enumerate(accepted.tolist()):
+                mask = int(masks[row])
+                result = {
+                    "line": first_line + index,
+                    "client_id": None if client_ids is None else client_ids[row],
+                    "fraud_probability": float(probas[row]),
+                    "is_fraud": bool(is_fraud[row]),
+                    "risk_level": risk_levels[row],
+                    "reason_mask": mask,
+                    "reasons": RulesEngine.codes_for_mask(mask) if mask else [],
+                    "model_version": model_version,
+                }
+                if persist:
+                    result["transaction_id"] = records[row]["transaction_id"]
+                results[index] = result
+
+        for index, message in errors.items():
+            results[index] = {"line": first_line + index, "error": message}
+
+        output = b"".join(dumps(results[index]) + b"\n" for index in range(len(lines)))
+        return output, records, {"scored": batch.rows, "errors": len(errors), "fraud_detected": fraud}
+
+    @staticmethod
+    def _save(records: List[Dict]) -> int:
+        db = SessionLocal()
+        try:
+            with RequestProfiler.stage("db_write"):
+                return FraudService.save_transactions_bulk(db, records)
+        finally:
+            db.close()
+
+    @classmethod
+    async def _persist(cls, records: List[Dict], ticket: ScoringTicket) -> int:
+        if not records:
+            return 0
+        if ticket.persist_now:
+            # Ожидание записи тоже притормаживает чтение входа
+            return await asyncio.to_thread(cls._save, records)
+        OverloadGuard.spill(records)
+        return 0
+
+    @classmethod
+    async def score_stream(cls, chunks: AsyncIterator[bytes], ticket: ScoringTicket,
+                           persist: bool) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.STREAM_SCORING_QUEUE_CHUNKS)
+        reader = asyncio.create_task(cls._read(chunks, queue))
+
+        started = time.perf_counter()
+        totals = {"lines": 0, "scored": 0, "errors": 0, "fraud_detected": 0, "persisted": 0}
+        pending: List[bytes] = []
+        to_persist: List[Dict] = []
+        tail = b""
+        flush_at = None
+
+        try:
+            done = False
+            while not done:
+                timeout = None if flush_at is None else max(0.0, flush_at - loop.time())
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    item = None
+
+                if isinstance(item, Exception):
+                    raise item
+                if item is _END:
+                    done = True
+                    if tail.strip():
+                        pending.append(tail)
+                    tail = b""
+                elif item is not None:
+                    tail += item
+                    *lines, tail = tail.split(b"\n")
+                    pending.extend(line for line in lines if line.strip())
+                    if len(tail) > settings.STREAM_SCORING_MAX_LINE_BYTES:
+                        yield dumps({
+                            "line": totals["lines"] + len(pending),
+                            "error": f"Строка длиннее {settings.STREAM_SCORING_MAX_LINE_BYTES} байт, поток прерван"
+                        }) + b"\n"
+                        return
+
+                if pending and flush_at is None:
+                    flush_at = loop.time() + settings.STREAM_MAX_BATCH_WAIT_SECONDS
+
+                # Полные пачки — сразу; неполную — по таймауту ожидания или в конце потока
+                while len(pending) >= settings.STREAM_SCORING_BATCH_ROWS or (pending and (item is None or done)):
+                    lines = pending[:settings.STREAM_SCORING_BATCH_ROWS]
+                    del pending[:settings.STREAM_SCORING_BATCH_ROWS]
+
+                    # В очереди OverloadGuard — только пачка в работе; время целого потока
+                    # зависит от клиента, EWMA строки обновляется по каждой пачке
+                    OverloadGuard.charge(ticket, len(lines))
+                    batch_started = time.perf_counter()
+                    output, records, counts = await asyncio.to_thread(
+                        cls._score_lines, lines, totals["lines"], ticket, persist
+                    )
+                    OverloadGuard.observe(ticket.kind, ticket.mode, time.perf_counter() - batch_started, len(lines))
+                    OverloadGuard.charge(ticket, 0)
+                    totals["lines"] += len(lines)
+                    for key, value in counts.items():
+                        totals[key] += value
+                    yield output
+
+                    to_persist.extend(records)
+                    if len(to_persist) >= settings.STREAM_PERSIST_BATCH_ROWS:
+                        totals["persisted"] += await cls._persist(to_persist, ticket)
+                        to_persist = []
+
+                if not pending:
+                    flush_at = None
+
+            totals["persisted"] += await cls._persist(to_persist, ticket)
+            yield dumps({
+                "summary": {
+                    **totals,
+                    "scoring_mode": ticket.mode,
+                    "seconds": round(time.perf_counter() - started, 3),
+                }
+            }) + b"\n"
+        finally:
+            reader.cancel()
+            OverloadGuard.release(ticket, measure=False)
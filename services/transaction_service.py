@@ -1,7 +1,8 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-from models.database import Transaction as DBTransaction
+from models.database import Transaction as DBTransaction, TransactionReason
+from services.reason_index import ReasonIndex
 
 
 class TransactionService:
@@ -15,7 +16,9 @@ class TransactionService:
             min_amount: Optional[float] = None,
             max_amount: Optional[float] = None,
             start_date: Optional[datetime] = None,
-            end_date: Optional[datetime] = None
+            end_date: Optional[datetime] = None,
+            reason_bit: Optional[int] = None,
+            until_id: Optional[int] = None
     ) -> List[DBTransaction]:
 
         query = db.query(DBTransaction)
@@ -38,6 +41,15 @@ class TransactionService:
         if end_date:
             query = query.filter(DBTransaction.created_at <= end_date)
 
+        if until_id is not None:
+            query = query.filter(DBTransaction.id <= until_id)
+
+        if reason_bit is not None:
+            # Поиск по индексу (reason_bit, transaction_id) вместо разбора JSON в каждой строке
+            query = query.filter(DBTransaction.transaction_id.in_(
+                db.query(TransactionReason.transaction_id).filter(TransactionReason.reason_bit == reason_bit)
+            ))
+
         query = query.order_by(DBTransaction.created_at.desc())
 
         transactions = query.offset(skip).limit(limit).all()
@@ -77,6 +89,7 @@ class TransactionService:
             "fraud_rate": (fraud_count / total) if total else 0,
             "avg_fraud_amount": float(avg_fraud_amount) if avg_fraud_amount else 0,
             "risk_distribution": risk_distribution,
+            "reason_counts": ReasonIndex.get_reason_counts(db, start_date),
             "period_start": start_date.isoformat(),
             "period_end": datetime.utcnow().isoformat()
         }
\ No newline at end of file
@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.database import Transaction as DBTransaction
+
+
+VELOCITY_WINDOWS = {
+    "1m": 60,
+    "10m": 600,
+    "1h": 3600,
+    "24h": 86400,
+}
+
+# Для клиента считаются разные получатели, для получателя — разные отправители
+VELOCITY_FEATURE_NAMES = [
+    f"{prefix}_{metric}_{window}"
+    for prefix, distinct in (("client", "distinct_destinations"), ("destination", "distinct_clients"))
+    for window in VELOCITY_WINDOWS
+    for metric in ("tx_count", "amount_sum", distinct)
+]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class VelocityState:
+    """Кольцевой буфер событий одного ключа и по указателю начала на каждое окно.
+
+    Окна сдвигаются вместе со временем, поэтому count/sum/distinct поддерживаются
+    инкрементально: каждое событие входит и выходит из окна ровно один раз.
+    """
+
+    __slots__ = ("events", "base", "heads", "counts", "sums", "distinct", "last_ts")
+
+    def __init__(self):
+        # (ts, amount, контрагент); base — абсолютный номер events[0]
+        self.events = deque()
+        self.base = 0
+        self.heads = [0] * len(VELOCITY_WINDOWS)
+        self.counts = [0] * len(VELOCITY_WINDOWS)
+        self.sums = [0.0] * len(VELOCITY_WINDOWS)
+        self.distinct = [{} for _ in VELOCITY_WINDOWS]
+        self.last_ts = 0.0
+
+    def add(self, ts: float, amount: float, counterparty: Optional[str]):
+        # Опоздавшие события ставятся в конец, чтобы буфер оставался упорядоченным
+        ts = max(ts, self.last_ts)
+        self.last_ts = ts
+        self.events.append((ts, amount, counterparty))
+
+        for w in range(len(VELOCITY_WINDOWS)):
+            self.counts[w] += 1
+            self.sums[w] += amount
+            if counterparty is not None:
+                self.distinct[w][counterparty] = self.distinct[w].get(counterparty, 0) + 1
+
+        self.advance(ts)
+
+    def advance(self, now: float):
+        end = self.base + len(self.events)
+
+        for w, span in enumerate(VELOCITY_WINDOWS.values()):
+            cutoff = now - span
+            head = self.heads[w]
+            distinct = self.distinct[w]
+
+            while head < end and self.events[head - self.base][0] <= cutoff:
+                _, amount, counterparty = self.events[head - self.base]
+                self.counts[w] -= 1
+                self.sums[w] -= amount
+                if counterparty is not None:
+                    distinct[counterparty] -= 1
+                    if distinct[counterparty] == 0:
+                        del distinct[counterparty]
+                head += 1
+
+            self.heads[w] = head
+
+        # Событие вне самого длинного окна больше не нужно ни одному окну
+        while self.base < self.heads[-1]:
+            self.events.popleft()
+            self.base += 1
+
+    def preview(self, prefix: str, distinct_name: str, amount: float,
+                counterparty: Optional[str]) -> Dict[str, float]:
+        """Снимок так, будто событие уже добавлено, без изменения буфера"""
+        result = self.snapshot(prefix, distinct_name)
+        for w, window in enumerate(VELOCITY_WINDOWS):
+            result[f"{prefix}_tx_count_{window}"] += 1.0
+            result[f"{prefix}_amount_sum_{window}"] = max(self.sums[w] + amount, 0.0)
+            if counterparty is not None and counterparty not in self.distinct[w]:
+                result[f"{prefix}_{distinct_name}_{window}"] += 1.0
+        return result
+
+    def snapshot(self, prefix: str, distinct_name: str) -> Dict[str, float]:
+        result = {}
+        for w, window in enumerate(VELOCITY_WINDOWS):
+            result[f"{prefix}_tx_count_{window}"] = float(self.counts[w])
+            result[f"{prefix}_amount_sum_{window}"] = max(self.sums[w], 0.0) if self.counts[w] else 0.0
+            result[f"{prefix}_{distinct_name}_{window}"] = float(len(self.distinct[w]))
+        return result
+
+
+class VelocityIndex:
+
+    keys: "OrderedDict[str, VelocityState]" = OrderedDict()
+    lock = threading.Lock()
+
+    @classmethod
+    def observe(cls, client_id: Optional[str], destination_id: Optional[str], amount: float,
+                ts: Optional[float] = None) -> Dict[str, float]:
+        """Учесть транзакцию и вернуть скорости клиента и получателя с её учётом"""
+        ts = time.time() if ts is None else ts
+        with cls.lock:
+            if client_id is not None:
+                cls._state(f"c:{client_id}").add(ts, amount, destination_id)
+            if destination_id is not None:
+                cls._state(f"d:{destination_id}").add(ts, amount, client_id)
+            return cls._features(client_id, destination_id, ts)
+
+    @classmethod
+    def resolve_many(cls, client_ids: Sequence, destination_ids: Sequence, amounts: Sequence[float],
+                     observe: bool) -> np.ndarray:
+        """Скорости для пачки строк, матрица rows × VELOCITY_FEATURE_NAMES, под одной блокировкой.
+
+        observe=True — строки учитываются в окнах по порядку, как в /batch; так делают пути,
+        сохраняющие транзакции в БД, чтобы индекс совпадал с восстановленным rebuild_from_db.
+        observe=False — каждая строка видит текущие окна плюс саму себя, индекс не меняется.
+        """
+        ts = time.time()
+        result = np.zeros((len(amounts), len(VELOCITY_FEATURE_NAMES)))
+        with cls.lock:
+            for row, (client_id, destination_id, amount) in enumerate(zip(client_ids, destination_ids, amounts)):
+                client_id = None if client_id is None or client_id != client_id else str(client_id)
+                destination_id = None if destination_id is None or destination_id != destination_id \
+                    else str(destination_id)
+                amount = float(amount)
+                if observe:
+                    if client_id is not None:
+                        cls._state(f"c:{client_id}").add(ts, amount, destination_id)
+                    if destination_id is not None:
+                        cls._state(f"d:{destination_id}").add(ts, amount, client_id)
+                    features = cls._features(client_id, destination_id, ts)
+                else:
+                    features = cls._preview(client_id, destination_id, amount, ts)
+                result[row] = [features[name] for name in VELOCITY_FEATURE_NAMES]
+        return result
+
+    @classmethod
+    def get_features(cls, client_id: Optional[str], destination_id: Optional[str] = None,
+                     ts: Optional[float] = None) -> Dict[str, float]:
+        with cls.lock:
+            return cls._features(client_id, destination_id, time.time() if ts is None else ts)
+
+    @classmethod
+    def _features(cls, client_id: Optional[str], destination_id: Optional[str], ts: float) -> Dict[str, float]:
+        features = dict.fromkeys(VELOCITY_FEATURE_NAMES, 0.0)
+
+        for key, prefix, distinct_name in (
+                (f"c:{client_id}" if client_id is not None else None, "client", "distinct_destinations"),
+                (f"d:{destination_id}" if destination_id is not None else None, "destination", "distinct_clients"),
+        ):
+            state = cls.keys.get(key) if key else None
+            if state is not None:
+                state.advance(ts)
+                features.update(state.snapshot(prefix, distinct_name))
+
+        return features
+
+    @classmethod
+    def _preview(cls, client_id: Optional[str], destination_id: Optional[str], amount: float,
+                 ts: float) -> Dict[str, float]:
+        features = dict.fromkeys(VELOCITY_FEATURE_NAMES, 0.0)
+
+        for key, prefix, distinct_name, counterparty in (
+                (f"c:{client_id}" if client_id is not None else None, "client", "distinct_destinations", destination_id),
+                (f"d:{destination_id}" if destination_id is not None else None, "destination", "distinct_clients", client_id),
+        ):
+            if key is None:
+                continue
+            state = cls.keys.get(key)
+            if state is None:
+                state = VelocityState()
+            else:
+                state.advance(ts)
+            features.update(state.preview(prefix, distinct_name, amount, counterparty))
+
+        return features
+
+    @classmethod
+    def _state(cls, key: str) -> VelocityState:
+        state = cls.keys.get(key)
+        if state is None:
+            state = cls.keys[key] = VelocityState()
+            while len(cls.keys) > settings.VELOCITY_MAX_KEYS:
+                cls.keys.popitem(last=False)
+        else:
+            cls.keys.move_to_end(key)
+        return state
+
+    @classmethod
+    def rebuild_from_db(cls, db: Session) -> int:
+        """Восстановить окна по транзакциям за последние сутки"""
+        since = datetime.utcnow() - timedelta(seconds=max(VELOCITY_WINDOWS.values()))
+        rows = db.query(
+            DBTransaction.client_id,
+            DBTransaction.destination_id,
+            DBTransaction.amount,
+            DBTransaction.created_at
+        ).filter(
+            DBTransaction.created_at >= since
+        ).order_by(DBTransaction.created_at).yield_per(10_000)
+
+        count = 0
+        with cls.lock:
+            cls.keys.clear()
+            for client_id, destination_id, amount, created_at in rows:
+                ts = created_at.timestamp() if created_at.tzinfo else (created_at - _EPOCH).total_seconds()
+                if client_id is not None:
+                    cls._state(f"c:{client_id}").add(ts, amount, destination_id)
+                if destination_id is not None:
+                    cls._state(f"d:{destination_id}").add(ts, amount, client_id)
+                count += 1
+
+        return count
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return {
+            "keys": len(cls.keys),
+            "max_keys": settings.VELOCITY_MAX_KEYS,
+            "windows": list(VELOCITY_WINDOWS),
+        }
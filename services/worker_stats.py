@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.config import settings
+
+
+class WorkerStats:
+    """Счётчики процесса-воркера. При запуске через serve.py каждый воркер раз в
+    WORKER_STATS_SECONDS пишет снимок в общий каталог, GET /workers собирает их все.
+    """
+
+    # Номер воркера и каталог снимков задаёт serve.py после fork; None — одиночный процесс
+    index: Optional[int] = None
+    stats_dir: Optional[Path] = None
+    # Число воркеров serve.py: задаётся до fork
+    workers = 1
+    started_at = datetime.utcnow()
+    requests = 0
+    server_errors = 0
+    active = 0
+
+    @classmethod
+    def is_primary(cls) -> bool:
+        """Фоновые задачи, которые должны идти в одном экземпляре, запускает только воркер 0"""
+        return cls.index in (None, 0)
+
+    @staticmethod
+    def memory() -> Dict[str, float]:
+        """Память процесса, МБ: shared — страницы, общие с родителем и другими воркерами"""
+        fields = {}
+        try:
+            with open("/proc/self/smaps_rollup") as file:
+                for line in file:
+                    name, _, value = line.partition(":")
+                    if value.strip().endswith("kB"):
+                        fields[name] = int(value.split()[0]) / 1024
+        except OSError:
+            import resource
+            return {"max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+        return {
+            "rss_mb": round(fields.get("Rss", 0.0), 1),
+            "pss_mb": round(fields.get("Pss", 0.0), 1),
+            "shared_mb": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+            "private_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+        }
+
+    @classmethod
+    def snapshot(cls) -> Dict:
+        from ml.model_loader import ModelLoader
+        from services.overload import OverloadGuard
+        from services.readiness import Readiness
+
+        return {
+            "worker": cls.index,
+            "pid": os.getpid(),
+            "started_at": cls.started_at.isoformat(),
+            "uptime_seconds": round((datetime.utcnow() - cls.started_at).total_seconds(), 1),
+            "ready": Readiness.is_ready(),
+            "requests": cls.requests,
+            "server_errors": cls.server_errors,
+            "active_requests": cls.active,
+            "scoring_in_flight": OverloadGuard.in_flight,
+            "spill_buffer": len(OverloadGuard.spill_buffer),
+            "model_snapshot_version": ModelLoader.snapshot.version if ModelLoader.snapshot else None,
+            "memory": cls.memory(),
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+
+    @classmethod
+    def publish(cls):
+        from core.request_profiler import RequestProfiler
+
+        if cls.stats_dir is None:
+            return
+        path = cls.stats_dir / f"worker-{cls.index}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(cls.snapshot()))
+        os.replace(tmp_path, path)
+        RequestProfiler.publish(cls.stats_dir, cls.index)
+
+    @classmethod
+    async def publish_periodically(cls):
+        while True:
+            try:
+                await asyncio.to_thread(cls.publish)
+            except Exception as e:
+                print(f"Ошибка публикации статистики воркера: {e}")
+            await asyncio.sleep(settings.WORKER_STATS_SECONDS)
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+    @classmethod
+    def collect(cls) -> List[Dict]:
+        """Снимки всех воркеров; свой — текущий, остальные — последние опубликованные"""
+        if cls.stats_dir is None:
+            return [cls.snapshot()]
+
+        workers = []
+        for path in sorted(cls.stats_dir.glob("worker-*.json")):
+            try:
+                worker = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if worker["worker"] == cls.index:
+                worker = cls.snapshot()
+            worker["alive"] = cls._alive(worker["pid"])
+            workers.append(worker)
+        return workers
+
+
+class WorkerStatsMiddleware:
+    """ASGI-обёртка без буферизации тела: потоковые ответы и чтение запроса не затрагиваются"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        WorkerStats.requests += 1
+        WorkerStats.active += 1
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start" and message["status"] >= 500:
+                WorkerStats.server_errors += 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            WorkerStats.active -= 1
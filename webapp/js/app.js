@@ -1,5 +1,10 @@
 const API_BASE = "";
 
+// Последние загруженные агрегаты: онлайн-лента прибавляет к ним приращения
+let transactionsSummary = null;
+let dashboardStats = null;
+const LIVE_ALERTS_LIMIT = 20;
+
 function $(selector) {
     return document.querySelector(selector);
 }
@@ -48,22 +53,27 @@ function initTabs() {
     });
 }
 
+function renderHealth(data) {
+    const dot = $("#health-status-indicator");
+    const text = $("#health-status-text");
+    text.textContent = `API: ${data.components?.api ?? "unknown"}, DB: ${data.components?.database ?? "unknown"}, ML: ${data.components?.ml_models ?? "unknown"}`;
+    dot.classList.remove("status-dot--ok", "status-dot--error", "status-dot--degraded", "status-dot--unhealthy");
+    if (data.status === "healthy") {
+        dot.classList.add("status-dot--ok");
+    } else if (data.status === "degraded") {
+        dot.classList.add("status-dot--degraded");
+    } else {
+        dot.classList.add("status-dot--unhealthy");
+    }
+}
+
 async function loadHealth() {
     const dot = $("#health-status-indicator");
     const text = $("#health-status-text");
     try {
         const res = await fetch(`${API_BASE}/health`);
         if (!res.ok) throw new Error("HTTP " + res.status);
-        const data = await res.json();
-        text.textContent = `API: ${data.components?.api ?? "unknown"}, DB: ${data.components?.database ?? "unknown"}, ML: ${data.components?.ml_models ?? "unknown"}`;
-        dot.classList.remove("status-dot--ok", "status-dot--error", "status-dot--degraded", "status-dot--unhealthy");
-        if (data.status === "healthy") {
-            dot.classList.add("status-dot--ok");
-        } else if (data.status === "degraded") {
-            dot.classList.add("status-dot--degraded");
-        } else {
-            dot.classList.add("status-dot--unhealthy");
-        }
+        renderHealth(await res.json());
     } catch (err) {
         console.error(err);
         text.textContent = "Не удалось получить статус API";
@@ -160,15 +170,47 @@ async function submitPredictForm(ev) {
     }
 }
 
-async function loadTransactions() {
+function renderTransactionRow(t) {
+    const tr = document.createElement("tr");
+    const created = t.created_at ? new Date(t.created_at).toLocaleString() : "-";
+    const isFraud = t.is_fraud ? "Да" : "Нет";
+    const proba = t.fraud_probability != null ? (t.fraud_probability * 100).toFixed(1) + "%" : "-";
+    tr.innerHTML = `
+        <td>${created}</td>
+        <td>${t.transaction_id || "-"}</td>
+        <td>${t.client_id || "-"}</td>
+        <td>${formatTenge(t.amount || 0)}</td>
+        <td>${proba}</td>
+        <td>${t.risk_level || "-"}</td>
+        <td>${isFraud}</td>
+    `;
+    return tr;
+}
+
+function renderTransactions(data) {
+    const tbody = $("#transactions-tbody");
+    if (!Array.isArray(data) || data.length === 0) {
+        tbody.innerHTML = `<tr><td colspan="7" class="muted">Записей не найдено.</td></tr>`;
+        return;
+    }
+    tbody.innerHTML = "";
+    data.forEach((t) => tbody.appendChild(renderTransactionRow(t)));
+}
+
+function transactionFilterParams() {
     const limit = Number($("#filter-limit").value || 50);
     const risk = $("#filter-risk").value;
     const isFraudValue = $("#filter-is-fraud").value;
     const params = new URLSearchParams();
-    params.set("skip", "0");
     params.set("limit", String(limit));
     if (risk) params.set("risk_level", risk);
     if (isFraudValue) params.set("is_fraud", isFraudValue === "true" ? "true" : "false");
+    return params;
+}
+
+async function loadTransactions() {
+    const params = transactionFilterParams();
+    params.set("skip", "0");
     const tbody = $("#transactions-tbody");
     const errorBox = $("#transactions-error");
     errorBox.classList.add("hidden");
@@ -176,28 +218,7 @@ async function loadTransactions() {
     try {
         const res = await fetch(`${API_BASE}/api/v1/transactions/?${params.toString()}`);
         if (!res.ok) throw new Error("HTTP " + res.status);
-        const data = await res.json();
-        if (!Array.isArray(data) || data.length === 0) {
-            tbody.innerHTML = `<tr><td colspan="7" class="muted">Записей не найдено.</td></tr>`;
-            return;
-        }
-        tbody.innerHTML = "";
-        data.forEach((t) => {
-            const tr = document.createElement("tr");
-            const created = t.created_at ? new Date(t.created_at).toLocaleString() : "-";
-            const isFraud = t.is_fraud ? "Да" : "Нет";
-            const proba = t.fraud_probability != null ? (t.fraud_probability * 100).toFixed(1) + "%" : "-";
-            tr.innerHTML = `
-                <td>${created}</td>
-                <td>${t.transaction_id || "-"}</td>
-                <td>${t.client_id || "-"}</td>
-                <td>${formatTenge(t.amount || 0)}</td>
-                <td>${proba}</td>
-                <td>${t.risk_level || "-"}</td>
-                <td>${isFraud}</td>
-            `;
-            tbody.appendChild(tr);
-        });
+        renderTransactions(await res.json());
     } catch (err) {
         console.error(err);
         errorBox.textContent = "Ошибка загрузки транзакций: " + err.message;
@@ -206,6 +227,18 @@ async function loadTransactions() {
     }
 }
 
+function renderTransactionsSummary() {
+    const data = transactionsSummary;
+    const summaryBox = $("#transactions-summary");
+    summaryBox.innerHTML = `
+        <span>Всего транзакций: <strong>${data.total_transactions}</strong></span>
+        <span>Fraud детект: <strong>${data.fraud_detected}</strong></span>
+        <span>Fraud rate: <strong>${(data.fraud_rate * 100).toFixed(2)}%</strong></span>
+        <span>Avg fraud amount: <strong>${formatTenge(data.avg_fraud_amount)}</strong></span>
+    `;
+    summaryBox.classList.remove("hidden");
+}
+
 async function loadTransactionsSummary() {
     const days = Number($("#filter-days").value || 7);
     const summaryBox = $("#transactions-summary");
@@ -216,14 +249,8 @@ async function loadTransactionsSummary() {
     try {
         const res = await fetch(`${API_BASE}/api/v1/transactions/stats/summary?days=${encodeURIComponent(days)}`);
         if (!res.ok) throw new Error("HTTP " + res.status);
-        const data = await res.json();
-        summaryBox.innerHTML = `
-            <span>Всего транзакций: <strong>${data.total_transactions}</strong></span>
-            <span>Fraud детект: <strong>${data.fraud_detected}</strong></span>
-            <span>Fraud rate: <strong>${(data.fraud_rate * 100).toFixed(2)}%</strong></span>
-            <span>Avg fraud amount: <strong>${formatTenge(data.avg_fraud_amount)}</strong></span>
-        `;
-        summaryBox.classList.remove("hidden");
+        transactionsSummary = await res.json();
+        renderTransactionsSummary();
     } catch (err) {
         console.error(err);
         errorBox.textContent = "Ошибка получения summary: " + err.message;
@@ -240,40 +267,8 @@ async function loadDashboardStats() {
     try {
         const res = await fetch(`${API_BASE}/api/v1/analytics/dashboard?days=${encodeURIComponent(days)}`);
         if (!res.ok) throw new Error("HTTP " + res.status);
-        const data = await res.json();
-        container.innerHTML = "";
-        const cards = [
-            {
-                label: "Всего транзакций",
-                value: data.total_transactions,
-                sub: `за ${data.period_days} дней`
-            },
-            {
-                label: "Fraud детект",
-                value: data.fraud_detected,
-                sub: `rate ${(data.fraud_rate * 100).toFixed(2)}%`
-            },
-            {
-                label: "Средняя сумма fraud",
-                value: formatTenge(data.avg_fraud_amount),
-                sub: ""
-            },
-            {
-                label: "Период",
-                value: `${new Date(data.period_start).toLocaleDateString()} — ${new Date(data.period_end).toLocaleDateString()}`,
-                sub: ""
-            }
-        ];
-        cards.forEach((c) => {
-            const div = document.createElement("div");
-            div.className = "dashboard-card";
-            div.innerHTML = `
-                <div class="dashboard-label">${c.label}</div>
-                <div class="dashboard-value">${c.value}</div>
-                ${c.sub ? `<div class="dashboard-sub">${c.sub}</div>` : ""}
-            `;
-            container.appendChild(div);
-        });
+        dashboardStats = await res.json();
+        renderDashboard();
     } catch (err) {
         console.error(err);
         errorBox.textContent = "Ошибка загрузки дашборда: " + err.message;
@@ -281,6 +276,63 @@ async function loadDashboardStats() {
     }
 }
 
+function renderDashboard() {
+    const data = dashboardStats;
+    const container = $("#dashboard-content");
+    container.innerHTML = "";
+    const cards = [
+        {
+            label: "Всего транзакций",
+            value: data.total_transactions,
+            sub: `за ${data.period_days} дней`
+        },
+        {
+            label: "Fraud детект",
+            value: data.fraud_detected,
+            sub: `rate ${(data.fraud_rate * 100).toFixed(2)}%`
+        },
+        {
+            label: "Средняя сумма fraud",
+            value: formatTenge(data.avg_fraud_amount),
+            sub: ""
+        },
+        {
+            label: "Период",
+            value: `${new Date(data.period_start).toLocaleDateString()} — ${new Date(data.period_end).toLocaleDateString()}`,
+            sub: ""
+        }
+    ];
+    cards.forEach((c) => {
+        const div = document.createElement("div");
+        div.className = "dashboard-card";
+        div.innerHTML = `
+            <div class="dashboard-label">${c.label}</div>
+            <div class="dashboard-value">${c.value}</div>
+            ${c.sub ? `<div class="dashboard-sub">${c.sub}</div>` : ""}
+        `;
+        container.appendChild(div);
+    });
+}
+
+function renderRiskPatterns(data) {
+    const list = $("#risk-patterns-list");
+    if (!Array.isArray(data) || data.length === 0) {
+        list.innerHTML = `<li class="muted">Паттерны не найдены.</li>`;
+        return;
+    }
+    list.innerHTML = "";
+    data.forEach((p) => {
+        const li = document.createElement("li");
+        li.className = "pattern-item";
+        li.innerHTML = `
+            <div class="pattern-title">${p.pattern}</div>
+            <div>${p.description}</div>
+            <div class="pattern-meta">prevalence ${(p.prevalence * 100).toFixed(1)}%</div>
+        `;
+        list.appendChild(li);
+    });
+}
+
 async function loadRiskPatterns() {
     const list = $("#risk-patterns-list");
     const errorBox = $("#risk-patterns-error");
@@ -289,22 +341,7 @@ async function loadRiskPatterns() {
     try {
         const res = await fetch(`${API_BASE}/api/v1/analytics/risk-patterns?limit=10`);
         if (!res.ok) throw new Error("HTTP " + res.status);
-        const data = await res.json();
-        if (!Array.isArray(data) || data.length === 0) {
-            list.innerHTML = `<li class="muted">Паттерны не найдены.</li>`;
-            return;
-        }
-        list.innerHTML = "";
-        data.forEach((p) => {
-            const li = document.createElement("li");
-            li.className = "pattern-item";
-            li.innerHTML = `
-                <div class="pattern-title">${p.pattern}</div>
-                <div>${p.description}</div>
-                <div class="pattern-meta">prevalence ${(p.prevalence * 100).toFixed(1)}%</div>
-            `;
-            list.appendChild(li);
-        });
+        renderRiskPatterns(await res.json());
     } catch (err) {
         console.error(err);
         errorBox.textContent = "Ошибка загрузки паттернов: " + err.message;
@@ -312,6 +349,28 @@ async function loadRiskPatterns() {
     }
 }
 
+function renderFeatureImportance(data) {
+    const tbody = $("#feature-importance-tbody");
+    if (data.error) {
+        tbody.innerHTML = `<tr><td colspan="2" class="muted">${data.error}</td></tr>`;
+        return;
+    }
+    const feats = data.features || [];
+    if (feats.length === 0) {
+        tbody.innerHTML = `<tr><td colspan="2" class="muted">Нет данных по важности признаков.</td></tr>`;
+        return;
+    }
+    tbody.innerHTML = "";
+    feats.forEach((f) => {
+        const tr = document.createElement("tr");
+        tr.innerHTML = `
+            <td>${f.feature}</td>
+            <td>${f.importance.toFixed(4)}</td>
+        `;
+        tbody.appendChild(tr);
+    });
+}
+
 async function loadFeatureImportance() {
     const tbody = $("#feature-importance-tbody");
     const errorBox = $("#feature-importance-error");
@@ -320,25 +379,7 @@ async function loadFeatureImportance() {
     try {
         const res = await fetch(`${API_BASE}/api/v1/analytics/feature-importance`);
         if (!res.ok) throw new Error("HTTP " + res.status);
-        const data = await res.json();
-        if (data.error) {
-            tbody.innerHTML = `<tr><td colspan="2" class="muted">${data.error}</td></tr>`;
-            return;
-        }
-        const feats = data.features || [];
-        if (feats.length === 0) {
-            tbody.innerHTML = `<tr><td colspan="2" class="muted">Нет данных по важности признаков.</td></tr>`;
-            return;
-        }
-        tbody.innerHTML = "";
-        feats.forEach((f) => {
-            const tr = document.createElement("tr");
-            tr.innerHTML = `
-                <td>${f.feature}</td>
-                <td>${f.importance.toFixed(4)}</td>
-            `;
-            tbody.appendChild(tr);
-        });
+        renderFeatureImportance(await res.json());
     } catch (err) {
         console.error(err);
         errorBox.textContent = "Ошибка загрузки важности признаков: " + err.message;
@@ -415,9 +456,127 @@ async function submitSimulateGenerate(ev) {
     }
 }
 
+async function loadOverview() {
+    // Все панели одним запросом; без изменений данных браузер получает 304 и берёт ответ из кэша
+    const params = transactionFilterParams();
+    params.set("days", String(Number($("#analytics-days").value || 7)));
+    params.set("summary_days", String(Number($("#filter-days").value || 7)));
+    try {
+        const res = await fetch(`${API_BASE}/api/v1/analytics/overview?${params.toString()}`);
+        if (!res.ok) throw new Error("HTTP " + res.status);
+        const data = await res.json();
+        renderHealth(data.health);
+        renderTransactions(data.transactions);
+        transactionsSummary = data.summary;
+        renderTransactionsSummary();
+        dashboardStats = data.dashboard;
+        renderDashboard();
+        renderRiskPatterns(data.risk_patterns);
+        renderFeatureImportance(data.feature_importance);
+    } catch (err) {
+        // Отдельные запросы — запасной путь, если сводный не ответил
+        console.error(err);
+        loadHealth();
+        loadTransactions();
+        loadTransactionsSummary();
+        loadDashboardStats();
+        loadRiskPatterns();
+        loadFeatureImportance();
+    }
+}
+
+function applyDelta(stats, delta) {
+    // Средняя сумма fraud пересчитывается через сумму: avg * count + приращение
+    const fraudAmount = (stats.avg_fraud_amount || 0) * stats.fraud_detected + delta.fraud_amount;
+    stats.total_transactions += delta.transactions;
+    stats.fraud_detected += delta.fraud_detected;
+    stats.fraud_rate = stats.total_transactions ? stats.fraud_detected / stats.total_transactions : 0;
+    stats.avg_fraud_amount = stats.fraud_detected ? fraudAmount / stats.fraud_detected : 0;
+}
+
+function matchesTransactionFilters(t) {
+    const risk = $("#filter-risk").value;
+    const isFraudValue = $("#filter-is-fraud").value;
+    if (risk && t.risk_level !== risk) return false;
+    if (isFraudValue && String(t.is_fraud) !== isFraudValue) return false;
+    return true;
+}
+
+function onLiveTransactions(ev) {
+    const data = JSON.parse(ev.data);
+    const tbody = $("#transactions-tbody");
+    const limit = Number($("#filter-limit").value || 50);
+    const items = data.items.filter(matchesTransactionFilters);
+    if (items.length > 0) {
+        // Строка-заглушка «Записей не найдено» и т.п.
+        if (tbody.querySelector("td[colspan]")) tbody.innerHTML = "";
+        items.forEach((t) => tbody.insertBefore(renderTransactionRow(t), tbody.firstChild));
+        while (tbody.rows.length > limit) tbody.deleteRow(-1);
+    }
+    if (transactionsSummary) {
+        applyDelta(transactionsSummary, data.delta);
+        renderTransactionsSummary();
+    }
+    if (dashboardStats) {
+        applyDelta(dashboardStats, data.delta);
+        renderDashboard();
+    }
+}
+
+function onLiveAlerts(ev) {
+    const data = JSON.parse(ev.data);
+    const list = $("#live-alerts-list");
+    if (list.querySelector(".muted")) list.innerHTML = "";
+    data.items.forEach((a) => {
+        const li = document.createElement("li");
+        li.className = "pattern-item";
+        li.innerHTML = `
+            <div class="pattern-title">${a.severity.toUpperCase()} · ${a.transaction_id}</div>
+            <div>${a.message}</div>
+            <div class="pattern-meta">${new Date(a.created_at).toLocaleString()}</div>
+        `;
+        list.insertBefore(li, list.firstChild);
+    });
+    if (data.count > data.items.length) {
+        const li = document.createElement("li");
+        li.className = "pattern-meta";
+        li.textContent = `Ещё алертов в пачке: ${data.count - data.items.length}`;
+        list.insertBefore(li, list.firstChild);
+    }
+    while (list.children.length > LIVE_ALERTS_LIMIT) list.removeChild(list.lastChild);
+}
+
+function setLiveStatus(state, text) {
+    const dot = $("#live-status-indicator");
+    dot.classList.remove("status-dot--ok", "status-dot--degraded", "status-dot--unknown");
+    dot.classList.add(state);
+    setText($("#live-status-text"), text);
+}
+
+function connectLiveFeed() {
+    if (!window.EventSource) {
+        setLiveStatus("status-dot--unknown", "Онлайн-лента: не поддерживается браузером");
+        return;
+    }
+    // Переподключается сам браузер; после разрыва события могли потеряться — перечитываем данные
+    let disconnected = false;
+    const source = new EventSource(`${API_BASE}/api/v1/events/stream`);
+    source.onopen = () => {
+        setLiveStatus("status-dot--ok", "Онлайн-лента: подключена");
+        if (disconnected) loadOverview();
+        disconnected = false;
+    };
+    source.onerror = () => {
+        disconnected = true;
+        setLiveStatus("status-dot--degraded", "Онлайн-лента: переподключение...");
+    };
+    source.addEventListener("transactions", onLiveTransactions);
+    source.addEventListener("alerts", onLiveAlerts);
+    source.addEventListener("resync", loadOverview);
+}
+
 document.addEventListener("DOMContentLoaded", () => {
     initTabs();
-    loadHealth();
     const predictForm = $("#predict-form");
     if (predictForm) {
         predictForm.addEventListener("submit", submitPredictForm);
@@ -455,9 +614,6 @@ document.addEventListener("DOMContentLoaded", () => {
     if (simGenerateForm) {
         simGenerateForm.addEventListener("submit", submitSimulateGenerate);
     }
-    loadTransactions();
-    loadTransactionsSummary();
-    loadDashboardStats();
-    loadRiskPatterns();
-    loadFeatureImportance();
+    loadOverview();
+    connectLiveFeed();
 });